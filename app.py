@@ -1,11 +1,317 @@
 
-from flask import Flask, send_from_directory
+import pandas as pd
+import numpy as np
+from aiohttp import web
+from collections import OrderedDict
+import argparse
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+import pyarrow as pa
+from data_store import load_table
+from rollup_cube import build_cube, slice_cube, cube_totals, cube_by, cube_labels
+from monthly_matrix import build_period_matrix, total_series
 
-app = Flask(__name__)
+HOST = '0.0.0.0'
+PORT = 8000
+
+SUMMARY_FILE = 'Data_Analysis(Inventory Summary).csv'
+FORECAST_FILE = 'material_monthly_forecast.csv'
+RECOMMENDATIONS_FILE = 'inventory_recommendations.csv'
+
+# The summary cube uses the raw column names; rows the dashboard drops are dropped here too
+DIMENSIONS = ['BALANCE_AS_OF_DATE', 'PLANT_NAME', 'MATERIAL_NAME']
+MEASURES = ['UNRESRICTED_STOCK', 'STOCK_SELL_VALUE', 'LOSS_VALUE']
+
+CACHE_SIZE = 512
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+ARROW_TYPE = 'application/vnd.apache.arrow.stream'
+FORMATS = ['json', 'arrow']
+TOP_N = 10
+# Seconds between checks of the source files' mtimes for a reload
+RELOAD_INTERVAL = 5.0
+
+
+def source_version(data_dir='.'):
+    """Short hash of the source files' paths and mtimes; changes whenever one of them does."""
+    sources = [os.path.join(data_dir, name) for name in [SUMMARY_FILE, 'Inbound_cleaned.csv', 'Outbound_cleaned.csv',
+                                                         FORECAST_FILE, RECOMMENDATIONS_FILE]]
+    return hashlib.sha1(repr([(p, os.path.getmtime(p)) for p in sources if os.path.exists(p)]).encode()).hexdigest()[:12]
+
+
+def load_state(data_dir='.'):
+    """
+    Loads every table the API serves: the summary rolled up into a cube,
+    monthly inbound / outbound totals, forecasts and recommendations. Handlers
+    only read this dict. `version` is the source_version the tables were
+    loaded at and is part of every cache key and ETag; current_state reloads
+    the dict when the sources change.
+    """
+    def path(name):
+        return os.path.join(data_dir, name)
+
+    version = source_version(data_dir)
+
+    summary = load_table('inventory_summary', path(SUMMARY_FILE)).dropna(subset=DIMENSIONS + MEASURES[:2])
+    inbound = load_table('inbound', path('Inbound_cleaned.csv'))
+    outbound = load_table('outbound', path('Outbound_cleaned.csv'))
+
+    flows = pd.DataFrame({
+        'INBOUND_MT': total_series(build_period_matrix(inbound, 'INBOUND_DATE')),
+        'OUTBOUND_MT': total_series(build_period_matrix(outbound, 'OUTBOUND_DATE')),
+    }).fillna(0.0).rename_axis('MONTH').reset_index()
+
+    return {
+        'cube': build_cube(summary, DIMENSIONS, MEASURES),
+        'flows': flows,
+        'forecast': pd.read_csv(path(FORECAST_FILE), parse_dates=['MONTH']) if os.path.exists(path(FORECAST_FILE))
+        else pd.DataFrame(),
+        'recommendations': pd.read_csv(path(RECOMMENDATIONS_FILE)) if os.path.exists(path(RECOMMENDATIONS_FILE))
+        else pd.DataFrame(),
+        'version': version,
+        'loaded_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+
+
+def _date_param(query, name):
+    if not query.get(name):
+        return None
+    try:
+        return pd.Timestamp(query[name])
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be a date like 2024-06-01, got '{query[name]}'")
+
+
+def _filtered_cube(state, query):
+    plants = query.getall('plant', None)
+    materials = query.getall('material', None)
+    return slice_cube(state['cube'], _date_param(query, 'start'), _date_param(query, 'end'),
+                      plants or None, materials or None)
+
+
+def kpis(state, query):
+    """Totals of every measure for the filtered cube, with the latest snapshot's stock."""
+    cube = _filtered_cube(state, query)
+    totals = cube_totals(cube)
+    by_date = cube_by(cube, 'BALANCE_AS_OF_DATE')
+    latest = by_date.iloc[-1] if len(by_date) else None
+    return {
+        'totals': totals,
+        'latest_date': None if latest is None else latest['BALANCE_AS_OF_DATE'],
+        'latest_stock': None if latest is None else latest['UNRESRICTED_STOCK'],
+        'plants': len(cube_labels(cube, 'PLANT_NAME')),
+        'materials': len(cube_labels(cube, 'MATERIAL_NAME')),
+    }
+
+
+def timeseries(state, query):
+    """Per-snapshot measures of the filtered cube, or monthly inbound / outbound with ?series=flows."""
+    if query.get('series') == 'flows':
+        return state['flows']
+    return cube_by(_filtered_cube(state, query), 'BALANCE_AS_OF_DATE')
+
+
+def top_materials(state, query):
+    """The ?n= (default TOP_N) materials with the largest ?metric= over the filtered cube."""
+    metric = query.get('metric', 'UNRESRICTED_STOCK')
+    if metric not in MEASURES:
+        raise web.HTTPBadRequest(text=f"Unknown metric '{metric}', expected one of {MEASURES}")
+    try:
+        n = int(query.get('n', TOP_N))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"n must be an integer, got '{query['n']}'")
+    if n < 1:
+        raise web.HTTPBadRequest(text=f"n must be at least 1, got {n}")
+    by_material = cube_by(_filtered_cube(state, query), 'MATERIAL_NAME')
+    return by_material.nlargest(n, metric).reset_index(drop=True)
+
+
+def recommendations(state, query):
+    """Recommendations, optionally filtered to one ?recommendation= category."""
+    df = state['recommendations']
+    if 'recommendation' in query and not df.empty:
+        df = df[df['recommendation'] == query['recommendation']]
+    return df
+
+
+def forecast(state, query):
+    """Monthly forecasts, optionally for the given ?material= values."""
+    df = state['forecast']
+    materials = query.getall('material', None)
+    if materials and not df.empty:
+        df = df[df['MATERIAL_NAME'].isin(materials)]
+    return df
+
+
+ENDPOINTS = {
+    '/api/kpis': kpis,
+    '/api/timeseries': timeseries,
+    '/api/top-materials': top_materials,
+    '/api/recommendations': recommendations,
+    '/api/forecast': forecast,
+}
+
+
+def _json_default(value):
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode(result, fmt):
+    """Serializes a handler result to (body, content type): frames as JSON records or an Arrow IPC stream."""
+    if fmt == 'arrow':
+        if not isinstance(result, pd.DataFrame):
+            raise web.HTTPBadRequest(text='Arrow is only available for table endpoints')
+        table = pa.Table.from_pandas(result, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), ARROW_TYPE
+
+    if isinstance(result, pd.DataFrame):
+        result = result.replace({np.nan: None}).to_dict('records')
+    return json.dumps(result, default=_json_default).encode(), 'application/json'
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded responses keyed by (data version, path, query,
+    format). Each entry holds the plain and gzipped bodies, so a hit costs a
+    dict lookup. Concurrent misses for the same key share one computation.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = self.misses = 0
+
+    async def get_or_compute(self, key, compute):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        if key in self._pending:
+            self.hits += 1
+            return await self._pending[key]
+
+        self.misses += 1
+        future = asyncio.get_running_loop().run_in_executor(None, compute)
+        self._pending[key] = future
+        try:
+            entry = await future
+        finally:
+            del self._pending[key]
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _build_entry(state, handler, query, fmt):
+    body, content_type = encode(handler(state, query), fmt)
+    compressed = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+    return {'body': body, 'gzip': compressed, 'content_type': content_type,
+            'etag': '"' + hashlib.sha1(body).hexdigest()[:16] + '"'}
+
+
+async def current_state(app):
+    """
+    The loaded state, reloaded when the source files changed. Mtimes are
+    checked at most every RELOAD_INTERVAL seconds; the request that notices a
+    change waits for the reload while others keep using the previous state.
+    A failed reload (e.g. a file caught mid-write) keeps the previous state
+    and is retried at the next check.
+    """
+    live = app['live']
+    now = time.monotonic()
+    if now - live['checked_at'] < RELOAD_INTERVAL or live['reloading']:
+        return live['state']
+    live['checked_at'] = now
+    if source_version(app['data_dir']) == live['state']['version']:
+        return live['state']
+
+    live['reloading'] = True
+    try:
+        live['state'] = await asyncio.get_running_loop().run_in_executor(None, load_state, app['data_dir'])
+        print(f"Reloaded data version {live['state']['version']}")
+    except Exception as e:
+        print(f"Keeping data version {live['state']['version']}, reload failed: {e}")
+    finally:
+        live['reloading'] = False
+    return live['state']
+
+
+async def handle_api(request):
+    state = await current_state(request.app)
+    handler = ENDPOINTS[request.path]
+    accept = request.headers.get('Accept', '')
+    fmt = request.query.get('format') or ('arrow' if ARROW_TYPE in accept else 'json')
+    if fmt not in FORMATS:
+        raise web.HTTPBadRequest(text=f"Unknown format '{fmt}', expected one of {FORMATS}")
+    key = (state['version'], request.path, tuple(sorted(request.query.items())), fmt)
+
+    entry = await request.app['cache'].get_or_compute(key, lambda: _build_entry(state, handler, request.query, fmt))
+    headers = {'ETag': entry['etag'], 'Cache-Control': 'max-age=60', 'Vary': 'Accept, Accept-Encoding'}
+    if request.headers.get('If-None-Match') == entry['etag']:
+        return web.Response(status=304, headers=headers)
+
+    body = entry['body']
+    if entry['gzip'] is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = entry['gzip']
+        headers['Content-Encoding'] = 'gzip'
+    return web.Response(body=body, content_type=entry['content_type'], headers=headers)
+
+
+async def handle_index(request):
+    state = await current_state(request.app)
+    cache = request.app['cache']
+    return web.json_response({
+        'endpoints': sorted(ENDPOINTS),
+        'version': state['version'],
+        'loaded_at': state['loaded_at'],
+        'cache': {'entries': len(cache), 'hits': cache.hits, 'misses': cache.misses},
+    })
+
+
+def make_app(data_dir='.', cache_size=CACHE_SIZE):
+    start = time.perf_counter()
+    app = web.Application()
+    app['data_dir'] = data_dir
+    # Replaced by current_state while serving, so kept in a dict the frozen app can hold
+    app['live'] = {'state': load_state(data_dir), 'checked_at': time.monotonic(), 'reloading': False}
+    app['cache'] = ResponseCache(cache_size)
+    print(f"Loaded data version {app['live']['state']['version']} in {time.perf_counter() - start:.2f} s")
+
+    app.router.add_get('/', handle_index)
+    app.router.add_get('/health', handle_index)
+    for path in ENDPOINTS:
+        app.router.add_get(path, handle_api)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inventory data API: KPIs, time series, top materials, '
+                                                 'recommendations and forecasts as JSON or Arrow.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--data-dir', default=os.getcwd())
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='Number of encoded responses kept.')
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.data_dir, args.cache_size), host=args.host, port=args.port)
 
-@app.route('/')
-def serve_dashboard():
-    return send_from_directory('.', 'dashboard.html')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000)
+    main()
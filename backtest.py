@@ -0,0 +1,304 @@
+
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import os
+import subprocess
+import time
+import tracemalloc
+import warnings
+from material_forecast import load_outbound, forecast_material
+from monthly_matrix import build_period_matrix
+from fast_forecast import MIN_POINTS, holt_forecast
+from predictive_model import load_daily_quantity, forecast_daily
+
+RESULTS_FILE = 'backtest_results.csv'
+
+# Model configurations under test. 'material' models forecast every
+# material's monthly series; 'daily-total' models forecast total outbound per
+# day, like predictive_model.py.
+MODELS = {
+    'sarimax-111': {'level': 'material', 'engine': 'sarimax', 'order': (1, 1, 1)},
+    'holt': {'level': 'material', 'engine': 'holt'},
+    'daily-sarima-weekly': {'level': 'daily-total', 'order': (1, 1, 1), 'seasonal_order': (1, 1, 1, 7)},
+}
+
+# Relative increase over the previous comparable run that counts as a
+# regression; wall time must also grow by MIN_TIME_DELTA seconds so timer
+# noise on sub-second models is ignored
+ACCURACY_TOLERANCE = 0.05
+TIME_TOLERANCE = 0.5
+MIN_TIME_DELTA = 1.0
+
+
+def monthly_cutoffs(months, n_cutoffs, horizon):
+    """The last `n_cutoffs` month starts that still leave `horizon` months of actuals after them."""
+    last = len(months) - horizon
+    return [months[i] for i in range(max(last - n_cutoffs + 1, MIN_POINTS), last + 1)]
+
+
+def material_folds(matrix, cutoff, horizon):
+    """
+    Training matrix and actuals for one cutoff. Only materials with at least
+    MIN_POINTS active months before the cutoff and still active `horizon`
+    months after it are scored, so every training series ends right before
+    the cutoff and every actual is a real month.
+    """
+    values = matrix.to_numpy(dtype=float)
+    c = matrix.columns.get_loc(cutoff)
+    active = ~np.isnan(values)
+    first = active.argmax(axis=1)
+    last = values.shape[1] - 1 - active[:, ::-1].argmax(axis=1)
+    eligible = active.any(axis=1) & (c - first >= MIN_POINTS) & (last >= c + horizon - 1)
+
+    train = pd.DataFrame(values[eligible, :c], index=matrix.index[eligible], columns=matrix.columns[:c])
+    return train, values[eligible, c:c + horizon]
+
+
+def _predict(config, train, steps):
+    """Forecasts for one task: a (series x steps) array, NaN rows where a model failed."""
+    if config['level'] == 'daily-total':
+        return forecast_daily(train, steps, config['order'], config['seasonal_order']).to_numpy()[None, :]
+
+    if config['engine'] == 'holt':
+        forecast_df, _ = holt_forecast(train, steps)
+        return forecast_df['FORECASTED_QUANTITY_MT'].to_numpy().reshape(-1, steps)
+
+    predictions = np.full((len(train), steps), np.nan)
+    for i, (material, row) in enumerate(train.iterrows()):
+        series = row.dropna()
+        series.index.freq = 'MS'
+        _, forecast_df, _, _ = forecast_material(material, series, config['order'], None, steps)
+        if forecast_df is not None:
+            predictions[i] = forecast_df['FORECASTED_QUANTITY_MT'].to_numpy()
+    return predictions
+
+
+def _traced_peak_bytes(config, train, steps):
+    """
+    Peak memory allocated while predicting one task, above what was
+    allocated before it. tracemalloc sees Python and NumPy allocations only
+    for this call, unlike the process RSS, which includes the data loading,
+    earlier tasks and, in pool workers, memory inherited from the parent.
+    """
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        _predict(config, train, steps)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+def _backtest_task(task):
+    """Runs one (model, cutoff, batch) task, measuring its wall time."""
+    name, cutoff, train, actual = task
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        start = time.perf_counter()
+        predicted = _predict(MODELS[name], train, actual.shape[1])
+        seconds = time.perf_counter() - start
+    return {'model': name, 'cutoff': cutoff, 'predicted': predicted, 'actual': actual, 'seconds': seconds}
+
+
+def build_tasks(name, cutoffs, horizon, matrix, daily, batches):
+    config = MODELS[name]
+    tasks = []
+    for cutoff in cutoffs:
+        if config['level'] == 'daily-total':
+            end = cutoff + pd.DateOffset(months=horizon)
+            train = daily[daily.index < cutoff]
+            actual = daily[(daily.index >= cutoff) & (daily.index < end)].to_numpy()[None, :]
+            tasks.append((name, cutoff, train, actual))
+            continue
+
+        train, actual = material_folds(matrix, cutoff, horizon)
+        # Vectorized engines take the whole matrix; per-series ones are split across workers
+        n_batches = 1 if config['engine'] == 'holt' else max(1, min(batches, len(train)))
+        for rows in np.array_split(np.arange(len(train)), n_batches):
+            tasks.append((name, cutoff, train.iloc[rows], actual[rows]))
+    return tasks
+
+
+def score(results):
+    """MAPE over non-zero actuals, WAPE (both in %) and RMSE across every scored forecast of one model."""
+    predicted = np.concatenate([r['predicted'].ravel() for r in results])
+    actual = np.concatenate([r['actual'].ravel() for r in results])
+    fitted = ~np.isnan(predicted)
+    predicted, actual = predicted[fitted], actual[fitted]
+    error = predicted - actual
+    nonzero = actual != 0
+    return {
+        'points': len(actual),
+        'failed': int((~fitted).sum()),
+        'mape': np.abs(error[nonzero] / actual[nonzero]).mean() * 100,
+        'wape': np.abs(error).sum() / np.abs(actual).sum() * 100,
+        'rmse': np.sqrt((error ** 2).mean()),
+    }
+
+
+def run_backtest(name, cutoffs, horizon, matrix, daily, workers=None, measure_memory=True):
+    """
+    Runs one model over every cutoff, in parallel across cutoffs and material
+    batches. peak_mb is the allocation peak of the task with the most
+    training values, traced in this process after the timed runs so tracing
+    does not slow them down; NaN without `measure_memory`.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = build_tasks(name, cutoffs, horizon, matrix, daily, batches=workers * 4)
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_backtest_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_backtest_task, tasks))
+    wall_seconds = time.perf_counter() - start
+
+    row = {'model': name}
+    row.update(score(results))
+    row['fit_seconds'] = sum(r['seconds'] for r in results)
+    row['wall_seconds'] = wall_seconds
+    row['peak_mb'] = np.nan
+    if measure_memory:
+        _, _, train, actual = max(tasks, key=lambda task: (task[2].size, task[1]))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            row['peak_mb'] = _traced_peak_bytes(MODELS[name], train, actual.shape[1]) / 2 ** 20
+    return row
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _file_version(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def find_regressions(row, history, accuracy_tolerance=ACCURACY_TOLERANCE, time_tolerance=TIME_TOLERANCE):
+    """
+    Compares a result row with the latest earlier run of the same model on
+    the same data, cutoffs and horizon. Returns a list of messages, empty when
+    nothing got worse beyond the tolerances.
+    """
+    keys = ['model', 'data_version', 'cutoffs', 'horizon']
+    if any(key not in history.columns for key in keys):
+        return []
+    previous = history
+    for key in keys:
+        previous = previous[previous[key] == row[key]]
+    if previous.empty:
+        return []
+
+    baseline = previous.iloc[-1]
+    messages = []
+    checks = [('mape', accuracy_tolerance, 0), ('wape', accuracy_tolerance, 0), ('rmse', accuracy_tolerance, 0),
+              ('wall_seconds', time_tolerance, MIN_TIME_DELTA)]
+    for metric, tolerance, min_delta in checks:
+        # Runs from before a metric was recorded have nothing to compare against
+        if pd.isna(baseline.get(metric, np.nan)):
+            continue
+        if row[metric] > baseline[metric] * (1 + tolerance) and row[metric] - baseline[metric] > min_delta:
+            messages.append(f"{row['model']}: {metric} {baseline[metric]:,.3f} -> {row[metric]:,.3f} "
+                            f"(run {baseline['run_id']}, revision {baseline['revision'] or 'unknown'})")
+    return messages
+
+
+def load_results(path):
+    """
+    Earlier runs from the results table, empty when there is none. Rows that
+    do not fit the header, appended by a version of this script with other
+    columns, are skipped with a warning instead of failing the run.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    skipped = []
+    history = pd.read_csv(path, engine='python', on_bad_lines=lambda line: skipped.append(line))
+    if skipped:
+        print(f"Skipped {len(skipped)} row(s) of '{path}' that do not match its header.")
+    return history
+
+
+def save_results(results, history, path):
+    """
+    Appends this run to the results table. When the table's columns differ
+    from this run's (e.g. after a metric was added), it is rewritten with
+    both sets of columns instead, earlier runs leaving the new ones blank.
+    """
+    if not os.path.exists(path) or list(history.columns) == list(results.columns):
+        results.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        return
+    columns = list(results.columns) + [col for col in history.columns if col not in results.columns]
+    tmp_path = f'{path}.tmp'
+    pd.concat([history, results], ignore_index=True)[columns].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    print(f"Rewrote '{path}' with the current columns.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the forecasting models.')
+    parser.add_argument('models', nargs='*', help=f"Models to run (default: all of {', '.join(MODELS)}).")
+    parser.add_argument('--input', default='Outbound_cleaned.csv')
+    parser.add_argument('--cutoffs', type=int, default=3, help='Number of monthly forecast origins.')
+    parser.add_argument('--horizon', type=int, default=3, help='Months forecast from each origin.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs, 1 = serial).')
+    parser.add_argument('--results', default=RESULTS_FILE,
+                        help='CSV table that every run is appended to, with its revision and data version.')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Skip the traced rerun of the largest task that measures peak memory.')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with status 1 if a model regressed against the previous comparable run.')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.models if name not in MODELS]
+    if unknown:
+        parser.error(f"unknown model(s): {', '.join(unknown)}")
+
+    matrix = build_period_matrix(load_outbound(args.input), 'OUTBOUND_DATE')
+    daily = load_daily_quantity(args.input)
+    cutoffs = monthly_cutoffs(matrix.columns, args.cutoffs, args.horizon)
+    print(f"Cutoffs: {', '.join(f'{c:%Y-%m}' for c in cutoffs)}; horizon {args.horizon} months")
+
+    history = load_results(args.results)
+    run = {
+        'run_id': pd.Timestamp.now().strftime('%Y%m%dT%H%M%S'),
+        'revision': _git_revision(),
+        'data_version': _file_version(args.input),
+        'cutoffs': ' '.join(f'{c:%Y-%m}' for c in cutoffs),
+        'horizon': args.horizon,
+    }
+
+    rows = []
+    regressions = []
+    for name in args.models or MODELS:
+        row = dict(run)
+        row.update(run_backtest(name, cutoffs, args.horizon, matrix, daily, args.workers, args.memory))
+        rows.append(row)
+        if not history.empty:
+            regressions.extend(find_regressions(row, history))
+
+    results = pd.DataFrame(rows)
+    print(results[['model', 'points', 'failed', 'mape', 'wape', 'rmse', 'fit_seconds', 'wall_seconds', 'peak_mb']]
+          .to_string(index=False, float_format=lambda v: f'{v:,.2f}'))
+
+    save_results(results, history, args.results)
+    print(f"Results appended to '{args.results}' as run {run['run_id']}.")
+
+    for message in regressions:
+        print(f"Regression: {message}")
+    if args.check and regressions:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
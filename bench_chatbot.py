@@ -0,0 +1,50 @@
+import pandas as pd
+import time
+from data_store import load_table
+from dashboard_app import clean_data_summary
+from rag_chatbot import FakeLLM, answer_question, build_prompt
+from rag_index import load_index
+
+# Compares the old prompt, which rendered the newest 5,000 rows with
+# to_markdown on every question, with the retrieval prompt built from a
+# handful of chunk summaries. Answers come from FakeLLM, so this runs offline
+# and measures only prompt construction time and payload size. Exact lookups
+# are then timed end to end: they are served by the structured query engine
+# and never reach the model, and a repeated open question is served from the
+# response cache.
+
+QUERIES = [
+    "What is the stock for MAT-0001?",
+    "Show me details about Plant CHINA-WAREHOUSE",
+    "What was the total stock on 2024-07-31?",
+]
+
+
+def legacy_prompt(query, df):
+    df_reduced = df[["Date", "Plant", "Material", "Unrestricted_Stock", "Stock_Sell_Value", "Loss_Value"]].copy()
+    df_reduced["Date"] = pd.to_datetime(df_reduced["Date"])
+    df_reduced = df_reduced.sort_values(by="Date", ascending=False).head(5000)
+    return f"Inventory Data:\n{df_reduced.to_markdown(index=False)}\n\nUser Question: {query}"
+
+
+df = clean_data_summary(load_table('inventory_summary'))
+
+start = time.perf_counter()
+load_index(df)
+print(f"Index ready in {time.perf_counter() - start:.2f} s (built once per data version)\n")
+
+print(f"{'prompt':>10} {'ms/query':>10} {'characters':>12} {'~tokens':>10}")
+for name, make_prompt in (('legacy', legacy_prompt), ('retrieval', build_prompt)):
+    start = time.perf_counter()
+    prompts = [make_prompt(query, df) for query in QUERIES]
+    elapsed = (time.perf_counter() - start) / len(QUERIES)
+    size = sum(len(p) for p in prompts) // len(prompts)
+    print(f"{name:>10} {elapsed * 1e3:>10.1f} {size:>12,} {size // 4:>10,}")
+
+print()
+llm = FakeLLM()
+for query in QUERIES + ["Why is loss so high at CHINA-WAREHOUSE?", "why is loss so high at china-warehouse"]:
+    result = answer_question(query, df, llm=llm)
+    print(f"{query!r}: {result['path']} path in {result['elapsed_ms']:.2f} ms")
+    print(f"    {result['answer']}")
+print(f"The model was called {llm.calls} time(s)")
@@ -0,0 +1,65 @@
+import pandas as pd
+import numpy as np
+import os
+import tempfile
+import time
+import tracemalloc
+from clean_data import QuantileSketch, clean_outbound_data, filter_outliers, outlier_fences
+
+# Cleans the outbound extract replicated 1x, 4x and 16x, loaded whole and
+# streamed in 50,000-row chunks with the quantile sketch, and reports time,
+# peak Python memory and whether the outputs match. Streaming memory stays
+# flat as the file grows. The next table shows the sketch's quartile error
+# once it holds more values than it can keep exactly, and the last one times
+# per plant x material outlier fences on millions of rows.
+
+CHUNKSIZE = 50_000
+
+source = pd.read_csv('Outbound.csv')
+workdir = tempfile.mkdtemp()
+
+print(f"{'rows':>9} {'mode':>10} {'seconds':>8} {'peak MB':>8} {'matches':>8}")
+for factor in (1, 4, 16):
+    input_path = os.path.join(workdir, f'outbound_{factor}x.csv')
+    pd.concat([source] * factor).to_csv(input_path, index=False)
+
+    outputs = {}
+    for mode, chunksize in (('in-memory', None), ('streaming', CHUNKSIZE)):
+        outputs[mode] = os.path.join(workdir, f'cleaned_{factor}x_{mode}.csv')
+        tracemalloc.start()
+        start = time.perf_counter()
+        clean_outbound_data(input_path, outputs[mode], chunksize=chunksize)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        with open(outputs[mode], 'rb') as f, open(outputs['in-memory'], 'rb') as reference:
+            matches = f.read() == reference.read()
+        print(f"{len(source) * factor:>9} {mode:>10} {elapsed:>8.2f} {peak / 2**20:>8.1f} {str(matches):>8}")
+
+print()
+print(f"{'values':>9} {'k':>6} {'Q1 error %':>11} {'Q3 error %':>11} {'kept':>8}")
+rng = np.random.default_rng(0)
+values = rng.lognormal(3, 1, 2_000_000)
+exact_q1, exact_q3 = np.quantile(values, [0.25, 0.75])
+for k in (256, 1024, 4096):
+    sketch = QuantileSketch(k)
+    for block in np.array_split(values, 40):
+        sketch.update(block)
+    kept = sum(len(part) for parts in sketch.levels for part in parts)
+    q1_error = abs(sketch.quantile(0.25) - exact_q1) / exact_q1 * 100
+    q3_error = abs(sketch.quantile(0.75) - exact_q3) / exact_q3 * 100
+    print(f"{len(values):>9} {k:>6} {q1_error:>11.3f} {q3_error:>11.3f} {kept:>8}")
+
+print()
+print(f"{'rows':>9} {'groups':>7} {'grouped fences s':>17}")
+spec = {'outliers': {'column': 'NET_QUANTITY_MT', 'rule': 'iqr', 'k': 1.5,
+                     'by': ['PLANT_NAME', 'MATERIAL_NAME'], 'min_rows': 8}}
+for n in (1_000_000, 4_000_000):
+    df = pd.DataFrame({
+        'PLANT_NAME': rng.choice(['CHINA-WAREHOUSE', 'SINGAPORE-WAREHOUSE'], n),
+        'MATERIAL_NAME': rng.choice([f'MAT-{i:04d}' for i in range(1, 432)], n),
+        'NET_QUANTITY_MT': rng.lognormal(3, 1, n),
+    })
+    start = time.perf_counter()
+    filter_outliers(df, spec, outlier_fences(df, spec))
+    print(f"{n:>9} {df.groupby(['PLANT_NAME', 'MATERIAL_NAME']).ngroups:>7} {time.perf_counter() - start:>17.2f}")
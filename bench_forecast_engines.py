@@ -0,0 +1,86 @@
+import pandas as pd
+import numpy as np
+import argparse
+import time
+import warnings
+from material_forecast import load_outbound, run_forecasts, ORDER
+from monthly_matrix import build_period_matrix
+from fast_forecast import MIN_POINTS, active_spans, holt_forecast
+
+# Holds out the last few months of every material's outbound history,
+# forecasts them with the per-material SARIMAX path and with the batched
+# Holt engine, and compares accuracy (MAE, RMSE, WAPE, sMAPE) and wall time.
+
+
+def holdout_split(matrix, holdout):
+    """Masks each key's last `holdout` active months; returns the training matrix and the held-out actuals."""
+    values = matrix.to_numpy(dtype=float)
+    first, last, any_active = active_spans(values)
+    eligible = any_active & (last - first + 1 >= MIN_POINTS + holdout)
+
+    train = values.copy()
+    actuals = {}
+    for i in np.flatnonzero(eligible):
+        actuals[matrix.index[i]] = values[i, last[i] - holdout + 1:last[i] + 1]
+        train[i, last[i] - holdout + 1:] = np.nan
+    train_matrix = pd.DataFrame(train[eligible], index=matrix.index[eligible], columns=matrix.columns)
+    return train_matrix, actuals
+
+
+def score(forecasts, actuals):
+    predicted = np.concatenate([forecasts[m] for m in actuals if m in forecasts])
+    actual = np.concatenate([actuals[m] for m in actuals if m in forecasts])
+    error = predicted - actual
+    denominator = np.abs(predicted) + np.abs(actual)
+    return {
+        'materials': sum(m in forecasts for m in actuals),
+        'MAE': np.abs(error).mean(),
+        'RMSE': np.sqrt((error ** 2).mean()),
+        'WAPE %': np.abs(error).sum() / np.abs(actual).sum() * 100,
+        'sMAPE %': np.mean(np.where(denominator == 0, 0, 2 * np.abs(error) / np.where(denominator == 0, 1, denominator))) * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the SARIMAX and batched Holt forecast engines on a holdout.')
+    parser.add_argument('--input', default='Outbound_cleaned.csv')
+    parser.add_argument('--holdout', type=int, default=3, help='Months held out at the end of every series.')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for SARIMAX (1 = serial).')
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N eligible materials.')
+    args = parser.parse_args()
+
+    matrix = build_period_matrix(load_outbound(args.input), 'OUTBOUND_DATE')
+    train, actuals = holdout_split(matrix, args.holdout)
+    if args.limit:
+        train = train.iloc[:args.limit]
+        actuals = {m: actuals[m] for m in train.index}
+
+    start = time.perf_counter()
+    holt_df, _ = holt_forecast(train, args.holdout)
+    holt_seconds = time.perf_counter() - start
+    holt = {m: g['FORECASTED_QUANTITY_MT'].to_numpy()
+            for m, g in holt_df.groupby('MATERIAL_NAME', sort=False, observed=True)}
+
+    start = time.perf_counter()
+    tasks = []
+    for material, row in train.iterrows():
+        series = row.dropna()
+        series.index.freq = 'MS'
+        tasks.append((material, series, ORDER, None, args.holdout))
+    sarimax = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for material, forecast_df, _, _ in run_forecasts(tasks, args.workers):
+            if forecast_df is not None:
+                sarimax[material] = forecast_df['FORECASTED_QUANTITY_MT'].to_numpy()
+    sarimax_seconds = time.perf_counter() - start
+
+    print(f"Holdout of {args.holdout} months over {len(actuals)} materials\n")
+    results = pd.DataFrame({'sarimax': score(sarimax, actuals), 'holt': score(holt, actuals)}).T
+    results['seconds'] = [sarimax_seconds, holt_seconds]
+    print(results.to_string(float_format=lambda v: f'{v:,.2f}'))
+    print(f"\nholt is {sarimax_seconds / holt_seconds:,.0f}x faster")
+
+
+if __name__ == '__main__':
+    main()
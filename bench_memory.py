@@ -0,0 +1,33 @@
+
+import pandas as pd
+from data_store import TABLES, source_path, parse_table, encode_ids
+
+# Bytes per row of each source table as a plain pd.read_csv gives it (object
+# strings, int64 / float64) against the compact typed form from data_store,
+# and with the ID columns integer-encoded on top. Then the working set of
+# streamlit_app's value analysis before and after dropping its copy and merge.
+
+
+def bytes_per_row(df):
+    return df.memory_usage(deep=True, index=False).sum() / len(df)
+
+
+print(f"{'table':>18} {'rows':>8} {'default B/row':>14} {'compact B/row':>14} {'int IDs B/row':>14} {'saved':>6}")
+for name, spec in TABLES.items():
+    default = pd.read_csv(source_path(name), **spec['read_csv'])
+    compact = parse_table(name)
+    encoded = encode_ids(compact, name)
+    before, after, ids = bytes_per_row(default), bytes_per_row(compact), bytes_per_row(encoded)
+    print(f"{name:>18} {len(default):>8} {before:>14.1f} {after:>14.1f} {ids:>14.1f} {1 - ids / before:>6.0%}")
+
+inventory = parse_table('inventory')
+master = parse_table('material_master')
+
+# What the pie chart used to build: a full copy plus a merge it never read
+old = inventory.copy()
+old['Value'] = old['STOCK_SELL_VALUE']
+old = old.merge(master[['MATERIAL_NAME', 'POLYMER_TYPE']], on='MATERIAL_NAME')
+new = inventory.groupby('MATERIAL_NAME', observed=True)['STOCK_SELL_VALUE'].sum().reset_index(name='Value')
+old_bytes = old.memory_usage(deep=True, index=False).sum()
+new_bytes = new.memory_usage(deep=True, index=False).sum()
+print(f"\nValue analysis working set: {old_bytes / 1e6:.2f} MB before, {new_bytes / 1e6:.3f} MB after")
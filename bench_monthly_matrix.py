@@ -0,0 +1,33 @@
+
+import pandas as pd
+import time
+from material_forecast import load_outbound
+from monthly_matrix import build_period_matrix, series_by_key
+
+# Compares the per-material slicing cost of the old boolean-mask loop with
+# lookups into the pre-grouped monthly matrix, on the outbound history
+# replicated 1x, 2x, 4x and 8x. The mask cost grows with the row count; the
+# lookup cost does not.
+
+df = load_outbound('Outbound_cleaned.csv')
+materials = df['MATERIAL_NAME'].unique()
+
+print(f"{'rows':>8} {'mask us/iter':>14} {'build ms':>10} {'lookup us/iter':>16}")
+for factor in (1, 2, 4, 8):
+    big = pd.concat([df] * factor)
+
+    start = time.perf_counter()
+    for material in materials:
+        big[big['MATERIAL_NAME'] == material]['NET_QUANTITY_MT'].resample('MS').sum()
+    mask_cost = (time.perf_counter() - start) / len(materials)
+
+    start = time.perf_counter()
+    series = series_by_key(build_period_matrix(big, 'OUTBOUND_DATE'))
+    build_cost = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for material in materials:
+        series[material]
+    lookup_cost = (time.perf_counter() - start) / len(materials)
+
+    print(f"{len(big):>8} {mask_cost * 1e6:>14.1f} {build_cost * 1e3:>10.1f} {lookup_cost * 1e6:>16.3f}")
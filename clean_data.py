@@ -1,80 +1,395 @@
 import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import time
 
+# Rows per chunk in streaming mode, and values the quantile sketch keeps per
+# level. Below SKETCH_SIZE values the sketch is exact.
+CHUNKSIZE = 100_000
+SKETCH_SIZE = 1 << 15
 
-def clean_inbound_data(input_path, output_path):
+# How each transaction extract is cleaned: where it is read from and written
+# to, the dtype of every column, the date column with its known format, and
+# the outlier rule applied to a numeric column: Tukey fences at k x IQR,
+# computed per group of the `by` columns (None for one global fence). Groups
+# with fewer than `min_rows` rows are too small for their own quartiles, and
+# groups whose IQR is 0 would fence out everything but their most common
+# value; both use the global fences instead.
+DATASETS = {
+    'inbound': {
+        'input': 'Inbound.csv',
+        'output': 'Inbound_cleaned.csv',
+        'dtypes': {'INBOUND_DATE': 'str', 'PLANT_NAME': 'str', 'MATERIAL_NAME': 'str', 'NET_QUANTITY_MT': 'float64'},
+        'date_col': 'INBOUND_DATE',
+        'date_format': '%Y/%m/%d',
+        'outliers': {'column': 'NET_QUANTITY_MT', 'rule': 'iqr', 'k': 1.5,
+                     'by': ['PLANT_NAME', 'MATERIAL_NAME'], 'min_rows': 8},
+    },
+    'outbound': {
+        'input': 'Outbound.csv',
+        'output': 'Outbound_cleaned.csv',
+        'dtypes': {'OUTBOUND_DATE': 'str', 'PLANT_NAME': 'str', 'MODE_OF_TRANSPORT': 'str', 'MATERIAL_NAME': 'str',
+                   'CUSTOMER_NUMBER': 'str', 'NET_QUANTITY_MT': 'float64'},
+        'date_col': 'OUTBOUND_DATE',
+        'date_format': '%Y/%m/%d',
+        'outliers': {'column': 'NET_QUANTITY_MT', 'rule': 'iqr', 'k': 1.5,
+                     'by': ['PLANT_NAME', 'MATERIAL_NAME'], 'min_rows': 8},
+    },
+}
+
+STAGES = ['read', 'parse_dates', 'drop_missing_dates', 'drop_missing', 'quartiles', 'filter_outliers', 'write']
+
+
+class QuantileSketch:
+    """
+    Mergeable approximate quantile sketch in the style of KLL. Values are
+    buffered at level 0; when a level holds more than `k` values it is
+    sorted and every other value is promoted to the next level with twice
+    the weight. Memory is O(k log(n / k)) however many values are added, and
+    results are exact (numpy's linear interpolation) until the first compaction.
+    """
+
+    def __init__(self, k=SKETCH_SIZE, seed=0):
+        self.k = k
+        self.levels = [[]]
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0].append(values)
+        self._compact()
+
+    def _compact(self):
+        for level in range(len(self.levels)):
+            if sum(len(part) for part in self.levels[level]) <= self.k:
+                continue
+            items = np.sort(np.concatenate(self.levels[level]))
+            # An odd leftover stays behind so no weight is lost
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            items = items[:len(items) - len(keep)]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = [keep]
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            self.levels[level + 1].append(promoted)
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        if self.exact:
+            return float(np.quantile(np.concatenate(self.levels[0]), q))
+
+        values = np.concatenate([np.concatenate(parts) for parts in self.levels])
+        weights = np.concatenate([np.full(sum(len(p) for p in parts), 2.0 ** level)
+                                  for level, parts in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values, weights = values[order], weights[order]
+        # Rank of each retained value's midpoint, interpolated like numpy's linear method
+        ranks = np.cumsum(weights) - (weights + 1) / 2
+        return float(np.interp(q * (weights.sum() - 1), ranks, values))
+
+
+def parse_dates(df, spec):
+    # The format is known, so pandas does not have to infer it row by row
+    df[spec['date_col']] = pd.to_datetime(df[spec['date_col']], format=spec['date_format'], errors='coerce')
+    return df
+
+
+def drop_missing_dates(df, spec):
+    return df.dropna(subset=[spec['date_col']])
+
+
+def drop_missing(df, spec):
+    return df.dropna()
+
+
+def outlier_bounds(q1, q3, k=1.5):
+    iqr = q3 - q1
+    return q1 - k * iqr, q3 + k * iqr
+
+
+def uses_global_fences(rows, q1, q3, rule):
+    """Groups that fall back to the global fences: too few rows, or a zero IQR."""
+    return (rows < rule.get('min_rows', 1)) | (q3 - q1 <= 0)
+
+
+def outlier_fences(df, spec):
+    """
+    Lower and upper fences for every row of `df`: scalars for a global rule,
+    or Series aligned with `df` holding each row's group fences. The group
+    quartiles come from one vectorized groupby-quantile pass per quartile.
+    """
+    rule = spec['outliers']
+    values = df[rule['column']]
+    q1, q3 = values.quantile([0.25, 0.75])
+    lower, upper = outlier_bounds(q1, q3, rule['k'])
+    if not rule.get('by'):
+        return lower, upper
+
+    grouped = values.groupby([df[col] for col in rule['by']], observed=True, sort=False)
+    group_q1, group_q3 = grouped.transform('quantile', 0.25), grouped.transform('quantile', 0.75)
+    group_lower, group_upper = outlier_bounds(group_q1, group_q3, rule['k'])
+    fallback = uses_global_fences(grouped.transform('size'), group_q1, group_q3, rule)
+    return group_lower.mask(fallback, lower), group_upper.mask(fallback, upper)
+
+
+def filter_outliers(df, spec, fences):
+    values = df[spec['outliers']['column']]
+    return df[(values >= fences[0]) & (values <= fences[1])]
+
+
+PREPARE_STAGES = [('parse_dates', parse_dates), ('drop_missing_dates', drop_missing_dates), ('drop_missing', drop_missing)]
+
+
+def new_report(name):
+    return {'dataset': name, 'rows_in': 0, 'rows_out': 0,
+            'stages': {stage: {'rows_dropped': 0, 'seconds': 0.0} for stage in STAGES}}
+
+
+def _elapsed(report, stage, start):
+    report['stages'][stage]['seconds'] += time.perf_counter() - start
+
+
+def _timed(report, stage, func, df, *args):
+    """Runs one stage, adding its rows dropped and elapsed time to the report."""
+    start = time.perf_counter()
+    result = func(df, *args)
+    _elapsed(report, stage, start)
+    report['stages'][stage]['rows_dropped'] += len(df) - len(result)
+    return result
+
+
+def prepare(df, spec, report):
+    for stage, func in PREPARE_STAGES:
+        df = _timed(report, stage, func, df, spec)
+    return df
+
+
+def _read_chunks(spec, chunksize):
+    return pd.read_csv(spec['input'], dtype=spec['dtypes'], chunksize=chunksize)
+
+
+def streaming_fences(spec, chunksize=CHUNKSIZE, exact=False, sketch_size=SKETCH_SIZE):
+    """
+    First pass over a streamed file: the global fences, and for a grouped
+    rule a frame of fences per group (indexed by the `by` columns, with the
+    group's row count and whether it falls back to the global fences).
+    exact=True keeps the outlier column and keys of every row and computes
+    the quartiles the way pandas does; otherwise one QuantileSketch per
+    group, plus one global sketch, keeps memory bounded by the number of
+    groups rather than the number of rows.
+    """
+    rule = spec['outliers']
+    column, by = rule['column'], rule.get('by')
+    sketch = QuantileSketch(sketch_size)
+    group_sketches = {}
+    kept = []
+    scratch = new_report(None)
+    for chunk in _read_chunks(spec, chunksize):
+        chunk = prepare(chunk, spec, scratch)
+        if exact:
+            kept.append(chunk[(by or []) + [column]])
+            continue
+        sketch.update(chunk[column].to_numpy(dtype=float))
+        if by:
+            for key, values in chunk.groupby(by, observed=True, sort=False)[column]:
+                group_sketches.setdefault(key, QuantileSketch(sketch_size)).update(values.to_numpy(dtype=float))
+
+    if exact:
+        df = pd.concat(kept) if kept else pd.DataFrame(columns=(by or []) + [column])
+        fences = outlier_bounds(*df[column].quantile([0.25, 0.75]), rule['k'])
+        if not by:
+            return fences, None
+        grouped = df.groupby(by, observed=True, sort=False)[column]
+        quartiles = grouped.quantile([0.25, 0.75]).unstack()
+        groups = pd.DataFrame({'rows': grouped.size()})
+        groups['lower'], groups['upper'] = outlier_bounds(quartiles[0.25], quartiles[0.75], rule['k'])
+        groups['fallback'] = uses_global_fences(groups['rows'], quartiles[0.25], quartiles[0.75], rule)
+        if not isinstance(groups.index, pd.MultiIndex):
+            groups.index = pd.MultiIndex.from_arrays([groups.index], names=by)
+        return fences, groups
+
+    fences = outlier_bounds(sketch.quantile(0.25), sketch.quantile(0.75), rule['k'])
+    if not by:
+        return fences, None
+    index = pd.MultiIndex.from_tuples(list(group_sketches), names=by)
+    quartiles = np.array([[s.quantile(0.25), s.quantile(0.75)] for s in group_sketches.values()]).reshape(-1, 2)
+    groups = pd.DataFrame({'rows': [s.count for s in group_sketches.values()]}, index=index)
+    groups['lower'], groups['upper'] = outlier_bounds(quartiles[:, 0], quartiles[:, 1], rule['k'])
+    groups['fallback'] = uses_global_fences(groups['rows'], quartiles[:, 0], quartiles[:, 1], rule)
+    return fences, groups
+
+
+def chunk_fences(chunk, spec, fences, groups):
+    """Looks up each row's fences in the table built by streaming_fences."""
+    rule = spec['outliers']
+    if groups is None:
+        return fences
+    matched = groups.reindex(pd.MultiIndex.from_frame(chunk[rule['by']]))
+    fallback = matched['fallback'].eq(True).to_numpy()
+    lower = np.where(fallback, fences[0], matched['lower'].to_numpy())
+    upper = np.where(fallback, fences[1], matched['upper'].to_numpy())
+    return lower, upper
+
+
+def clean_dataset(spec, chunksize=None, exact=False, name=None):
+    """
+    Runs the cleaning pipeline for one dataset spec: read with explicit
+    dtypes, parse the date column, drop rows with missing values, drop
+    outliers outside the IQR fences and write the result. Returns a report
+    of rows dropped and seconds spent per stage.
+
+    With `chunksize` the file is streamed twice (quartiles first, then
+    filter and write), so peak memory depends on the chunk size rather than
+    the size of the file; see streaming_fences for `exact`.
+    """
+    report = new_report(name)
+    outliers = spec.get('outliers')
+
+    if not chunksize:
+        start = time.perf_counter()
+        df = pd.read_csv(spec['input'], dtype=spec['dtypes'])
+        _elapsed(report, 'read', start)
+        report['rows_in'] = len(df)
+
+        df = prepare(df, spec, report)
+        if outliers:
+            start = time.perf_counter()
+            fences = outlier_fences(df, spec)
+            _elapsed(report, 'quartiles', start)
+            df = _timed(report, 'filter_outliers', filter_outliers, df, spec, fences)
+
+        start = time.perf_counter()
+        df.to_csv(spec['output'], index=False)
+        _elapsed(report, 'write', start)
+        report['rows_out'] = len(df)
+        return report
+
+    if outliers:
+        start = time.perf_counter()
+        fences, groups = streaming_fences(spec, chunksize, exact)
+        _elapsed(report, 'quartiles', start)
+
+    tmp_path = f"{spec['output']}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        chunks = _read_chunks(spec, chunksize)
+        header = True
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            _elapsed(report, 'read', start)
+            if chunk is None:
+                break
+            report['rows_in'] += len(chunk)
+
+            chunk = prepare(chunk, spec, report)
+            if outliers:
+                chunk = _timed(report, 'filter_outliers', filter_outliers, chunk, spec,
+                               chunk_fences(chunk, spec, fences, groups))
+
+            start = time.perf_counter()
+            chunk.to_csv(f, index=False, header=header)
+            _elapsed(report, 'write', start)
+            report['rows_out'] += len(chunk)
+            header = False
+    os.replace(tmp_path, spec['output'])
+    return report
+
+
+def _clean_task(task):
+    name, spec, chunksize, exact = task
+    return clean_dataset(spec, chunksize, exact, name)
+
+
+def run_pipeline(datasets, chunksize=None, exact=False, workers=None):
+    """
+    Cleans every dataset in `datasets` (name -> spec) concurrently, one
+    process per dataset, and returns their reports in the same order.
+    workers=1 runs them one after another in this process.
+    """
+    tasks = [(name, spec, chunksize, exact) for name, spec in datasets.items()]
+    if workers == 1 or len(tasks) <= 1:
+        return [_clean_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers or min(len(tasks), os.cpu_count() or 1)) as executor:
+        return list(executor.map(_clean_task, tasks))
+
+
+def format_report(report):
+    lines = [f"{report['dataset']}: {report['rows_in']} rows in, {report['rows_out']} rows out",
+             f"  {'stage':<20} {'rows dropped':>12} {'seconds':>9}"]
+    for stage, stats in report['stages'].items():
+        lines.append(f"  {stage:<20} {stats['rows_dropped']:>12} {stats['seconds']:>9.3f}")
+    return '\n'.join(lines)
+
+
+def clean_inbound_data(input_path, output_path, chunksize=None, exact=False):
     """
     Cleans the inbound data by converting date columns, handling missing values,
-    and removing outliers.
+    and removing outliers. With `chunksize` the file is streamed in two passes.
     """
-    df = pd.read_csv(input_path)
-
-    # Convert INBOUND_DATE to datetime and handle potential errors
-    df["INBOUND_DATE"] = pd.to_datetime(df["INBOUND_DATE"], errors="coerce")
-
-    # Drop rows where INBOUND_DATE is NaT (due to conversion errors)
-    df.dropna(subset=["INBOUND_DATE"], inplace=True)
-
-    # Handle missing values in other columns (e.g., fill with a specific value or drop)
-    # For this case, we'll drop rows with any missing values
-    df.dropna(inplace=True)
-
-    # Remove outliers in NET_QUANTITY_MT using the IQR method
-    Q1 = df["NET_QUANTITY_MT"].quantile(0.25)
-    Q3 = df["NET_QUANTITY_MT"].quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
-    df = df[
-        (df["NET_QUANTITY_MT"] >= lower_bound) & (df["NET_QUANTITY_MT"] <= upper_bound)
-    ]
-
-    # Save the cleaned data
-    df.to_csv(output_path, index=False)
+    report = clean_dataset(dict(DATASETS['inbound'], input=input_path, output=output_path), chunksize, exact, 'inbound')
     print(f"Cleaned inbound data saved to {output_path}")
+    return report
 
 
-def clean_outbound_data(input_path, output_path):
+def clean_outbound_data(input_path, output_path, chunksize=None, exact=False):
     """
     Cleans the outbound data by converting date columns, handling missing values,
-    and removing outliers.
+    and removing outliers. With `chunksize` the file is streamed in two passes.
     """
-    df = pd.read_csv(input_path)
+    report = clean_dataset(dict(DATASETS['outbound'], input=input_path, output=output_path), chunksize, exact, 'outbound')
+    print(f"Cleaned outbound data saved to {output_path}")
+    return report
 
-    # Convert OUTBOUND_DATE to datetime and handle potential errors
-    df["OUTBOUND_DATE"] = pd.to_datetime(df["OUTBOUND_DATE"], errors="coerce")
 
-    # Drop rows where OUTBOUND_DATE is NaT
-    df.dropna(subset=["OUTBOUND_DATE"], inplace=True)
+def main():
+    parser = argparse.ArgumentParser(description="Clean transaction extracts with the declarative DATASETS pipeline.")
+    parser.add_argument("datasets", nargs="*", help="Datasets to clean (default: all of them).")
+    parser.add_argument("--spec", help="JSON file of extra or overriding dataset specs, in the DATASETS format.")
+    parser.add_argument("--data-dir", default=".", help="Directory that relative input and output paths are resolved against.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: one per dataset up to the CPU count, 1 = serial).")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help=f"Stream the files this many rows at a time (e.g. {CHUNKSIZE}) instead of loading them whole.")
+    parser.add_argument("--exact", action="store_true",
+                        help="In streaming mode, compute exact quartiles instead of using the quantile sketch.")
+    parser.add_argument("--outlier-key",
+                        help="Comma-separated columns to compute outlier fences per group of, or 'none' for global fences "
+                             "(default: each dataset's spec).")
+    args = parser.parse_args()
 
-    # Handle missing values
-    df.dropna(inplace=True)
+    datasets = dict(DATASETS)
+    if args.spec:
+        with open(args.spec, "r") as f:
+            datasets.update(json.load(f))
+    unknown = [name for name in args.datasets if name not in datasets]
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(unknown)}")
 
-    # Remove outliers in NET_QUANTITY_MT
-    Q1 = df["NET_QUANTITY_MT"].quantile(0.25)
-    Q3 = df["NET_QUANTITY_MT"].quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
-    df = df[
-        (df["NET_QUANTITY_MT"] >= lower_bound) & (df["NET_QUANTITY_MT"] <= upper_bound)
-    ]
+    selected = {}
+    for name in args.datasets or datasets:
+        spec = dict(datasets[name])
+        spec['input'] = os.path.join(args.data_dir, spec['input'])
+        spec['output'] = os.path.join(args.data_dir, spec['output'])
+        if args.outlier_key and spec.get('outliers'):
+            by = None if args.outlier_key.lower() == 'none' else args.outlier_key.split(',')
+            spec['outliers'] = dict(spec['outliers'], by=by)
+        selected[name] = spec
 
-    # Save the cleaned data
-    df.to_csv(output_path, index=False)
-    print(f"Cleaned outbound data saved to {output_path}")
+    for report in run_pipeline(selected, args.chunksize, args.exact, args.workers):
+        print(format_report(report))
+        print(f"Cleaned {report['dataset']} data saved to {selected[report['dataset']]['output']}")
 
 
 if __name__ == "__main__":
-    # Define file paths
-    inbound_input = "/Users/pakinnuntasukkasem/Downloads/bootcathon/Inbound.csv"
-    inbound_output = (
-        "/Users/pakinnuntasukkasem/Downloads/bootcathon/Inbound_cleaned.csv"
-    )
-    outbound_input = "/Users/pakinnuntasukkasem/Downloads/bootcathon/Outbound.csv"
-    outbound_output = (
-        "/Users/pakinnuntasukkasem/Downloads/bootcathon/Outbound_cleaned.csv"
-    )
-
-    # Clean the datasets
-    clean_inbound_data(inbound_input, inbound_output)
-    clean_outbound_data(outbound_input, outbound_output)
+    main()
@@ -2,6 +2,7 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+from data_store import load_table
 
 # Get the absolute path of the current working directory
 current_dir = os.getcwd()
@@ -10,11 +11,10 @@ current_dir = os.getcwd()
 historical_data_path = os.path.join(current_dir, 'Outbound_cleaned.csv')
 forecasted_data_path = os.path.join(current_dir, 'forecasted_outbound.csv')
 
-historical_df = pd.read_csv(historical_data_path)
+historical_df = load_table('outbound', historical_data_path)
 forecasted_df = pd.read_csv(forecasted_data_path)
 
 # Convert date columns to datetime objects
-historical_df['OUTBOUND_DATE'] = pd.to_datetime(historical_df['OUTBOUND_DATE'])
 forecasted_df['OUTBOUND_DATE'] = pd.to_datetime(forecasted_df['OUTBOUND_DATE'])
 
 # Aggregate historical data by date
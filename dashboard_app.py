@@ -2,7 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import os
-from rag_chatbot import get_ai_response
+from data_store import load_table
+from paged_table import render_paged_table
+from rollup_cube import build_cube, slice_cube, cube_is_empty, cube_totals, cube_by, cube_labels
+from rag_chatbot import answer_question
+from forecast_plots import ensure_plot
+from stock_projection import CAPACITY_FILE, load_capacity_plan, opening_balances, run_projection
+from hierarchical_forecast import forecast_flows
+from inventory_advisor import latest_balances, balance_lookup
 
 def clean_data_summary(df):
     # Clean column names by removing special characters and extra spaces
@@ -26,7 +33,7 @@ def clean_data_summary(df):
     # Convert numeric columns, handling commas and errors
     numeric_cols = ['Unrestricted_Stock', 'Stock_Sell_Value', 'Loss_Value']
     for col in numeric_cols:
-        if col in df.columns:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
             df[col] = df[col].astype(str).str.replace(',', '', regex=False)
             df[col] = pd.to_numeric(df[col], errors='coerce')
     
@@ -36,12 +43,50 @@ def clean_data_summary(df):
 
     # Drop rows with NaN in critical columns
     df.dropna(subset=['Date', 'Plant', 'Material', 'Unrestricted_Stock', 'Stock_Sell_Value'], inplace=True)
+
+    # Plant and Material repeat on every row, so store them as categoricals
+    df['Plant'] = df['Plant'].astype('category')
+    df['Material'] = df['Material'].astype('category')
     
     return df
 
+@st.cache_resource(max_entries=2)
+def load_summary(file_path, mtime):
+    """
+    Loads and cleans the inventory summary once per process. The cache is
+    shared by every session and keyed on the file's mtime, so reruns only pay
+    for filtering and aggregation. The returned frame is shared: don't mutate it.
+    """
+    df = load_table('inventory_summary', file_path)
+    return clean_data_summary(df)
+
+@st.cache_resource(max_entries=2)
+def load_cube(file_path, mtime):
+    """Date x Plant x Material rollup of the cleaned summary, built once per file version."""
+    return build_cube(load_summary(file_path, mtime))
+
+@st.cache_resource(max_entries=2)
+def load_balances(file_path, mtime):
+    """(Plant, Material) -> latest snapshot balance, built once per file version."""
+    balances = latest_balances(load_summary(file_path, mtime), ['Unrestricted_Stock', 'Stock_Sell_Value'],
+                               'Date', 'Plant', 'Material')
+    return balance_lookup(balances)
+
+@st.cache_resource(max_entries=2)
+def load_projection_inputs(mtimes):
+    """
+    Opening balances, reconciled flow forecasts and the capacity plan, fitted
+    once per version of the source files; the projection itself is rerun on
+    every interaction.
+    """
+    opening, snapshot = opening_balances(load_table('inventory'))
+    outbound_fc, inbound_fc = forecast_flows(load_table('outbound'), load_table('inbound'), snapshot)
+    return opening, snapshot, outbound_fc, inbound_fc, load_capacity_plan(CAPACITY_FILE)
+
 def main():
     st.set_page_config(layout="wide")
-    page = st.sidebar.radio("Navigation", ["Inventory Dashboard", "Inventory Recommendations", "Chatbot"])
+    page = st.sidebar.radio("Navigation", ["Inventory Dashboard", "Inventory Recommendations", "Inventory Projection",
+                                           "Chatbot"])
 
     file_path = os.path.join(os.getcwd(), 'Data_Analysis(Inventory Summary).csv')
     
@@ -50,8 +95,8 @@ def main():
         st.stop()
 
     try:
-        df = pd.read_csv(file_path)
-        df = clean_data_summary(df)
+        df = load_summary(file_path, os.path.getmtime(file_path))
+        cube = load_cube(file_path, os.path.getmtime(file_path))
     except Exception as e:
         st.error(f"Error loading or cleaning data: {e}")
         st.stop()
@@ -66,34 +111,36 @@ def main():
         max_date = df['Date'].max().to_pydatetime()
         date_range = st.sidebar.date_input("Select Date Range", value=(min_date, max_date), min_value=min_date, max_value=max_date)
 
+        # Every KPI and chart below is answered from the pre-aggregated cube
         if len(date_range) == 2:
-            start_date, end_date = date_range
-            df_filtered = df[(df['Date'] >= pd.to_datetime(start_date)) & (df['Date'] <= pd.to_datetime(end_date))]
+            start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
         else:
-            df_filtered = df.copy()
+            start_date, end_date = None, None
+        cube_filtered = slice_cube(cube, start_date, end_date)
 
         # Plant Filter
-        all_plants = ['All'] + sorted(df_filtered['Plant'].unique().tolist())
+        all_plants = ['All'] + cube_labels(cube_filtered, 'Plant')
         selected_plants = st.sidebar.multiselect("Select Plant(s)", all_plants, default=['All'])
-        if 'All' not in selected_plants:
-            df_filtered = df_filtered[df_filtered['Plant'].isin(selected_plants)]
+        plants = None if 'All' in selected_plants else selected_plants
+        cube_filtered = slice_cube(cube_filtered, plants=plants)
 
         # Material Filter
-        all_materials = ['All'] + sorted(df_filtered['Material'].unique().tolist())
+        all_materials = ['All'] + cube_labels(cube_filtered, 'Material')
         selected_materials = st.sidebar.multiselect("Select Material(s)", all_materials, default=['All'])
-        if 'All' not in selected_materials:
-            df_filtered = df_filtered[df_filtered['Material'].isin(selected_materials)]
+        materials = None if 'All' in selected_materials else selected_materials
+        cube_filtered = slice_cube(cube_filtered, materials=materials)
 
-        if df_filtered.empty:
+        if cube_is_empty(cube_filtered):
             st.warning("No data available for the selected filters.")
             return
 
         st.header("Key Performance Indicators")
         col1, col2, col3 = st.columns(3)
         
-        total_stock = df_filtered['Unrestricted_Stock'].sum()
-        total_sell_value = df_filtered['Stock_Sell_Value'].sum()
-        total_loss_value = df_filtered['Loss_Value'].sum()
+        totals = cube_totals(cube_filtered)
+        total_stock = totals['Unrestricted_Stock']
+        total_sell_value = totals['Stock_Sell_Value']
+        total_loss_value = totals['Loss_Value']
 
         col1.metric("Total Unrestricted Stock", f"{total_stock:,.0f}")
         col2.metric("Total Stock Sell Value", f"${total_sell_value:,.2f}")
@@ -102,11 +149,11 @@ def main():
         st.header("Inventory Trends Over Time")
         
         # Aggregate data for time series plot
-        df_time_series = df_filtered.groupby('Date').agg(
-            Total_Stock=('Unrestricted_Stock', 'sum'),
-            Total_Sell_Value=('Stock_Sell_Value', 'sum'),
-            Total_Loss_Value=('Loss_Value', 'sum')
-        ).reset_index()
+        df_time_series = cube_by(cube_filtered, 'Date').rename(columns={
+            'Unrestricted_Stock': 'Total_Stock',
+            'Stock_Sell_Value': 'Total_Sell_Value',
+            'Loss_Value': 'Total_Loss_Value'
+        })
 
         fig_stock_trend = px.line(df_time_series, x='Date', y='Total_Stock', title='Total Unrestricted Stock Over Time')
         st.plotly_chart(fig_stock_trend, use_container_width=True)
@@ -115,38 +162,49 @@ def main():
         st.plotly_chart(fig_value_trend, use_container_width=True)
 
         st.header("Inventory Distribution")
+        by_plant = cube_by(cube_filtered, 'Plant')
+        by_material = cube_by(cube_filtered, 'Material')
         
         # Stock by Plant
-        stock_by_plant = df_filtered.groupby('Plant')['Unrestricted_Stock'].sum().reset_index().sort_values(by='Unrestricted_Stock', ascending=False)
+        stock_by_plant = by_plant[['Plant', 'Unrestricted_Stock']].sort_values(by='Unrestricted_Stock', ascending=False)
         fig_stock_plant = px.bar(stock_by_plant, x='Plant', y='Unrestricted_Stock', title='Unrestricted Stock by Plant')
         st.plotly_chart(fig_stock_plant, use_container_width=True)
 
         # Stock by Material (Top N)
-        stock_by_material = df_filtered.groupby('Material')['Unrestricted_Stock'].sum().reset_index().sort_values(by='Unrestricted_Stock', ascending=False)
+        stock_by_material = by_material[['Material', 'Unrestricted_Stock']].sort_values(by='Unrestricted_Stock', ascending=False)
         fig_stock_material = px.bar(stock_by_material.head(10), x='Material', y='Unrestricted_Stock', title='Top 10 Unrestricted Stock by Material')
         st.plotly_chart(fig_stock_material, use_container_width=True)
 
         st.header("Loss Analysis")
         
         # Loss by Plant
-        loss_by_plant = df_filtered.groupby('Plant')['Loss_Value'].sum().reset_index().sort_values(by='Loss_Value', ascending=False)
+        loss_by_plant = by_plant[['Plant', 'Loss_Value']].sort_values(by='Loss_Value', ascending=False)
         fig_loss_plant = px.bar(loss_by_plant, x='Plant', y='Loss_Value', title='Loss Value by Plant')
         st.plotly_chart(fig_loss_plant, use_container_width=True)
 
         # Loss by Material (Top N)
-        loss_by_material = df_filtered.groupby('Material')['Loss_Value'].sum().reset_index().sort_values(by='Loss_Value', ascending=False)
+        loss_by_material = by_material[['Material', 'Loss_Value']].sort_values(by='Loss_Value', ascending=False)
         fig_loss_material = px.bar(loss_by_material.head(10), x='Material', y='Loss_Value', title='Top 10 Loss Value by Material')
         st.plotly_chart(fig_loss_material, use_container_width=True)
 
         st.header("Detailed Data")
-        st.dataframe(df_filtered)
+        mask = pd.Series(True, index=df.index)
+        if start_date is not None:
+            mask &= (df['Date'] >= start_date) & (df['Date'] <= end_date)
+        if plants is not None:
+            mask &= df['Plant'].isin(plants)
+        if materials is not None:
+            mask &= df['Material'].isin(materials)
+        render_paged_table(df[mask], key='detailed_data')
 
     elif page == "Inventory Recommendations":
-        recommendations_page()
+        recommendations_page(load_balances(file_path, os.path.getmtime(file_path)), cube_labels(cube, 'Plant'))
+    elif page == "Inventory Projection":
+        projection_page()
     elif page == "Chatbot":
-        chatbot_page(df)
+        chatbot_page(df, cube)
 
-def recommendations_page():
+def recommendations_page(balances, plants):
     st.title("Inventory Recommendations")
     file_path = os.path.join(os.getcwd(), 'inventory_recommendations.csv')
     
@@ -156,23 +214,88 @@ def recommendations_page():
 
     try:
         df_reco = pd.read_csv(file_path)
-        st.dataframe(df_reco)
+        render_paged_table(df_reco, key='recommendations')
     except Exception as e:
         st.error(f"Error loading inventory recommendations data: {e}")
         st.stop()
 
-from rag_chatbot import get_ai_response
+    # Forecast plots are rendered only when a material is opened
+    st.header("Material Forecast")
+    material = st.selectbox("Select Material", sorted(df_reco['MATERIAL_NAME'].unique()), index=None)
+    if material:
+        # Current stock per plant, one key lookup each
+        if plants:
+            cols = st.columns(len(plants))
+            for col, plant in zip(cols, plants):
+                balance = balances.get((plant, material))
+                if balance is None:
+                    col.metric(plant, "Not stocked")
+                else:
+                    col.metric(plant, f"{balance['Unrestricted_Stock']:,.0f}",
+                               help=f"Latest snapshot {balance['Date']:%Y-%m-%d}")
+        else:
+            st.info("No plant balances available.")
+        plot_file = ensure_plot(material)
+        if plot_file is None:
+            st.warning(f"No forecast available for {material}.")
+        else:
+            st.image(plot_file)
+
+def projection_page():
+    st.title("Inventory Projection")
+    sources = [os.path.join(os.getcwd(), name) for name in
+               ['Inventory.csv', 'Outbound_cleaned.csv', 'Inbound_cleaned.csv', CAPACITY_FILE]]
+    missing = [path for path in sources if not os.path.exists(path)]
+    if missing:
+        st.error(f"File not found: {', '.join(missing)}")
+        st.stop()
+
+    with st.spinner("Forecasting inbound and outbound..."):
+        opening, snapshot, outbound_fc, inbound_fc, plan = load_projection_inputs(
+            tuple(os.path.getmtime(path) for path in sources))
 
-def chatbot_page(df):
+    st.write(f"Stock rolled forward month by month from the {snapshot:%Y-%m-%d} balances "
+             "with expected inbound and forecast outbound.")
+    col1, col2 = st.columns(2)
+    outbound_scale = col1.slider("Outbound demand (% of forecast)", 50, 200, 100, step=5) / 100
+    inbound_scale = col2.slider("Inbound supply (% of forecast)", 0, 200, 100, step=5) / 100
+
+    # Vectorized over every SKU, so it reruns instantly on each change
+    sku_df, plant_df = run_projection(opening, inbound_fc, outbound_fc, plan, inbound_scale, outbound_scale)
+
+    fig = px.line(plant_df, x='MONTH', y='UTILIZATION', color='PLANT_NAME', markers=True,
+                  title='Projected capacity utilization')
+    fig.add_hline(y=1.0, line_dash='dash', line_color='red')
+    st.plotly_chart(fig, use_container_width=True)
+
+    plants = st.multiselect("Plant(s)", sorted(sku_df['PLANT_NAME'].unique()))
+    at_risk = sku_df[sku_df['STOCKOUT_MONTH'].notna() & (sku_df['OPENING_STOCK_MT'] > 0)]
+    if plants:
+        at_risk = at_risk[at_risk['PLANT_NAME'].isin(plants)]
+    st.header(f"SKUs running out within the horizon ({len(at_risk)})")
+    render_paged_table(at_risk.sort_values('DAYS_OF_COVER'), key='projection_at_risk')
+
+    st.header("Plant projection")
+    render_paged_table(plant_df, key='projection_plants')
+
+def chatbot_page(df, cube):
     st.title("Inventory Chatbot (AI Powered)")
-    st.write("Ask me questions about the inventory data. For example: 'What is the stock for MAT-0001?' or 'Show me details about Plant A'.")
+    st.write("Ask me questions about the inventory data. For example: 'What is the stock for MAT-0001?' or 'Show me details about plant CHINA-WAREHOUSE'.")
 
     user_query = st.text_input("Your question:")
+    stream = st.checkbox("Stream AI answers as they are generated", value=True)
 
     if user_query:
         with st.spinner("Thinking..."):
-            response = get_ai_response(user_query, df)
-            st.write(f"**Chatbot:** {response}")
+            result = answer_question(user_query, df, cube, stream=stream)
+        st.write("**Chatbot:**")
+        if result['stream'] is not None:
+            # First tokens render while the rest of the answer is generated
+            st.write_stream(result['stream'])
+        else:
+            st.write(result['answer'])
+        served_by = {'structured': "structured query engine", 'cache': "response cache", 'llm': "AI model"}[result['path']]
+        st.caption(f"Answered by the {served_by} in {result['elapsed_ms']:,.1f} ms")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
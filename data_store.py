@@ -0,0 +1,243 @@
+
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - falls back to parsing the CSV every time
+    feather = None
+
+CACHE_DIR = '.data_cache'
+
+# Bump when a table's typing rules change so existing cache files are rebuilt
+CACHE_VERSION = 2
+
+# Narrowest integer type numeric columns are stored as. int8 / int16 would save
+# a little more but overflow silently in derived arithmetic (months * 30,
+# value * percent), so narrowing stops here.
+MIN_INT_DTYPE = np.int32
+
+# How each source CSV is turned into a typed table: date columns with their
+# known format, low-cardinality text columns stored as categoricals, numeric
+# columns that may contain thousands separators, and ID columns whose values
+# are a prefix plus a number, with the format that turns the number back into
+# the ID (see encode_ids).
+TABLES = {
+    'inventory_summary': {
+        'file': 'Data_Analysis(Inventory Summary).csv',
+        'read_csv': {},
+        'dates': {'BALANCE_AS_OF_DATE': '%Y-%m-%d'},
+        'categories': ['PLANT_NAME', 'MATERIAL_NAME', 'IS_OVER_SHELFLIFE'],
+        'numeric': ['UNRESRICTED_STOCK', 'STOCK_SELL_VALUE', 'LOSS_VALUE(OCCUR)', 'LOSS_VALUE', 'PREVENTABLE'],
+        'ids': {'MATERIAL_NAME': 'MAT-{:04d}'},
+    },
+    'inventory': {
+        'file': 'Inventory.csv',
+        'read_csv': {'encoding': 'utf-8-sig', 'dtype': {'BATCH_NUMBER': str}},
+        'dates': {'BALANCE_AS_OF_DATE': '%m/%d/%Y'},
+        'categories': ['PLANT_NAME', 'MATERIAL_NAME', 'BATCH_NUMBER', 'STOCK_UNIT', 'CURRENCY'],
+        'numeric': ['UNRESRICTED_STOCK', 'STOCK_SELL_VALUE'],
+        'ids': {'MATERIAL_NAME': 'MAT-{:04d}'},
+    },
+    'inbound': {
+        'file': 'Inbound_cleaned.csv',
+        'read_csv': {},
+        'dates': {'INBOUND_DATE': '%Y-%m-%d'},
+        'categories': ['PLANT_NAME', 'MATERIAL_NAME'],
+        'numeric': ['NET_QUANTITY_MT'],
+        'ids': {'MATERIAL_NAME': 'MAT-{:04d}'},
+    },
+    'inbound_raw': {
+        'file': 'Inbound.csv',
+        'read_csv': {'encoding': 'utf-8-sig'},
+        'dates': {'INBOUND_DATE': '%Y/%m/%d'},
+        'categories': ['PLANT_NAME', 'MATERIAL_NAME'],
+        'numeric': ['NET_QUANTITY_MT'],
+        'ids': {'MATERIAL_NAME': 'MAT-{:04d}'},
+    },
+    'outbound': {
+        'file': 'Outbound_cleaned.csv',
+        'read_csv': {},
+        'dates': {'OUTBOUND_DATE': '%Y-%m-%d'},
+        'categories': ['PLANT_NAME', 'MODE_OF_TRANSPORT', 'MATERIAL_NAME', 'CUSTOMER_NUMBER'],
+        'numeric': ['NET_QUANTITY_MT'],
+        'ids': {'MATERIAL_NAME': 'MAT-{:04d}', 'CUSTOMER_NUMBER': 'CST-{:05d}'},
+    },
+    'material_master': {
+        'file': 'MaterialMaster.csv',
+        'read_csv': {'encoding': 'utf-8-sig'},
+        'dates': {},
+        'categories': ['MATERIAL_NAME', 'POLYMER_TYPE'],
+        'numeric': ['SHELF_LIFE_IN_MONTH', 'DOWNGRADE_VALUE_LOST_PERCENT'],
+        'ids': {'MATERIAL_NAME': 'MAT-{:04d}'},
+    },
+}
+
+
+def source_path(name):
+    return os.path.join(os.getcwd(), TABLES[name]['file'])
+
+
+def compact_numeric(series):
+    """
+    The same values in the narrowest dtype that holds every one of them
+    exactly: integers (and whole-number floats without NaN) as int32 when
+    they fit, other floats as float32 only when no value changes.
+    """
+    values = series.to_numpy()
+    if values.dtype.kind == 'f' and len(values) and not np.isnan(values).any() and (values % 1 == 0).all():
+        values = values.astype(np.int64)
+    if values.dtype.kind in 'iu':
+        info = np.iinfo(MIN_INT_DTYPE)
+        if len(values) and info.min <= values.min() and values.max() <= info.max:
+            values = values.astype(MIN_INT_DTYPE)
+    elif values.dtype == np.float64:
+        narrow = values.astype(np.float32)
+        if ((narrow == values) | np.isnan(values)).all():
+            values = narrow
+    if values.dtype == series.dtype:
+        return series
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def parse_table(name, path=None):
+    """
+    Parses a source CSV into its compact typed form, without touching the
+    cache. Categorical columns are built while parsing, so the full column of
+    Python strings never exists.
+    """
+    spec = TABLES[name]
+    read_csv = dict(spec['read_csv'])
+    read_csv['dtype'] = {**read_csv.get('dtype', {}), **{col: 'category' for col in spec['categories']}}
+    df = pd.read_csv(path or source_path(name), **read_csv)
+
+    for col, fmt in spec['dates'].items():
+        df[col] = pd.to_datetime(df[col], format=fmt, errors='coerce')
+
+    # Strip thousands separators; anything else non-numeric (e.g. ' - ') becomes NaN
+    for col in spec['numeric']:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '', regex=False), errors='coerce')
+
+    for col in df.select_dtypes('number').columns:
+        df[col] = compact_numeric(df[col])
+    return df
+
+
+def encode_ids(df, name, columns=None):
+    """
+    Replaces the ID columns of table `name` (MAT-0001, CST-00042, ...) with
+    their numbers (1, 42, ...): int16 when every number fits, else int32.
+    IDs are never added up, so the overflow concern behind MIN_INT_DTYPE does
+    not apply. The number is parsed once per category, not per row; a missing
+    ID becomes -1. Other columns are shared with `df`, not copied.
+    """
+    ids = TABLES[name].get('ids', {})
+    out = df.copy(deep=False)
+    for col in columns or ids:
+        values = out[col].astype('category')
+        numbers = values.cat.categories.str.extract(r'(\d+)$', expand=False).astype(np.int64).to_numpy()
+        dtype = np.int16 if numbers.max(initial=0) <= np.iinfo(np.int16).max else np.int32
+        # Appending -1 makes code -1 (a missing ID) map to -1
+        out[col] = np.append(numbers, -1).astype(dtype)[values.cat.codes.to_numpy()]
+    return out
+
+
+def decode_ids(df, name, columns=None):
+    """Inverse of encode_ids: ID numbers back to categorical ID strings, -1 to NaN."""
+    ids = TABLES[name].get('ids', {})
+    out = df.copy(deep=False)
+    for col in columns or ids:
+        numbers = out[col].to_numpy()
+        uniques, codes = np.unique(numbers[numbers >= 0], return_inverse=True)
+        all_codes = np.full(len(numbers), -1)
+        all_codes[numbers >= 0] = codes
+        out[col] = pd.Categorical.from_codes(all_codes, [ids[col].format(n) for n in uniques])
+    return out
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_state(path):
+    stat = os.stat(path)
+    return {'version': CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _cache_paths(name, path):
+    # Key the cache file on the source path so overridden inputs don't collide
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    base = os.path.join(CACHE_DIR, f'{name}-{key}')
+    return f'{base}.feather', f'{base}.json'
+
+
+def _cache_is_fresh(path, meta_path):
+    """
+    The cache is fresh when the source's mtime and size are unchanged. If only
+    the mtime moved (e.g. after a checkout), the content hash decides, and a
+    match just refreshes the recorded mtime.
+    """
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+
+    state = _source_state(path)
+    if meta.get('version') != state['version'] or meta.get('size') != state['size']:
+        return False
+    if meta.get('mtime_ns') == state['mtime_ns']:
+        return True
+    if meta.get('sha1') != _file_hash(path):
+        return False
+
+    meta['mtime_ns'] = state['mtime_ns']
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return True
+
+
+def load_table(name, path=None):
+    """
+    Returns the typed table for a source CSV. The first call converts the CSV
+    into an uncompressed Feather file under CACHE_DIR; later calls memory-map
+    that file instead of reparsing text, until the source changes.
+    Without pyarrow the CSV is parsed on every call.
+    """
+    path = path or source_path(name)
+    if feather is None:
+        return parse_table(name, path)
+
+    data_path, meta_path = _cache_paths(name, path)
+    if os.path.exists(data_path) and _cache_is_fresh(path, meta_path):
+        return feather.read_table(data_path, memory_map=True).to_pandas()
+
+    df = parse_table(name, path)
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+    df.to_feather(f'{data_path}.tmp', compression='uncompressed')
+    os.replace(f'{data_path}.tmp', data_path)
+
+    meta = _source_state(path)
+    meta['sha1'] = _file_hash(path)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return df
+
+
+def main():
+    # Warm the cache for every source, e.g. after new extracts land
+    for name in TABLES:
+        df = load_table(name)
+        print(f"{name}: {len(df)} rows cached from '{TABLES[name]['file']}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+
+import pandas as pd
+import numpy as np
+from trend import trend
+
+# Smoothing parameter grid searched for every series at once: level (alpha),
+# trend (beta) and trend damping (phi: 0.0 = no trend, 1.0 = undamped Holt)
+ALPHAS = np.linspace(0.1, 0.9, 9)
+BETAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5])
+PHIS = np.array([0.0, 0.8, 0.9, 1.0])
+
+# Same minimum history as the SARIMAX path
+MIN_POINTS = 3
+
+
+def active_spans(values):
+    """First and last non-NaN column of every row of a key x period matrix."""
+    active = ~np.isnan(values)
+    first = active.argmax(axis=1)
+    last = values.shape[1] - 1 - active[:, ::-1].argmax(axis=1)
+    return first, last, active.any(axis=1)
+
+
+def fit_holt(values, alphas=ALPHAS, betas=BETAS, phis=PHIS):
+    """
+    Fits damped Holt exponential smoothing to every row of a key x period
+    matrix in one pass over the periods. Each row is smoothed over its own
+    active span with every (alpha, beta, phi) on the grid simultaneously, and
+    the combination with the lowest one-step-ahead squared error is kept.
+    Returns a dict of per-row arrays: level, trend, alpha, beta, phi, sse.
+    """
+    alpha, beta, phi = (grid.ravel() for grid in np.meshgrid(alphas, betas, phis, indexing='ij'))
+    first, last, _ = active_spans(values)
+    n_rows, n_periods = values.shape
+
+    level = np.zeros((n_rows, len(alpha)))
+    trend = np.zeros((n_rows, len(alpha)))
+    sse = np.zeros((n_rows, len(alpha)))
+    for t in range(n_periods):
+        y = np.nan_to_num(values[:, t])[:, None]
+        start = (t == first)[:, None]
+        second = ((t == first + 1) & (t <= last))[:, None]
+        update = ((t >= first + 2) & (t <= last))[:, None]
+
+        # Initialize from the first two points, then smooth
+        prediction = level + phi * trend
+        error = y - prediction
+        smoothed_level = alpha * y + (1 - alpha) * prediction
+        smoothed_trend = beta * (smoothed_level - level) + (1 - beta) * phi * trend
+
+        sse = np.where(update, sse + error ** 2, sse)
+        trend = np.where(start, 0.0, np.where(second, y - level, np.where(update, smoothed_trend, trend)))
+        level = np.where(start | second, y, np.where(update, smoothed_level, level))
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(n_rows)
+    return {
+        'level': level[rows, best],
+        'trend': trend[rows, best],
+        'alpha': alpha[best],
+        'beta': beta[best],
+        'phi': phi[best],
+        'sse': sse[rows, best],
+    }
+
+
+def holt_paths(fit, steps):
+    """Forecasts `steps` periods ahead from fit_holt's final states: a (rows x steps) array."""
+    damping = np.cumsum(fit['phi'][:, None] ** np.arange(1, steps + 1), axis=1)
+    return fit['level'][:, None] + damping * fit['trend'][:, None]
+
+
+def holt_forecast(matrix, steps=12, min_points=MIN_POINTS):
+    """
+    Forecasts every key of a period matrix (see monthly_matrix) `steps`
+    months past its own last active month, all keys at once. Returns a frame
+    with the MATERIAL_NAME / MONTH / FORECASTED_QUANTITY_MT / TREND_SLOPE
+    schema of material_forecast, keys in matrix order, and the list of keys
+    skipped for having fewer than `min_points` months.
+    """
+    values = matrix.to_numpy(dtype=float)
+    first, last, any_active = active_spans(values)
+    enough = any_active & (last - first + 1 >= min_points)
+    keys = matrix.index[enough]
+
+    fit = fit_holt(values[enough])
+    forecasts = holt_paths(fit, steps)
+    horizon = np.arange(1, steps + 1)
+
+    # Least-squares slope of each forecast over the horizon
+    slopes, _ = trend(forecasts)
+
+    # Month numbers past each key's last active month
+    periods = matrix.columns
+    month_numbers = (periods.year * 12 + periods.month - 1).to_numpy()[last[enough]][:, None] + horizon
+    months = pd.to_datetime(pd.DataFrame({
+        'year': month_numbers.ravel() // 12,
+        'month': month_numbers.ravel() % 12 + 1,
+        'day': 1,
+    }))
+
+    forecast_df = pd.DataFrame({
+        matrix.index.name or 'MATERIAL_NAME': np.repeat(keys.to_numpy(), steps),
+        'MONTH': months,
+        'FORECASTED_QUANTITY_MT': forecasts.ravel(),
+        'TREND_SLOPE': np.repeat(slopes, steps),
+    })
+    return forecast_df, list(matrix.index[~enough])
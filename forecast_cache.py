@@ -0,0 +1,64 @@
+
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+
+CACHE_FILE = 'material_forecast_cache.json'
+
+
+def series_fingerprint(monthly_data, order, steps, trend='n'):
+    """Hashes a monthly series together with the model order, trend and horizon it was fitted with."""
+    digest = hashlib.sha1()
+    digest.update(monthly_data.index.asi8.tobytes())
+    digest.update(monthly_data.to_numpy(dtype=float).tobytes())
+    digest.update(repr((tuple(order), steps)).encode())
+    # Only models with a trend hash it, so entries fitted without one stay valid
+    if trend != 'n':
+        digest.update(trend.encode())
+    return digest.hexdigest()
+
+
+def load_cache(path=CACHE_FILE):
+    """Returns the cached entries keyed by material, or an empty dict if there is no usable cache."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable forecast cache {path}. Reason: {e}")
+        return {}
+
+
+def save_cache(entries, path=CACHE_FILE):
+    """
+    Writes the cache atomically. Only the entries passed in are kept, so
+    materials that were not part of this run are evicted.
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, path)
+
+
+def make_entry(fingerprint, order, forecast_df, params, trend='n'):
+    return {
+        'fingerprint': fingerprint,
+        'order': list(order),
+        'trend': trend,
+        'months': [month.isoformat() for month in pd.to_datetime(forecast_df['MONTH'])],
+        'forecast': forecast_df['FORECASTED_QUANTITY_MT'].tolist(),
+        'params': np.asarray(params, dtype=float).tolist(),
+    }
+
+
+def entry_to_forecast(material, entry):
+    """Rebuilds the forecast frame from a cache entry; TREND_SLOPE is added later for all materials at once."""
+    forecast_df = pd.DataFrame({
+        'MATERIAL_NAME': material,
+        'MONTH': pd.to_datetime(entry['months']),
+        'FORECASTED_QUANTITY_MT': entry['forecast'],
+    })
+    return forecast_df
@@ -0,0 +1,144 @@
+
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+from trend import trend
+from data_store import load_table
+from monthly_matrix import build_period_matrix, series_by_key
+
+OUTPUT_PLOT_DIR = 'material_forecast_plots'
+FORECAST_FILE = 'material_monthly_forecast.csv'
+OUTBOUND_FILE = 'Outbound_cleaned.csv'
+
+
+def plot_path(material, plot_dir=OUTPUT_PLOT_DIR):
+    return os.path.join(plot_dir, f'{material}_forecast.png')
+
+
+def draw_material_forecast(ax, material, monthly_data, forecast_df):
+    """
+    Draws one material's history, forecast and trend line onto an existing
+    Axes. The line is fitted with the TREND_METHOD and TREND_HORIZON the
+    forecast file records, so it matches TREND_SLOPE; files written before
+    those columns existed used least squares over the whole horizon.
+    """
+    forecast_index = pd.to_datetime(forecast_df['MONTH'])
+    forecast_values = forecast_df['FORECASTED_QUANTITY_MT'].to_numpy()
+    slope = forecast_df['TREND_SLOPE'].iloc[0]
+
+    method = forecast_df['TREND_METHOD'].iloc[0] if 'TREND_METHOD' in forecast_df else 'ols'
+    horizon = int(forecast_df['TREND_HORIZON'].iloc[0]) if 'TREND_HORIZON' in forecast_df else None
+    trend_line = trend(forecast_values, method, horizon)[1][0]
+
+    ax.clear()
+    ax.plot(monthly_data.index, monthly_data, label='Historical Monthly Sales')
+    ax.plot(forecast_index, forecast_values, label='Forecasted Sales')
+    ax.plot(forecast_index, trend_line, label=f'Trend (slope: {slope:.2f})', linestyle='--')
+    ax.set_title(f'Monthly Sales Forecast for {material}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Net Quantity (MT)')
+    ax.legend()
+    ax.grid(True)
+
+
+def render_plots(history, forecasts, plot_dir=OUTPUT_PLOT_DIR):
+    """
+    Renders one PNG per material in `forecasts`, reusing a single Figure and
+    Axes for all of them. Returns the paths written.
+    """
+    if not os.path.exists(plot_dir):
+        os.makedirs(plot_dir)
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    paths = []
+    try:
+        for material, forecast_df in forecasts.items():
+            draw_material_forecast(ax, material, history[material], forecast_df)
+            path = plot_path(material, plot_dir)
+            fig.savefig(path)
+            paths.append(path)
+    finally:
+        plt.close(fig)
+    return paths
+
+
+def _render_task(task):
+    return render_plots(*task)
+
+
+def render_plots_parallel(history, forecasts, plot_dir=OUTPUT_PLOT_DIR, workers=None):
+    """
+    Splits the materials into one batch per worker and renders each batch in
+    its own process with its own reused Figure. workers=1 renders in this process.
+    """
+    if workers == 1:
+        return render_plots(history, forecasts, plot_dir)
+
+    workers = workers or os.cpu_count() or 1
+    materials = list(forecasts)
+    batches = [materials[i::workers] for i in range(workers)]
+    tasks = [
+        ({m: history[m] for m in batch}, {m: forecasts[m] for m in batch}, plot_dir)
+        for batch in batches if batch
+    ]
+
+    paths = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_paths in executor.map(_render_task, tasks):
+            paths.extend(batch_paths)
+    return paths
+
+
+def load_plot_inputs(forecast_file=FORECAST_FILE, outbound_file=OUTBOUND_FILE, materials=None):
+    """Loads monthly history and forecasts keyed by material, optionally limited to `materials`."""
+    forecast_df = pd.read_csv(forecast_file, parse_dates=['MONTH'])
+    if materials is not None:
+        forecast_df = forecast_df[forecast_df['MATERIAL_NAME'].isin(materials)]
+    if forecast_df.empty:
+        return {}, {}
+
+    outbound_df = load_table('outbound', outbound_file)
+    outbound_df = outbound_df[outbound_df['MATERIAL_NAME'].isin(forecast_df['MATERIAL_NAME'].unique())]
+
+    history = series_by_key(build_period_matrix(outbound_df, 'OUTBOUND_DATE'))
+    forecasts = {material: group for material, group in forecast_df.groupby('MATERIAL_NAME', sort=False)}
+    return history, forecasts
+
+
+def ensure_plot(material, plot_dir=OUTPUT_PLOT_DIR, forecast_file=FORECAST_FILE, outbound_file=OUTBOUND_FILE):
+    """
+    Returns the PNG path for one material, rendering it first if it is missing
+    or older than the forecast file. Returns None if the material has no forecast.
+    """
+    path = plot_path(material, plot_dir)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(forecast_file):
+        return path
+
+    history, forecasts = load_plot_inputs(forecast_file, outbound_file, materials=[material])
+    if material not in forecasts:
+        return None
+    render_plots(history, forecasts, plot_dir)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render per-material forecast plots.')
+    parser.add_argument('materials', nargs='*', help='Materials to render (default: every forecasted material).')
+    parser.add_argument('--forecast', default=FORECAST_FILE)
+    parser.add_argument('--input', default=OUTBOUND_FILE)
+    parser.add_argument('--plot-dir', default=OUTPUT_PLOT_DIR)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs, 1 = serial).')
+    args = parser.parse_args()
+
+    history, forecasts = load_plot_inputs(args.forecast, args.input, materials=args.materials or None)
+    paths = render_plots_parallel(history, forecasts, args.plot_dir, args.workers)
+    print(f"Rendered {len(paths)} plots into '{args.plot_dir}' directory.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+
+import pandas as pd
+import numpy as np
+import argparse
+import time
+from data_store import load_table
+from monthly_matrix import build_period_matrix
+from fast_forecast import MIN_POINTS, active_spans, fit_holt, holt_paths
+from stock_projection import (KEYS, CAPACITY_FILE, KG_PER_MT, MT_PER_KT, load_capacity_plan, opening_balances,
+                              run_projection)
+
+OUTPUT_FILE = 'hierarchical_forecast.csv'
+CAPACITY_OUTPUT_FILE = 'plant_capacity_forecast.csv'
+PLAN_OUTPUT_FILE = 'plant_plan_comparison.csv'
+FORECAST_STEPS = 12
+
+# bottom-up: plant and total forecasts are sums of the plant x material ones;
+# ols / mint: every level's base forecast is combined by generalized least
+# squares, with an identity or an in-sample error variance (MinT diagonal) weight
+RECONCILE_METHODS = ['bottom-up', 'ols', 'mint']
+
+# A final month whose data stops more than this many days before its end is
+# treated as incomplete and left out of training (the extracts end with a few
+# days of January 2025)
+COMPLETE_MONTH_SLACK_DAYS = 10
+
+
+def last_complete_month(dates):
+    """Start of the last month the transaction dates fully cover."""
+    last = dates.max()
+    month = last.to_period('M')
+    if last.day < month.days_in_month - COMPLETE_MONTH_SLACK_DAYS:
+        month -= 1
+    return month.to_timestamp()
+
+
+def plant_material_matrix(df, date_col, periods):
+    """
+    Plant x material monthly matrix over `periods`. Months after a pair's
+    first transaction are 0 when nothing moved, so every active series ends at
+    the last period and all forecasts share one horizon; earlier months are NaN.
+    """
+    matrix = build_period_matrix(df, date_col, KEYS).reindex(columns=periods)
+    values = matrix.to_numpy(dtype=float)
+    started = np.cumsum(~np.isnan(values), axis=1) > 0
+    return pd.DataFrame(np.where(started, np.nan_to_num(values), np.nan), index=matrix.index, columns=periods)
+
+
+def summing_matrix(bottom_index):
+    """
+    The (all series x bottom series) 0/1 matrix S mapping plant x material
+    series to every level of the hierarchy, and a frame labelling S's rows:
+    the total first, then each plant, then the bottom series.
+    """
+    plants = bottom_index.get_level_values('PLANT_NAME')
+    plant_names = list(dict.fromkeys(plants))
+    S = np.vstack([
+        np.ones((1, len(bottom_index))),
+        (np.asarray(plants)[None, :] == np.array(plant_names)[:, None]).astype(float),
+        np.eye(len(bottom_index)),
+    ])
+    labels = pd.DataFrame({
+        'LEVEL': ['total'] + ['plant'] * len(plant_names) + ['plant-material'] * len(bottom_index),
+        'PLANT_NAME': ['ALL'] + plant_names + list(plants),
+        'MATERIAL_NAME': ['ALL'] * (1 + len(plant_names)) + list(bottom_index.get_level_values('MATERIAL_NAME')),
+    })
+    return S, labels
+
+
+def base_forecasts(values, steps, min_points=MIN_POINTS):
+    """
+    Independent Holt forecasts of every row of an (all series x periods)
+    matrix in one vectorized pass, and each row's one-step-ahead error
+    variance. Rows with fewer than `min_points` active months forecast 0 and
+    get the largest variance, so MinT leans on the other levels for them.
+    """
+    first, last, any_active = active_spans(values)
+    enough = any_active & (last - first + 1 >= min_points)
+
+    forecasts = np.zeros((len(values), steps))
+    variances = np.full(len(values), np.nan)
+    fit = fit_holt(values[enough])
+    forecasts[enough] = holt_paths(fit, steps)
+    # The first two active months initialize the state and are not scored
+    variances[enough] = fit['sse'] / np.maximum(last - first - 1, 1)[enough]
+
+    scale = np.nanmax(variances) if enough.any() else 1.0
+    variances = np.where(np.isnan(variances), scale, variances)
+    # Perfectly fitted rows would get infinite weight
+    variances = np.maximum(variances, 1e-6 * max(scale, 1e-12))
+    return forecasts, variances
+
+
+def reconcile(base, S, method='mint', variances=None):
+    """
+    Coherent forecasts for every level from (all series x steps) base
+    forecasts: S @ P @ base with P = (S' W^-1 S)^-1 S' W^-1, W the identity
+    (ols) or diag(variances) (mint). bottom-up just sums the bottom rows.
+    """
+    n_bottom = S.shape[1]
+    if method == 'bottom-up':
+        return S @ base[-n_bottom:]
+    if method == 'ols':
+        weights = np.ones(len(S))
+    elif method == 'mint':
+        weights = 1.0 / variances
+    else:
+        raise ValueError(f"Unknown reconciliation method '{method}', expected one of {RECONCILE_METHODS}")
+
+    weighted = S.T * weights
+    return S @ np.linalg.solve(weighted @ S, weighted @ base)
+
+
+def non_negative(reconciled, S):
+    """
+    Sets negative bottom-level forecasts to 0 and sums the rest back up
+    through S, so every level stays coherent. Flows cannot be negative, and
+    the stock projection would otherwise clip them and disagree with the
+    plant totals.
+    """
+    return S @ np.maximum(reconciled[-S.shape[1]:], 0.0)
+
+
+def hierarchical_forecast(df, date_col, periods, steps=FORECAST_STEPS, method='mint'):
+    """
+    Forecasts a transaction table at plant x material, plant and total level
+    and reconciles them. Base forecasts are floored at 0 before reconciling
+    and negative reconciled bottom-level forecasts are set to 0 afterwards
+    (see non_negative). Returns a long frame with LEVEL / PLANT_NAME /
+    MATERIAL_NAME / MONTH / BASE_FORECAST_MT / FORECAST_MT, months following
+    the last of `periods`.
+    """
+    bottom = plant_material_matrix(df, date_col, periods)
+    S, labels = summing_matrix(bottom.index)
+
+    bottom_values = bottom.to_numpy()
+    started = ~np.isnan(bottom_values)
+    # Aggregate series start at the first month any of their members is active
+    aggregated = (S[:-len(bottom)] @ np.nan_to_num(bottom_values))
+    aggregated_started = (S[:-len(bottom)] @ started) > 0
+    all_values = np.vstack([np.where(aggregated_started, aggregated, np.nan), bottom_values])
+
+    base, variances = base_forecasts(all_values, steps)
+    base = np.maximum(base, 0.0)
+    reconciled = non_negative(reconcile(base, S, method, variances), S)
+
+    months = pd.date_range(periods[-1], periods=steps + 1, freq='MS')[1:]
+    forecast_df = labels.loc[labels.index.repeat(steps)].reset_index(drop=True)
+    forecast_df['MONTH'] = np.tile(months, len(labels))
+    forecast_df['BASE_FORECAST_MT'] = base.ravel()
+    forecast_df['FORECAST_MT'] = reconciled.ravel()
+    return forecast_df
+
+
+def snapshot_forecasts(outbound, inbound, snapshot, steps=FORECAST_STEPS, method='mint'):
+    """
+    Reconciled outbound and inbound forecasts at every level for the `steps`
+    months after the inventory snapshot, and the last training month. Both
+    flows train on the same complete months, ending at the snapshot month or
+    earlier if a flow's data ends before it; months between the end of
+    training and the snapshot are forecast too, then dropped.
+    """
+    end = min(last_complete_month(outbound['OUTBOUND_DATE']), last_complete_month(inbound['INBOUND_DATE']),
+              snapshot.to_period('M').to_timestamp())
+    start = min(outbound['OUTBOUND_DATE'].min(), inbound['INBOUND_DATE'].min()).to_period('M').to_timestamp()
+    periods = pd.date_range(start, end, freq='MS')
+    first_month = snapshot.to_period('M').to_timestamp() + pd.DateOffset(months=1)
+    extra = len(pd.date_range(end, first_month, freq='MS')) - 2
+
+    forecasts = []
+    for df, date_col in [(outbound, 'OUTBOUND_DATE'), (inbound, 'INBOUND_DATE')]:
+        df = df[df[date_col] < end + pd.DateOffset(months=1)]
+        forecast_df = hierarchical_forecast(df, date_col, periods, steps + extra, method)
+        forecasts.append(forecast_df[forecast_df['MONTH'] >= first_month].reset_index(drop=True))
+    return forecasts[0], forecasts[1], end
+
+
+def bottom_flows(forecast_df):
+    """The plant x material rows of a hierarchical forecast as a (plant, material) x month frame."""
+    bottom = forecast_df[forecast_df['LEVEL'] == 'plant-material']
+    return bottom.pivot(index=KEYS, columns='MONTH', values='FORECAST_MT')
+
+
+def forecast_flows(outbound, inbound, snapshot, steps=FORECAST_STEPS, method='mint'):
+    """
+    Reconciled plant x material outbound and inbound forecasts for the
+    `steps` months after the inventory snapshot (see snapshot_forecasts), as
+    two (plant, material) x month frames.
+    """
+    outbound_fc, inbound_fc, _ = snapshot_forecasts(outbound, inbound, snapshot, steps, method)
+    return bottom_flows(outbound_fc), bottom_flows(inbound_fc)
+
+
+def _plant_totals_kt(flows):
+    return flows.groupby(level='PLANT_NAME', observed=True).sum().stack() / MT_PER_KT
+
+
+def capacity_report(outbound_flows, inbound_flows, opening, plan):
+    """
+    Per plant and forecast month: forecast outbound and inbound (KT),
+    inventory projected from the (plant, material) `opening` balances in MT,
+    its utilization of plant capacity and the outbound that stock could not
+    cover. The flows are (plant, material) x month frames (see
+    forecast_flows); the plant totals are sums of the same flows
+    stock_projection.run_projection rolls forward, so every column agrees. Months past the planning sheet use the plant's last planned
+    capacity.
+    """
+    _, projected = run_projection(opening, inbound_flows, outbound_flows, plan)
+    projected = projected.rename(columns={'PROJECTED_STOCK_KT': 'PROJECTED_INVENTORY_KT'})
+
+    report = pd.DataFrame({'FORECAST_OUTBOUND_KT': _plant_totals_kt(outbound_flows),
+                           'FORECAST_INBOUND_KT': _plant_totals_kt(inbound_flows)}).fillna(0.0)
+    report = report.rename_axis(['PLANT_NAME', 'MONTH']).reset_index().merge(projected, on=['PLANT_NAME', 'MONTH'])
+    columns = ['PLANT_NAME', 'MONTH', 'FORECAST_OUTBOUND_KT', 'FORECAST_INBOUND_KT', 'PROJECTED_INVENTORY_KT',
+               'CAPACITY_KT', 'UTILIZATION', 'OVER_CAPACITY', 'UNMET_OUTBOUND_KT', 'SKUS_SHORT']
+    return report.sort_values(['PLANT_NAME', 'MONTH'], ignore_index=True)[columns]
+
+
+def plan_backtest(outbound, inbound, inventory, plan, method='mint'):
+    """
+    Checks the planning sheet's outbound and inventory against what happened
+    and against this model. The sheet covers months that are already in the
+    data, so each plan month gets a one-step backtest: forecast from the data
+    before it, stock projected from the previous month-end snapshot. Months
+    with fewer than MIN_POINTS months of history, or no previous snapshot,
+    have no backtest. Returns one row per plant and plan month with PLAN_,
+    BACKTEST_ and ACTUAL_ outbound and inventory in KT.
+    """
+    snapshots = inventory['BALANCE_AS_OF_DATE'].drop_duplicates().sort_values()
+    first_month = max(outbound['OUTBOUND_DATE'].min(), inbound['INBOUND_DATE'].min()).to_period('M')
+
+    backtests = []
+    for month in plan['MONTH'].drop_duplicates().sort_values():
+        before = snapshots[snapshots < month]
+        if before.empty or (month.to_period('M') - first_month).n < MIN_POINTS:
+            continue
+        snapshot = before.iloc[-1]
+        outbound_flows, inbound_flows = forecast_flows(outbound[outbound['OUTBOUND_DATE'] < month],
+                                                       inbound[inbound['INBOUND_DATE'] < month], snapshot, 1, method)
+        opening, _ = opening_balances(inventory[inventory['BALANCE_AS_OF_DATE'] <= snapshot])
+        _, projected = run_projection(opening, inbound_flows, outbound_flows, plan)
+        projected['BACKTEST_OUTBOUND_KT'] = _plant_totals_kt(outbound_flows).reindex(
+            pd.MultiIndex.from_frame(projected[['PLANT_NAME', 'MONTH']])).fillna(0.0).to_numpy()
+        backtests.append(projected.rename(columns={'PROJECTED_STOCK_KT': 'BACKTEST_INVENTORY_KT'}))
+    backtest = pd.concat(backtests, ignore_index=True)[['PLANT_NAME', 'MONTH', 'BACKTEST_OUTBOUND_KT',
+                                                        'BACKTEST_INVENTORY_KT']]
+
+    month_start = outbound['OUTBOUND_DATE'].dt.to_period('M').dt.to_timestamp()
+    actual_outbound = outbound.groupby(['PLANT_NAME', month_start], observed=True)['NET_QUANTITY_MT'].sum()
+    actual_outbound = (actual_outbound / MT_PER_KT).rename_axis(['PLANT_NAME', 'MONTH']).rename('ACTUAL_OUTBOUND_KT')
+    stock = inventory.groupby(['PLANT_NAME', 'BALANCE_AS_OF_DATE'], observed=True)['UNRESRICTED_STOCK'].sum()
+    stock = stock.reset_index()
+    stock['MONTH'] = stock['BALANCE_AS_OF_DATE'].dt.to_period('M').dt.to_timestamp()
+    stock['ACTUAL_INVENTORY_KT'] = stock['UNRESRICTED_STOCK'] / KG_PER_MT / MT_PER_KT
+
+    report = plan[['PLANT_NAME', 'MONTH', 'PLAN_OUTBOUND_KT', 'PLAN_INVENTORY_KT']]
+    report = report.merge(backtest, on=['PLANT_NAME', 'MONTH'], how='left')
+    report = report.merge(actual_outbound.reset_index(), on=['PLANT_NAME', 'MONTH'], how='left')
+    report = report.merge(stock[['PLANT_NAME', 'MONTH', 'ACTUAL_INVENTORY_KT']], on=['PLANT_NAME', 'MONTH'], how='left')
+    columns = ['PLANT_NAME', 'MONTH', 'PLAN_OUTBOUND_KT', 'BACKTEST_OUTBOUND_KT', 'ACTUAL_OUTBOUND_KT',
+               'PLAN_INVENTORY_KT', 'BACKTEST_INVENTORY_KT', 'ACTUAL_INVENTORY_KT']
+    return report.sort_values(['PLANT_NAME', 'MONTH'], ignore_index=True)[columns]
+
+
+def plan_errors(comparison):
+    """Mean absolute percentage error of the plan and of the backtest against actuals, per plant, over the backtested months."""
+    scored = comparison.dropna(subset=['BACKTEST_OUTBOUND_KT'])
+    errors = {}
+    for flow in ['OUTBOUND', 'INVENTORY']:
+        actual = scored[f'ACTUAL_{flow}_KT']
+        for source in ['PLAN', 'BACKTEST']:
+            errors[f'{source}_{flow}_MAPE'] = ((scored[f'{source}_{flow}_KT'] - actual).abs() / actual).groupby(
+                scored['PLANT_NAME']).mean()
+    return pd.DataFrame(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Reconciled plant x material, plant and total forecasts, compared against plant capacity.')
+    parser.add_argument('--outbound', default='Outbound_cleaned.csv')
+    parser.add_argument('--inbound', default='Inbound_cleaned.csv')
+    parser.add_argument('--capacity', default=CAPACITY_FILE, help='Planning sheet with each warehouse\'s capacity.')
+    parser.add_argument('--method', choices=RECONCILE_METHODS, default='mint')
+    parser.add_argument('--steps', type=int, default=FORECAST_STEPS)
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--capacity-output', default=CAPACITY_OUTPUT_FILE)
+    parser.add_argument('--plan-output', default=PLAN_OUTPUT_FILE)
+    args = parser.parse_args()
+
+    outbound = load_table('outbound', args.outbound)
+    inbound = load_table('inbound', args.inbound)
+    inventory = load_table('inventory')
+    opening, snapshot = opening_balances(inventory)
+    plan = load_capacity_plan(args.capacity)
+
+    began = time.perf_counter()
+    outbound_fc, inbound_fc, end = snapshot_forecasts(outbound, inbound, snapshot, args.steps, args.method)
+    elapsed = time.perf_counter() - began
+    n_series = outbound_fc['LEVEL'].eq('plant-material').sum() // args.steps
+    print(f"Forecasted {n_series} outbound plant x material series (trained through {end:%Y-%m}) "
+          f"and reconciled with {args.method} in {elapsed:.2f} s.")
+
+    forecasts = pd.concat([outbound_fc.assign(FLOW='outbound'), inbound_fc.assign(FLOW='inbound')], ignore_index=True)
+    forecasts.to_csv(args.output, index=False)
+    print(f"Forecasts saved to '{args.output}'.")
+
+    report = capacity_report(bottom_flows(outbound_fc), bottom_flows(inbound_fc), opening, plan)
+    report.to_csv(args.capacity_output, index=False)
+    print(report.to_string(index=False, float_format=lambda v: f'{v:,.2f}'))
+    print(f"Capacity comparison saved to '{args.capacity_output}'.")
+
+    # The planning sheet covers months already in the data, so it is checked
+    # against actuals and a backtest instead of the forward forecast
+    comparison = plan_backtest(outbound, inbound, inventory, plan, args.method)
+    comparison.to_csv(args.plan_output, index=False)
+    print(plan_errors(comparison).to_string(float_format=lambda v: f'{v:.1%}'))
+    print(f"Plan comparison saved to '{args.plan_output}'.")
+
+
+if __name__ == '__main__':
+    main()
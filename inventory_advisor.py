@@ -3,74 +3,114 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+from data_store import load_table
 
-def clean_inventory_data(file_path):
-    with open(file_path, 'r') as f:
-        header = f.readline().strip()
-        
-    # A more robust way to clean the header
-    header_columns = [h.strip() for h in header.split(',') if '?' not in h and h.strip()]
-    
-    # Load the data, skipping the problematic header
-    df = pd.read_csv(file_path, skiprows=1, header=None)
-    
-    # Keep only the columns we need and assign names
-    df = df.iloc[:, [0, 3, 4]]
-    df.columns = ['DATE', 'MATERIAL_NAME', 'STOCK']
-    
-    # Convert date column to datetime
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    
-    # Clean and convert STOCK to numeric
-    df['STOCK'] = pd.to_numeric(df['STOCK'].astype(str).str.replace(',', ''), errors='coerce')
-    df.dropna(subset=['STOCK'], inplace=True)
+# Default thresholds for the Buy More / Buy Less rules
+RECOMMENDATION_THRESHOLDS = {
+    'buy_more_slope': 0.5,   # trend slope above this ...
+    'buy_more_ratio': 1.0,   # ... and stock-to-forecast ratio below this -> Buy More
+    'buy_less_slope': -0.5,  # trend slope below this ...
+    'buy_less_ratio': 1.5,   # ... and stock-to-forecast ratio above this -> Buy Less
+}
 
-    # Get the most recent stock for each material
-    df = df.sort_values('DATE').drop_duplicates('MATERIAL_NAME', keep='last')
-    
-    return df
+def latest_balances(df, value_cols=('UNRESRICTED_STOCK',), date_col='BALANCE_AS_OF_DATE',
+                    plant_col='PLANT_NAME', material_col='MATERIAL_NAME'):
+    """
+    Balance of every (plant, material) at the latest snapshot date in the
+    frame: the value columns summed over that snapshot's rows (batches), with
+    keys that are absent from it counted as 0, as in
+    stock_projection.opening_balances. The date column holds that snapshot
+    date; the result has a unique (plant, material) index. Column names
+    default to the raw summary's and can be overridden for renamed frames.
+    """
+    value_cols = list(value_cols)
+    keys = [plant_col, material_col]
+    latest = df[date_col].max()
+    snapshot = df[df[date_col] == latest]
+    totals = snapshot.groupby(keys, observed=True)[value_cols].sum()
+    every_key = df.groupby(keys, observed=True).size().index
+    balances = totals.reindex(every_key, fill_value=0)
+    balances[date_col] = latest
+    return balances
 
-    # Convert date column to datetime
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    
-    # Clean and convert STOCK to numeric, handling non-numeric values
-    df['STOCK'] = pd.to_numeric(df['STOCK'].astype(str).str.replace(',', ''), errors='coerce')
-    df.dropna(subset=['STOCK'], inplace=True)
 
-    # Get the most recent stock for each material
-    df = df.sort_values('DATE').drop_duplicates('MATERIAL_NAME', keep='last')
-    
-    return df
+def balance_lookup(balances):
+    """Dict from (plant, material) to its latest-balance row, for O(1) lookups by key."""
+    return balances.to_dict('index')
+
+
+def clean_inventory_data(file_path):
+    """Latest stock per plant and material from the inventory summary, as DATE / STOCK columns."""
+    df = load_table('inventory_summary', file_path)
+    df = df.dropna(subset=['BALANCE_AS_OF_DATE', 'UNRESRICTED_STOCK'])
+    balances = latest_balances(df)
+    return balances.reset_index().rename(columns={'BALANCE_AS_OF_DATE': 'DATE', 'UNRESRICTED_STOCK': 'STOCK'})
+
+def analyze_inventory(inventory_df, forecast_df, thresholds=RECOMMENDATION_THRESHOLDS):
+    # Forecasts per plant and material are compared plant by plant; material
+    # forecasts against the material's stock summed over every plant
+    keys = ['PLANT_NAME', 'MATERIAL_NAME'] if 'PLANT_NAME' in forecast_df.columns else ['MATERIAL_NAME']
+    if keys == ['MATERIAL_NAME']:
+        inventory_df = inventory_df.groupby('MATERIAL_NAME', observed=True).agg(
+            DATE=('DATE', 'max'),
+            STOCK=('STOCK', 'sum'),
+            PLANTS=('PLANT_NAME', 'nunique'),
+        ).reset_index()
 
-def analyze_inventory(inventory_df, forecast_df):
     # Aggregate forecast data
-    forecast_summary = forecast_df.groupby('MATERIAL_NAME').agg(
+    forecast_summary = forecast_df.groupby(keys).agg(
         total_forecast=('FORECASTED_QUANTITY_MT', 'sum'),
         trend_slope=('TREND_SLOPE', 'first')
     ).reset_index()
 
     # Merge inventory and forecast data
-    merged_df = pd.merge(inventory_df, forecast_summary, on='MATERIAL_NAME')
+    merged_df = pd.merge(inventory_df.astype({key: str for key in keys}), forecast_summary, on=keys)
 
     # Calculate stock-to-forecast ratio
     merged_df['stock_to_forecast_ratio'] = merged_df['STOCK'] / merged_df['total_forecast']
     
     # Handle infinite ratios by replacing them with a large number for plotting
-    merged_df['stock_to_forecast_ratio'].replace([np.inf, -np.inf], 10, inplace=True)
+    merged_df['stock_to_forecast_ratio'] = merged_df['stock_to_forecast_ratio'].replace([np.inf, -np.inf], 10)
 
     # Categorize materials
-    def get_recommendation(row):
-        if row['trend_slope'] > 0.5 and row['stock_to_forecast_ratio'] < 1:
-            return 'Buy More'
-        elif row['trend_slope'] < -0.5 and row['stock_to_forecast_ratio'] > 1.5:
-            return 'Buy Less'
-        else:
-            return 'Monitor'
-            
-    merged_df['recommendation'] = merged_df.apply(get_recommendation, axis=1)
-    
+    merged_df['recommendation'] = recommend(merged_df['trend_slope'].to_numpy(),
+                                            merged_df['stock_to_forecast_ratio'].to_numpy(),
+                                            thresholds)
+
     return merged_df
 
+def recommend(trend_slope, ratio, thresholds=RECOMMENDATION_THRESHOLDS):
+    """
+    Applies the recommendation rules to whole arrays at once. Inputs broadcast
+    against each other and against the thresholds, so passing thresholds of
+    shape (n_scenarios, 1) evaluates every scenario for every row in one go.
+    NaN slopes or ratios fall through to 'Monitor'.
+    """
+    t = {name: np.asarray(thresholds.get(name, default))
+         for name, default in RECOMMENDATION_THRESHOLDS.items()}
+    conditions = [
+        (trend_slope > t['buy_more_slope']) & (ratio < t['buy_more_ratio']),
+        (trend_slope < t['buy_less_slope']) & (ratio > t['buy_less_ratio']),
+    ]
+    return np.select(conditions, ['Buy More', 'Buy Less'], default='Monitor')
+
+def sweep_thresholds(merged_df, scenarios):
+    """
+    Evaluates several threshold scenarios over an analyze_inventory result in
+    a single broadcast pass. `scenarios` maps a scenario name to a dict of
+    thresholds overriding RECOMMENDATION_THRESHOLDS. Returns one recommendation
+    column per scenario, aligned with merged_df's rows.
+    """
+    names = list(scenarios)
+    thresholds = {
+        name: np.array([scenarios[s].get(name, default) for s in names])[:, None]
+        for name, default in RECOMMENDATION_THRESHOLDS.items()
+    }
+    labels = recommend(merged_df['trend_slope'].to_numpy()[None, :],
+                       merged_df['stock_to_forecast_ratio'].to_numpy()[None, :],
+                       thresholds)
+    return pd.DataFrame(labels.T, index=merged_df.index, columns=names)
+
 def plot_recommendations(df, output_path):
     plt.figure(figsize=(12, 8))
     
@@ -0,0 +1,45 @@
+
+import argparse
+import time
+from data_store import load_table
+from hierarchical_forecast import FORECAST_STEPS, forecast_flows
+from stock_projection import CAPACITY_FILE, load_capacity_plan, opening_balances, run_projection
+
+OUTPUT_FILE = 'inventory_projection.csv'
+PLANT_OUTPUT_FILE = 'plant_inventory_projection.csv'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Project plant x material inventory forward from the latest balances and forecast flows.')
+    parser.add_argument('--outbound', default='Outbound_cleaned.csv')
+    parser.add_argument('--inbound', default='Inbound_cleaned.csv')
+    parser.add_argument('--capacity', default=CAPACITY_FILE)
+    parser.add_argument('--steps', type=int, default=FORECAST_STEPS)
+    parser.add_argument('--inbound-scale', type=float, default=1.0, help='What-if multiplier on expected inbound.')
+    parser.add_argument('--outbound-scale', type=float, default=1.0, help='What-if multiplier on forecast outbound.')
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--plant-output', default=PLANT_OUTPUT_FILE)
+    args = parser.parse_args()
+
+    opening, snapshot = opening_balances(load_table('inventory'))
+    outbound_fc, inbound_fc = forecast_flows(load_table('outbound', args.outbound), load_table('inbound', args.inbound),
+                                             snapshot, args.steps)
+    plan = load_capacity_plan(args.capacity)
+
+    start = time.perf_counter()
+    sku_df, plant_df = run_projection(opening, inbound_fc, outbound_fc, plan, args.inbound_scale, args.outbound_scale)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Projected {len(sku_df)} plant x material balances from {snapshot:%Y-%m-%d} "
+          f"over {args.steps} months in {elapsed:.1f} ms.")
+
+    sku_df.to_csv(args.output, index=False)
+    plant_df.to_csv(args.plant_output, index=False)
+    at_risk = sku_df[sku_df['STOCKOUT_MONTH'].notna() & (sku_df['OPENING_STOCK_MT'] > 0)]
+    print(f"{len(at_risk)} stocked SKUs run out within the horizon.")
+    print(plant_df.to_string(index=False, float_format=lambda v: f'{v:,.2f}'))
+    print(f"Results saved to '{args.output}' and '{args.plant_output}'.")
+
+
+if __name__ == '__main__':
+    main()
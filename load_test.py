@@ -0,0 +1,101 @@
+
+import numpy as np
+import aiohttp
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+URL = 'http://127.0.0.1:8000'
+
+# Requests the dashboards make, cycled through by every client
+REQUESTS = [
+    '/api/kpis',
+    '/api/kpis?plant=CHINA-WAREHOUSE',
+    '/api/kpis?plant=SINGAPORE-WAREHOUSE&start=2024-06-01',
+    '/api/timeseries',
+    '/api/timeseries?series=flows',
+    '/api/top-materials?n=10',
+    '/api/top-materials?metric=LOSS_VALUE&n=20',
+    '/api/recommendations',
+    '/api/recommendations?recommendation=Buy%20More',
+    '/api/forecast?material=MAT-0013',
+    '/api/timeseries?format=arrow',
+]
+
+
+async def wait_for_server(url, timeout=120):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f'{url}/health') as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"Server at {url} did not come up within {timeout} s")
+
+
+async def client(session, url, n_requests, offset, latencies, errors):
+    """One simulated dashboard client issuing requests back to back."""
+    for i in range(n_requests):
+        path = REQUESTS[(offset + i) % len(REQUESTS)]
+        start = time.perf_counter()
+        try:
+            async with session.get(url + path, headers={'Accept-Encoding': 'gzip'}) as response:
+                await response.read()
+                if response.status != 200:
+                    errors.append(f'{path}: HTTP {response.status}')
+        except aiohttp.ClientError as e:
+            errors.append(f'{path}: {e}')
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(url, clients, requests_per_client):
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session, url, requests_per_client, c, latencies, errors)
+                               for c in range(clients)))
+        elapsed = time.perf_counter() - start
+    return np.array(latencies) * 1000, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the data API with many concurrent clients.')
+    parser.add_argument('--url', default=URL)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per client.')
+    parser.add_argument('--start-server', action='store_true',
+                        help='Start app.py on the --url port for the duration of the test.')
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        port = args.url.rsplit(':', 1)[-1].strip('/')
+        server = subprocess.Popen([sys.executable, 'app.py', '--host', '127.0.0.1', '--port', port])
+    try:
+        asyncio.run(wait_for_server(args.url))
+        latencies, errors, elapsed = asyncio.run(run(args.url, args.clients, args.requests))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    total = len(latencies)
+    print(f"{total} requests from {args.clients} clients in {elapsed:.2f} s: {total / elapsed:,.0f} req/s")
+    print(f"Latency ms: p50 {np.percentile(latencies, 50):.1f}, p95 {np.percentile(latencies, 95):.1f}, "
+          f"p99 {np.percentile(latencies, 99):.1f}, max {latencies.max():.1f}")
+    print(f"Errors: {len(errors)}")
+    for error in errors[:10]:
+        print(f"  {error}")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,96 +1,218 @@
 
 import pandas as pd
 from statsmodels.tsa.statespace.sarimax import SARIMAX
-from sklearn.linear_model import LinearRegression
-import matplotlib.pyplot as plt
-import os
-import numpy as np
-
-# Create a directory for the plots if it doesn't exist
-output_plot_dir = 'material_forecast_plots'
-if not os.path.exists(output_plot_dir):
-    os.makedirs(output_plot_dir)
-
-# Load the dataset
-file_path = 'Outbound_cleaned.csv'
-df = pd.read_csv(file_path)
-
-# Convert 'OUTBOUND_DATE' to datetime objects
-df['OUTBOUND_DATE'] = pd.to_datetime(df['OUTBOUND_DATE'])
-df.set_index('OUTBOUND_DATE', inplace=True)
-
-# Get unique material names
-materials = df['MATERIAL_NAME'].unique()
-
-all_forecasts = []
-
-for material in materials:
-    print(f"Processing material: {material}")
-    
-    # Filter data for the current material
-    material_df = df[df['MATERIAL_NAME'] == material]
-    
-    # Resample to monthly frequency
-    monthly_data = material_df['NET_QUANTITY_MT'].resample('MS').sum()
-    
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+from data_store import load_table
+from monthly_matrix import build_period_matrix, series_by_key
+from forecast_plots import OUTPUT_PLOT_DIR, render_plots_parallel
+from forecast_cache import CACHE_FILE, series_fingerprint, load_cache, save_cache, make_entry, entry_to_forecast
+from fast_forecast import holt_forecast
+from trend import TREND_METHODS, add_trend_slopes
+from order_selection import ORDER_FILE, MONTHLY_GRID, model_trend, select_orders, describe_orders
+
+OUTPUT_FILE = 'material_monthly_forecast.csv'
+FORECAST_STEPS = 12
+ORDER = (1, 1, 1)
+
+# sarimax: one statsmodels fit per material; holt: damped Holt smoothing fitted
+# to every material at once with NumPy (see fast_forecast)
+ENGINES = ['sarimax', 'holt']
+
+
+def load_outbound(file_path):
+    # Typed table with OUTBOUND_DATE already parsed
+    df = load_table('outbound', file_path)
+    df.set_index('OUTBOUND_DATE', inplace=True)
+    return df
+
+
+def forecast_material(material, monthly_data, order=ORDER, start_params=None, steps=FORECAST_STEPS):
+    """
+    Fits an ARIMA model to one material's monthly series and forecasts the
+    next `steps` months, optionally warm-started from previously fitted
+    params. Runs inside a worker process, so it never raises: it returns
+    (material, forecast_df, params, error) instead. TREND_SLOPE is not set
+    here; main() computes it for every material at once (see trend.py).
+    """
     # Check if there is enough data to train the model (e.g., at least 2 years)
     if len(monthly_data) < 3:
-        print(f"Skipping {material} due to insufficient data.")
-        continue
+        return material, None, None, None
 
     try:
-        # ARIMA model training (non-seasonal)
-        model = SARIMAX(monthly_data, order=(1, 1, 1))
-        results = model.fit(disp=False)
-        
+        # ARIMA model training (non-seasonal), with a constant when undifferenced
+        model = SARIMAX(monthly_data, order=order, trend=model_trend(order))
+        results = model.fit(start_params=start_params, disp=False)
+
         # Forecast for the next 12 months
-        forecast = results.get_forecast(steps=12)
+        forecast = results.get_forecast(steps=steps)
         forecast_index = forecast.predicted_mean.index
         forecast_values = forecast.predicted_mean.values
-        
-        # Trend and Slope Calculation using Linear Regression
-        X = np.arange(len(forecast_values)).reshape(-1, 1)
-        y = forecast_values
-        
-        lin_reg = LinearRegression()
-        lin_reg.fit(X, y)
-        
-        slope = lin_reg.coef_[0]
-        trend_line = lin_reg.predict(X)
-        
-        # Store the forecast
+
         forecast_df = pd.DataFrame({
             'MATERIAL_NAME': material,
             'MONTH': forecast_index,
             'FORECASTED_QUANTITY_MT': forecast_values,
-            'TREND_SLOPE': slope
         })
-        all_forecasts.append(forecast_df)
-        
-        # Plotting
-        plt.figure(figsize=(12, 6))
-        plt.plot(monthly_data.index, monthly_data, label='Historical Monthly Sales')
-        plt.plot(forecast_index, forecast_values, label='Forecasted Sales')
-        plt.plot(forecast_index, trend_line, label=f'Trend (slope: {slope:.2f})', linestyle='--')
-        plt.title(f'Monthly Sales Forecast for {material}')
-        plt.xlabel('Date')
-        plt.ylabel('Net Quantity (MT)')
-        plt.legend()
-        plt.grid(True)
-        
-        # Save the plot
-        plot_filename = os.path.join(output_plot_dir, f'{material}_forecast.png')
-        plt.savefig(plot_filename)
-        plt.close()
+        return material, forecast_df, results.params.values, None
 
     except Exception as e:
-        print(f"Could not process {material}. Reason: {e}")
-
-# Combine all forecasts into a single DataFrame
-if all_forecasts:
-    final_forecast_df = pd.concat(all_forecasts, ignore_index=True)
-    # Save the combined forecast data to a CSV file
-    final_forecast_df.to_csv('material_monthly_forecast.csv', index=False)
-    print("Forecasting complete. Results saved to 'material_monthly_forecast.csv' and plots saved in 'material_forecast_plots' directory.")
-else:
-    print("No materials had sufficient data for forecasting.")
+        return material, None, None, str(e)
+
+
+def _forecast_task(task):
+    return forecast_material(*task)
+
+
+def run_forecasts(tasks, workers=None):
+    """
+    Runs forecast_material over (material, monthly_data, ...) tasks and yields the
+    results in task order, whatever order the workers finish in.
+    workers=1 runs everything in this process.
+    """
+    if workers == 1:
+        for task in tasks:
+            yield _forecast_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_forecast_task, tasks, chunksize=4)
+
+
+def forecast_sarimax(series, args, orders=None):
+    """
+    Fits SARIMAX per material in a process pool, reusing cached forecasts for
+    unchanged series. `orders` maps materials to their selected (p, d, q)
+    (see order_selection); others use ORDER. Returns the per-material
+    forecast frames in series order.
+    """
+    orders = orders or {}
+    cache = {} if args.no_cache else load_cache(args.cache)
+    new_cache = {}
+    fingerprints = {}
+    reused = {}
+    tasks = []
+    for material, monthly_data in series.items():
+        order = orders.get(material, ORDER)
+        fingerprints[material] = series_fingerprint(monthly_data, order, FORECAST_STEPS, model_trend(order))
+        entry = cache.get(material)
+        if entry is not None and entry['fingerprint'] == fingerprints[material]:
+            reused[material] = entry
+            continue
+
+        start_params = None
+        if (args.warm_start and entry is not None and entry['order'] == list(order)
+                and entry.get('trend', 'n') == model_trend(order)):
+            start_params = entry['params']
+        tasks.append((material, monthly_data, order, start_params))
+
+    fitted = run_forecasts(tasks, args.workers)
+    all_forecasts = []
+
+    # Walk the materials in their original order, taking refits from the
+    # pool and everything else from the cache
+    for material in series:
+        if material in reused:
+            print(f"Processing material: {material} (cached)")
+            forecast_df = entry_to_forecast(material, reused[material])
+            new_cache[material] = reused[material]
+        else:
+            _, forecast_df, params, error = next(fitted)
+            print(f"Processing material: {material}")
+
+            if error is not None:
+                print(f"Could not process {material}. Reason: {error}")
+                continue
+            if forecast_df is None:
+                print(f"Skipping {material} due to insufficient data.")
+                continue
+            order = orders.get(material, ORDER)
+            new_cache[material] = make_entry(fingerprints[material], order, forecast_df, params, model_trend(order))
+
+        all_forecasts.append(forecast_df)
+
+    if not args.no_cache:
+        save_cache(new_cache, args.cache)
+        print(f"Refitted {len(tasks)} of {len(series)} materials, reused {len(reused)} from '{args.cache}'.")
+    return all_forecasts
+
+
+def forecast_holt(monthly_matrix):
+    """Forecasts every material at once with the batched Holt engine."""
+    forecast_df, skipped = holt_forecast(monthly_matrix, FORECAST_STEPS)
+    for material in skipped:
+        print(f"Skipping {material} due to insufficient data.")
+    print(f"Forecasted {forecast_df['MATERIAL_NAME'].nunique()} materials with the holt engine.")
+    return [group for _, group in forecast_df.groupby('MATERIAL_NAME', sort=False, observed=True)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast monthly outbound quantity per material.')
+    parser.add_argument('--input', default='Outbound_cleaned.csv')
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--engine', choices=ENGINES, default='sarimax',
+                        help='sarimax: per-material SARIMAX fits (cached, parallel); '
+                             'holt: batched damped Holt smoothing over all materials at once.')
+    parser.add_argument('--trend', choices=TREND_METHODS, default='ols',
+                        help='How TREND_SLOPE is estimated from each forecast: least squares or robust Theil-Sen.')
+    parser.add_argument('--trend-horizon', type=int, default=None,
+                        help=f'Months of the forecast the trend slope is fitted over (default: all {FORECAST_STEPS}).')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs, 1 = serial).')
+    parser.add_argument('--cache', default=CACHE_FILE,
+                        help='Forecast cache file; materials whose monthly series did not change are not refitted.')
+    parser.add_argument('--no-cache', action='store_true', help='Refit every material and leave the cache untouched.')
+    parser.add_argument('--warm-start', action='store_true',
+                        help='Start refits of changed materials from their previously fitted params.')
+    parser.add_argument('--select-order', action='store_true',
+                        help=f'Pick each material\'s ARIMA order by AIC over a small grid instead of {ORDER}; '
+                             'chosen orders are stored and only searched again when the series changed.')
+    parser.add_argument('--order-file', default=ORDER_FILE, help='Where selected orders and memoized fits are kept.')
+    parser.add_argument('--plots', choices=['eager', 'lazy', 'none'], default='eager',
+                        help='eager: render every plot after the forecast is written; '
+                             'lazy: render on demand with forecast_plots.py; none: no plots.')
+    parser.add_argument('--no-plots', dest='plots', action='store_const', const='none')
+    args = parser.parse_args()
+    if args.trend_horizon is not None and args.trend_horizon < 2:
+        parser.error('--trend-horizon must be at least 2 months')
+
+    df = load_outbound(args.input)
+
+    # Build every material's monthly series in one groupby/resample pass
+    monthly_matrix = build_period_matrix(df, 'OUTBOUND_DATE')
+    series = series_by_key(monthly_matrix)
+
+    if args.engine == 'holt':
+        all_forecasts = forecast_holt(monthly_matrix)
+    else:
+        orders = None
+        if args.select_order:
+            selected = select_orders(series, MONTHLY_GRID, args.order_file, args.workers)
+            print(describe_orders(selected).to_string())
+            # The monthly grid is non-seasonal
+            orders = {material: order for material, (order, _) in selected.items()}
+        all_forecasts = forecast_sarimax(series, args, orders)
+
+    # Combine all forecasts into a single DataFrame
+    if all_forecasts:
+        final_forecast_df = pd.concat(all_forecasts, ignore_index=True)
+        # Trend slopes for every material in one vectorized pass
+        add_trend_slopes(final_forecast_df, args.trend, args.trend_horizon)
+        # Save the combined forecast data to a CSV file
+        final_forecast_df.to_csv(args.output, index=False)
+        print(f"Forecasting complete. Results saved to '{args.output}'.")
+
+        # Plots are rendered from the written forecasts, off the model loop
+        if args.plots == 'eager':
+            forecasts = {material: forecast_df for material, forecast_df
+                         in final_forecast_df.groupby('MATERIAL_NAME', sort=False, observed=True)}
+            render_plots_parallel(series, forecasts, OUTPUT_PLOT_DIR, args.workers)
+            print(f"Plots saved in '{OUTPUT_PLOT_DIR}' directory.")
+        elif args.plots == 'lazy':
+            print("Plots will be rendered on demand (see forecast_plots.ensure_plot).")
+    else:
+        print("No materials had sufficient data for forecasting.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+
+import pandas as pd
+import numpy as np
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from statsmodels.tsa.seasonal import STL
+from statsmodels.tsa.stattools import kpss
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import json
+import os
+import warnings
+
+ORDER_FILE = 'order_selection.json'
+# Bump when the search rules or the file layout change so stored orders and fits are discarded
+STORE_VERSION = 3
+
+# Candidate orders, searched from simplest to most complex. Monthly material
+# series are too short for a yearly seasonal term; the daily total gets a
+# weekly one. The differencing orders are not compared by AIC (a differenced
+# model's likelihood covers fewer points): choose_differencing picks d and D
+# first and only candidates with those are searched.
+MONTHLY_GRID = [(order, (0, 0, 0, 0)) for order in itertools.product([0, 1, 2], [0, 1], [0, 1, 2])]
+DAILY_GRID = [(order, seasonal) for order in itertools.product([0, 1, 2], [1], [0, 1, 2])
+              for seasonal in [(0, 0, 0, 7)] + [(P, D, Q, 7) for P, D, Q in itertools.product([0, 1], [0, 1], [0, 1])
+                                                if P + D + Q]]
+
+# A stored order is reused until the series gains this many points or its
+# overlapping history moves by more than this fraction
+RESEARCH_NEW_POINTS = 3
+RESEARCH_CHANGE = 0.1
+
+# Significance of the KPSS test that decides whether a series needs another
+# difference, and the STL seasonal strength above which it gets a seasonal
+# difference (the threshold Hyndman & Athanasopoulos suggest)
+KPSS_ALPHA = 0.05
+SEASONAL_STRENGTH = 0.64
+
+
+def model_trend(order, seasonal_order=(0, 0, 0, 0)):
+    """
+    SARIMAX trend for an order: a constant when nothing is differenced, since
+    without one a stationary model reverts to 0 instead of the series mean;
+    none otherwise, so differenced models do not gain a drift.
+    """
+    return 'c' if order[1] == 0 and seasonal_order[1] == 0 else 'n'
+
+
+def _is_stationary(values):
+    if len(values) < 4 or np.ptp(values) == 0:
+        return True
+    with warnings.catch_warnings():
+        # KPSS warns when the statistic is outside its p-value table
+        warnings.simplefilter('ignore')
+        try:
+            return kpss(values, regression='c', nlags='auto')[1] >= KPSS_ALPHA
+        except (ValueError, ZeroDivisionError):
+            return True
+
+
+def _seasonal_strength(values, period):
+    if len(values) < 2 * period + 1 or np.ptp(values) == 0:
+        return 0.0
+    fit = STL(values, period=period).fit()
+    remainder = np.var(fit.resid)
+    return max(0.0, 1 - remainder / np.var(fit.seasonal + fit.resid)) if remainder > 0 else 1.0
+
+
+def choose_differencing(series, grid):
+    """
+    (d, D) for a series among the differencing orders `grid` offers: D = 1
+    when the series is strongly seasonal, then the smallest d after which a
+    KPSS test no longer rejects stationarity.
+    """
+    values = series.to_numpy(dtype=float)
+    ds = sorted({order[1] for order, _ in grid})
+    Ds = sorted({seasonal[1] for _, seasonal in grid})
+    period = grid[0][1][3]
+
+    D = Ds[0]
+    if len(Ds) > 1 and period > 1 and _seasonal_strength(values, period) > SEASONAL_STRENGTH:
+        D = Ds[-1]
+    if D:
+        values = values[period:] - values[:-period]
+
+    for d in ds:
+        if d == ds[-1] or _is_stationary(np.diff(values, n=d)):
+            return d, D
+
+
+def series_hash(series):
+    digest = hashlib.sha1()
+    digest.update(series.index.asi8.tobytes())
+    digest.update(series.to_numpy(dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def _order_key(order, seasonal_order):
+    return f"{','.join(map(str, order))}:{','.join(map(str, seasonal_order))}"
+
+
+def _n_params(order, seasonal_order):
+    p, _, q = order
+    P, _, Q, _ = seasonal_order
+    return p + q + P + Q + 1 + (model_trend(order, seasonal_order) == 'c')
+
+
+def _usable_points(series, order, seasonal_order):
+    return len(series) - order[1] - seasonal_order[1] * seasonal_order[3]
+
+
+def fit_aic(series, order, seasonal_order=(0, 0, 0, 0)):
+    """
+    AIC of one SARIMAX fit, or inf when the fit raises, does not converge or
+    produces non-finite estimates, so the caller can prune around it.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = SARIMAX(series, order=order, seasonal_order=seasonal_order,
+                              trend=model_trend(order, seasonal_order)).fit(disp=False)
+    except Exception:
+        return np.inf
+    if not results.mle_retvals.get('converged', True) or not np.all(np.isfinite(results.params)):
+        return np.inf
+    return float(results.aic) if np.isfinite(results.aic) else np.inf
+
+
+def _dominates(candidate, failed):
+    """True if `candidate` has every AR/MA term of `failed` (same differencing), so it would fail too."""
+    (p, d, q), (P, D, Q, s) = candidate
+    (fp, fd, fq), (fP, fD, fQ, fs) = failed
+    return d == fd and D == fD and s == fs and p >= fp and q >= fq and P >= fP and Q >= fQ
+
+
+def search_order(series, grid=MONTHLY_GRID, fits=None):
+    """
+    Searches `grid` for the (order, seasonal_order) with the lowest AIC among
+    the candidates with the differencing choose_differencing picks for the
+    series. Orders that leave too few points for their parameters are
+    skipped, and once a fit fails or diverges every larger order is pruned.
+    `fits` maps order keys to AICs from earlier searches of this same series
+    and is updated in place. Returns (order, seasonal_order, aic), with order
+    None when nothing could be fitted.
+    """
+    fits = {} if fits is None else fits
+    best = (None, None, np.inf)
+    failed = []
+    d, D = choose_differencing(series, grid)
+    for order, seasonal_order in grid:
+        if order[1] != d or seasonal_order[1] != D:
+            continue
+        if _usable_points(series, order, seasonal_order) <= _n_params(order, seasonal_order):
+            continue
+        if any(_dominates((order, seasonal_order), f) for f in failed):
+            continue
+
+        key = _order_key(order, seasonal_order)
+        if key not in fits:
+            fits[key] = fit_aic(series, order, seasonal_order)
+        aic = fits[key]
+        if not np.isfinite(aic):
+            failed.append((order, seasonal_order))
+        elif aic < best[2]:
+            best = (tuple(order), tuple(seasonal_order), aic)
+    return best
+
+
+def _search_task(task):
+    key, series, grid, fits = task
+    fits = dict(fits)
+    order, seasonal_order, aic = search_order(series, grid, fits)
+    return key, order, seasonal_order, aic, fits
+
+
+def load_orders(path=ORDER_FILE):
+    """
+    Returns the persisted {'orders': ..., 'fits': ...} store, empty if
+    missing, unreadable or written under another STORE_VERSION. 'fits' maps
+    a series hash to that series' {order key: AIC}.
+    """
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                store = json.load(f)
+            if store.get('version') == STORE_VERSION:
+                return store
+            print(f"Ignoring order selection file {path} from an older version of the search.")
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable order selection file {path}. Reason: {e}")
+    return {'version': STORE_VERSION, 'orders': {}, 'fits': {}}
+
+
+def save_orders(store, path=ORDER_FILE):
+    """Writes the store atomically, dropping memoized fits of series no stored order refers to."""
+    live = {entry['hash'] for entry in store['orders'].values()}
+    store = {'version': STORE_VERSION, 'orders': store['orders'],
+             'fits': {digest: fits for digest, fits in store['fits'].items() if digest in live}}
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(store, f)
+    os.replace(tmp_path, path)
+
+
+def changed_meaningfully(entry, series):
+    """
+    Whether a series moved enough since its order was chosen to search again:
+    RESEARCH_NEW_POINTS more points, or the previously seen history changing
+    by more than RESEARCH_CHANGE of its total volume.
+    """
+    if entry is None:
+        return True
+    if entry['hash'] == series_hash(series):
+        return False
+    if len(series) - entry['points'] >= RESEARCH_NEW_POINTS or len(series) < entry['points']:
+        return True
+    overlap = series.iloc[:entry['points']].abs().sum()
+    return abs(overlap - entry['total']) > RESEARCH_CHANGE * max(abs(entry['total']), 1e-9)
+
+
+def select_orders(series_by_key, grid=MONTHLY_GRID, path=ORDER_FILE, workers=None):
+    """
+    Returns {key: (order, seasonal_order)} for every series, searching only
+    those without a stored order or whose data changed meaningfully, in a
+    process pool (workers=1 searches in this process). Chosen orders and
+    memoized fits are persisted to `path`. Keys whose search found nothing
+    are left out.
+    """
+    store = load_orders(path)
+    orders = {}
+    tasks = []
+    for key, series in series_by_key.items():
+        entry = store['orders'].get(key)
+        if changed_meaningfully(entry, series):
+            tasks.append((key, series, grid, store['fits'].get(series_hash(series), {})))
+        elif entry['order'] is not None:
+            orders[key] = (tuple(entry['order']), tuple(entry['seasonal_order']))
+
+    if workers == 1:
+        results = map(_search_task, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_search_task, tasks, chunksize=4)
+    try:
+        for key, order, seasonal_order, aic, fits in results:
+            series = series_by_key[key]
+            digest = series_hash(series)
+            store['fits'][digest] = fits
+            store['orders'][key] = {
+                'hash': digest,
+                'points': len(series),
+                'total': float(series.abs().sum()),
+                'order': order,
+                'seasonal_order': seasonal_order,
+                'aic': aic if np.isfinite(aic) else None,
+            }
+            if order is not None:
+                orders[key] = (order, seasonal_order)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    save_orders(store, path)
+    print(f"Searched orders for {len(tasks)} of {len(series_by_key)} series; "
+          f"reused {len(series_by_key) - len(tasks)} from '{path}'.")
+    return orders
+
+
+def describe_orders(orders):
+    """Counts how many series picked each order, most common first."""
+    counts = pd.Series([f"{order}x{seasonal}" if any(seasonal) else str(order)
+                        for order, seasonal in orders.values()]).value_counts()
+    return counts
@@ -0,0 +1,77 @@
+
+import streamlit as st
+import pandas as pd
+import io
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def sort_order(df, sort_by=None, ascending=True):
+    """
+    Row positions of `df` in display order. Only the sort column is sorted
+    (stable, NaNs last); the frame itself is never reordered or copied.
+    """
+    if sort_by is None:
+        return pd.RangeIndex(len(df)).to_numpy()
+    column = df[sort_by].reset_index(drop=True)
+    return column.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+def row_range(df, start, stop, sort_by=None, ascending=True):
+    """Returns rows [start, stop) of `df` in sorted order, materializing only those rows."""
+    order = sort_order(df, sort_by, ascending)
+    return df.iloc[order[start:stop]]
+
+
+def page_rows(df, page, page_size, sort_by=None, ascending=True):
+    """Returns one page (1-based) of `df` in sorted order."""
+    start = (page - 1) * page_size
+    return row_range(df, start, start + page_size, sort_by, ascending)
+
+
+def iter_csv_chunks(df, chunksize=10000):
+    """Yields `df` as CSV text, header first, `chunksize` rows at a time."""
+    for start in range(0, max(len(df), 1), chunksize):
+        chunk = df.iloc[start:start + chunksize]
+        yield chunk.to_csv(index=False, header=(start == 0))
+
+
+def render_paged_table(df, key, page_size=50):
+    """
+    Shows `df` one page at a time with server-side sorting, so only the
+    visible rows are serialized to the browser on each rerun. The full frame
+    is offered as a CSV download that is only generated when clicked.
+    """
+    if df.empty:
+        st.info("No rows to display.")
+        return
+
+    col_sort, col_order, col_size, col_page = st.columns([3, 2, 2, 2])
+    sort_by = col_sort.selectbox("Sort by", ['(none)'] + list(df.columns), key=f'{key}_sort_by')
+    ascending = col_order.radio("Order", ['Ascending', 'Descending'], horizontal=True, key=f'{key}_order') == 'Ascending'
+    page_size = col_size.selectbox("Rows per page", PAGE_SIZES,
+                                   index=PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 0,
+                                   key=f'{key}_page_size')
+    n_pages = page_count(len(df), page_size)
+    page = col_page.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key=f'{key}_page')
+
+    sort_by = None if sort_by == '(none)' else sort_by
+    st.dataframe(page_rows(df, page, page_size, sort_by, ascending))
+
+    first_row = (page - 1) * page_size + 1
+    last_row = min(page * page_size, len(df))
+    st.caption(f"Rows {first_row:,}-{last_row:,} of {len(df):,} (page {page} of {n_pages})")
+
+    def export_csv():
+        buffer = io.BytesIO()
+        for chunk in iter_csv_chunks(df.iloc[sort_order(df, sort_by, ascending)]):
+            buffer.write(chunk.encode('utf-8'))
+        buffer.seek(0)
+        return buffer
+
+    st.download_button("Download full table as CSV", data=export_csv, file_name=f'{key}.csv',
+                       mime='text/csv', key=f'{key}_download')
@@ -1,49 +1,84 @@
 
 import pandas as pd
 from statsmodels.tsa.statespace.sarimax import SARIMAX
-import matplotlib.pyplot as plt
+import argparse
+import numpy as np
 import os
+from data_store import load_table
+from order_selection import ORDER_FILE, DAILY_GRID, model_trend, select_orders
 
-# Get the absolute path of the current working directory
-current_dir = os.getcwd()
+OUTPUT_FILE = 'forecasted_outbound.csv'
+SPLIT_DATE = '2024-06-01'
 
-# Load the dataset
-file_path = os.path.join(current_dir, 'Outbound_cleaned.csv')
-df = pd.read_csv(file_path)
+# SARIMA model parameters
+ORDER = (1, 1, 1)
+SEASONAL_ORDER = (1, 1, 1, 7)  # Seasonal parameters for weekly seasonality
 
-# Convert 'OUTBOUND_DATE' to datetime objects
-df['OUTBOUND_DATE'] = pd.to_datetime(df['OUTBOUND_DATE'])
 
-# Aggregate data by date
-df.set_index('OUTBOUND_DATE', inplace=True)
-daily_quantity = df['NET_QUANTITY_MT'].resample('D').sum()
+def load_daily_quantity(file_path):
+    """Total outbound quantity per day, 0 on days without shipments."""
+    df = load_table('outbound', file_path)
+    return df.resample('D', on='OUTBOUND_DATE')['NET_QUANTITY_MT'].sum()
 
-# Split data into training and test sets
-train_data = daily_quantity[daily_quantity.index < '2024-06-01']
-test_data = daily_quantity[daily_quantity.index >= '2024-06-01']
 
-# SARIMA model training
-# Define model parameters
-p, d, q = 1, 1, 1
-P, D, Q, s = 1, 1, 1, 7  # Seasonal parameters for weekly seasonality
+def forecast_daily(train_data, steps, order=ORDER, seasonal_order=SEASONAL_ORDER):
+    """Fits the SARIMA model to a daily series and returns the next `steps` predicted values."""
+    model = SARIMAX(train_data, order=order, seasonal_order=seasonal_order,
+                    trend=model_trend(order, seasonal_order))
+    results = model.fit(disp=False)
+    return results.get_forecast(steps=steps).predicted_mean
 
-# Create and train the SARIMA model
-model = SARIMAX(train_data, order=(p, d, q), seasonal_order=(P, D, Q, s))
-results = model.fit(disp=False)
 
-# Make predictions
-forecast_steps = len(test_data)
-predictions = results.get_forecast(steps=forecast_steps)
-predicted_means = predictions.predicted_mean
+def forecast_errors(actual, predicted):
+    """MAPE (over non-zero actuals, in %) and RMSE of a forecast."""
+    actual, predicted = np.asarray(actual, dtype=float), np.asarray(predicted, dtype=float)
+    error = predicted - actual
+    nonzero = actual != 0
+    mape = np.abs(error[nonzero] / actual[nonzero]).mean() * 100 if nonzero.any() else np.nan
+    return mape, np.sqrt((error ** 2).mean())
 
-# Combine historical and forecasted data
-forecast_df = pd.DataFrame({
-    'OUTBOUND_DATE': predicted_means.index,
-    'PREDICTED_QUANTITY_MT': predicted_means.values
-})
 
-# Save the forecast to a new CSV file
-forecast_output_path = os.path.join(current_dir, 'forecasted_outbound.csv')
-forecast_df.to_csv(forecast_output_path, index=False)
+def main():
+    parser = argparse.ArgumentParser(description='Forecast total daily outbound quantity with a weekly SARIMA model.')
+    parser.add_argument('--input', default=os.path.join(os.getcwd(), 'Outbound_cleaned.csv'))
+    parser.add_argument('--output', default=os.path.join(os.getcwd(), OUTPUT_FILE))
+    parser.add_argument('--split-date', default=SPLIT_DATE,
+                        help='Days before this date are used for training, the rest for testing.')
+    parser.add_argument('--select-order', action='store_true',
+                        help=f'Pick the SARIMA order by AIC over a small grid instead of {ORDER}x{SEASONAL_ORDER}; '
+                             'the choice is stored and only searched again when the series changed.')
+    parser.add_argument('--order-file', default=ORDER_FILE, help='Where the selected order and memoized fits are kept.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes for the order search (default: number of CPUs).')
+    args = parser.parse_args()
 
-print(f"Forecasted data has been saved to '{forecast_output_path}'")
+    daily_quantity = load_daily_quantity(args.input)
+
+    # Split data into training and test sets
+    train_data = daily_quantity[daily_quantity.index < args.split_date]
+    test_data = daily_quantity[daily_quantity.index >= args.split_date]
+
+    order, seasonal_order = ORDER, SEASONAL_ORDER
+    if args.select_order:
+        selected = select_orders({'TOTAL_DAILY': train_data}, DAILY_GRID, args.order_file, args.workers)
+        order, seasonal_order = selected.get('TOTAL_DAILY', (ORDER, SEASONAL_ORDER))
+        print(f"Selected order {order}x{seasonal_order}")
+
+    predicted_means = forecast_daily(train_data, len(test_data), order, seasonal_order)
+    mape, rmse = forecast_errors(test_data, predicted_means)
+    print(f"Test period from {args.split_date}: MAPE {mape:.1f}%, RMSE {rmse:,.1f} MT "
+          f"(see backtest.py for rolling-origin evaluation)")
+
+    # Combine historical and forecasted data
+    forecast_df = pd.DataFrame({
+        'OUTBOUND_DATE': predicted_means.index,
+        'PREDICTED_QUANTITY_MT': predicted_means.values
+    })
+
+    # Save the forecast to a new CSV file
+    forecast_df.to_csv(args.output, index=False)
+    print(f"Forecasted data has been saved to '{args.output}'")
+
+
+if __name__ == '__main__':
+    main()
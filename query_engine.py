@@ -0,0 +1,327 @@
+
+import pandas as pd
+import numpy as np
+import re
+from rollup_cube import build_cube, slice_cube, cube_is_empty
+from rag_index import data_version, named_plants, named_materials
+
+# Stock and sell value are balances: a question about them is answered from
+# the latest snapshot in the requested range. Loss is a flow and is summed.
+METRICS = {
+    'Unrestricted_Stock': {'label': 'unrestricted stock', 'balance': True, 'format': '{:,.0f}'},
+    'Stock_Sell_Value': {'label': 'stock sell value', 'balance': True, 'format': '${:,.2f}'},
+    'Loss_Value': {'label': 'loss value', 'balance': False, 'format': '${:,.2f}'},
+}
+
+# Questions with these cues need reasoning, not a lookup, and go to the LLM
+OPEN_ENDED = re.compile(r"\b(why|should|recommend\w*|suggest\w*|explain\w*|predict\w*|forecast\w*|what if|how (can|could|do|should|to))\b")
+
+GROUP_BY = [
+    ('Plant', re.compile(r"\b(by|per|each|every|all) (plant|warehouse)s?\b")),
+    ('Material', re.compile(r"\b(by|per|each|every) material\b|\btop( \d+)? materials?\b")),
+    ('Date', re.compile(r"\b(by|per|each|every) (date|month|snapshot)\b|\bover time\b|\btrend\b")),
+]
+
+# "which plant ...", "top 3 materials", "how many materials ...": the
+# dimension a ranking or count is over
+DIMENSION_NOUNS = {
+    'Plant': r"plants?|warehouses?",
+    'Material': r"materials?|products?|skus?",
+    'Date': r"dates?|months?|snapshots?",
+}
+RANKED = re.compile(r"\b(?:which|what) (?P<noun>[a-z]+)\b|\btop (?:(?P<n>\d+) )?(?P<top>[a-z]+)\b")
+COUNT = re.compile(r"\b(?:how many|number of|count of) (?:[a-z]+ ){0,2}?(?P<noun>%s)\b" % '|'.join(DIMENSION_NOUNS.values()))
+HIGHEST = re.compile(r"\b(most|highest|largest|biggest|greatest|maximum|max|top)\b")
+LOWEST = re.compile(r"\b(least|lowest|smallest|fewest|minimum|min|bottom)\b")
+
+# A question that names no plant, material, date or grouping is only a
+# lookup when it asks for the overall figure
+OVERALL = re.compile(r"\b(total|totals|overall|altogether|combined|in all|all plants)\b")
+
+# "plant A", "warehouse 2", "the japan warehouse": a plant the question
+# names. Words that can sit next to plant / warehouse without naming one are
+# not references; anything else that matches no plant is reported unknown
+PLANT_REFERENCE = re.compile(r"\b(?:plant|warehouse)\s+([a-z0-9][\w-]*)|\b([a-z0-9][\w-]*)[\s-]+(?:plant|warehouse)s?\b")
+NOT_PLANT_NAMES = {
+    'a', 'an', 'the', 'this', 'that', 'these', 'those', 'which', 'what', 'each', 'every', 'all', 'any', 'per', 'by',
+    'one', 'my', 'our', 'their', 'its', 'of', 'at', 'in', 'on', 'for', 'from', 'to', 'and', 'or', 'with', 'is', 'are',
+    'has', 'have', 'had', 'was', 'were', 'does', 'do', 'total', 'totals', 'level', 'levels', 'name', 'names', 'stock',
+    'stocks', 'inventory', 'value', 'values', 'loss', 'losses', 'quantity', 'details', 'summary', 'overview', 'other',
+    'same', 'both', 'single', 'whole', 'entire', 'biggest', 'largest', 'smallest', 'most', 'least', 'top',
+    'about', 'across', 'between', 'inside', 'within', 'near', 'into', 'over', 'under', 'some', 'no', 'another',
+    'given', 'specific', 'particular', 'main', 'me', 'show', 'list', 'your', 'whose', 'current', 'latest',
+    'many', 'much', 'few', 'several', 'multiple', 'different', 'distinct', 'various',
+}
+# A single letter or number after "plant" is a name ("plant A"), not an article
+PLANT_LABEL = re.compile(r"\b(?:plant|warehouse)\s+([a-z0-9])\b")
+
+TOP_N = 10
+
+# Cubes already built in this process, keyed by data version
+_cubes = {}
+
+
+def cube_for(df):
+    """Returns the rollup cube for `df`, building it once per data version."""
+    version = data_version(df)
+    if version not in _cubes:
+        _cubes[version] = build_cube(df)
+    return _cubes[version]
+
+
+def _parse_metrics(text):
+    if re.search(r"\b(details?|summary|overview)\b", text):
+        return list(METRICS)
+    metrics = []
+    if re.search(r"\b(loss|losses|lost|write[- ]?offs?)\b", text):
+        metrics.append('Loss_Value')
+    if re.search(r"\b(sell value|sales value|value|worth)\b", text.replace('loss value', '')):
+        metrics.append('Stock_Sell_Value')
+    if re.search(r"\b(stock|stocks|inventory|quantity|on hand)\b", text) and 'Stock_Sell_Value' not in metrics:
+        metrics.append('Unrestricted_Stock')
+    return [m for m in METRICS if m in metrics]
+
+
+def _parse_dates(text):
+    """Returns (start, end, exact) for the dates in the question; exact means a single day was named."""
+    days = [pd.Timestamp(d) for d in re.findall(r"\b\d{4}-\d{2}-\d{2}\b", text)]
+    text = re.sub(r"\b\d{4}-\d{2}-\d{2}\b", ' ', text)
+    months = [pd.Timestamp(m + '-01') for m in re.findall(r"\b\d{4}-\d{2}\b", text)]
+    text = re.sub(r"\b\d{4}-\d{2}\b", ' ', text)
+    years = [pd.Timestamp(y + '-01-01') for y in re.findall(r"(?<![-\w])((?:19|20)\d{2})\b", text)]
+
+    bounds = [(d, d) for d in days]
+    bounds += [(m, m + pd.offsets.MonthEnd(0)) for m in months]
+    bounds += [(y, y + pd.offsets.YearEnd(0)) for y in years]
+    if not bounds:
+        return None, None, False
+    return min(b[0] for b in bounds), max(b[1] for b in bounds), len(days) == 1 and len(bounds) == 1
+
+
+def _dimension(noun):
+    """The cube dimension a noun like "warehouses" or "sku" names, or None."""
+    return next((dim for dim, nouns in DIMENSION_NOUNS.items() if noun and re.fullmatch(nouns, noun)), None)
+
+
+def _parse_ranking(text):
+    """
+    Returns (dimension, order, limit) for a ranking question: "which plant
+    has the most stock" ranks plants highest first and keeps one, "top 5
+    materials" keeps five. (None, None, None) when nothing is ranked.
+    """
+    order = 'lowest' if LOWEST.search(text) else 'highest' if HIGHEST.search(text) else None
+    for match in RANKED.finditer(text):
+        noun = match.group('noun') or match.group('top')
+        dim = _dimension(noun)
+        if dim is None:
+            continue
+        if match.group('top'):
+            return dim, order or 'highest', int(match.group('n') or TOP_N)
+        # "which plant" asks for one, "which materials" for a list
+        return dim, order, 1 if order and not noun.endswith('s') else TOP_N
+    return None, order, None
+
+
+def _unknown_plants(text, plants):
+    """Plant names the question refers to that match none of `plants`, uppercased."""
+    known = {p.lower() for p in plants} | {p.split('-')[0].lower() for p in plants}
+    names = {name for match in PLANT_REFERENCE.findall(text) for name in match if name and name not in NOT_PLANT_NAMES}
+    names |= set(PLANT_LABEL.findall(text))
+    return sorted(name.upper() for name in names - known)
+
+
+def parse_query(query, cube):
+    """
+    Parses a question into a structured request against the cube, or returns
+    None when it needs the LLM: open-ended, no metric and nothing to count,
+    a superlative with nothing to rank, or no plant, material, date, grouping
+    or overall cue to scope the answer. The request is a dict with the
+    metrics, plant / material filters, date range, grouping dimension and
+    any ranking or count.
+    """
+    text = query.lower()
+    if OPEN_ENDED.search(text):
+        return None
+    count_match = COUNT.search(text)
+    count = _dimension(count_match.group('noun')) if count_match else None
+    metrics = _parse_metrics(text)
+    if not metrics and count is None:
+        return None
+
+    plants = named_plants(text, cube['Plant'])
+    materials = named_materials(text, cube['Material'])
+    identifiers = {token.upper() for token in re.findall(r"\b[a-z]+-\d+\b", text)}
+    unknown = sorted(identifiers - {m.upper() for m in cube['Material']})
+    unknown_plants = _unknown_plants(text, cube['Plant'])
+
+    start, end, exact = _parse_dates(text)
+    group_by = next((dim for dim, pattern in GROUP_BY if pattern.search(text)), None)
+    rank_by, order, limit = (None, None, None) if count else _parse_ranking(text)
+    group_by = group_by or rank_by
+    if order and group_by is None:
+        # "what is the highest stock level?" has nothing to rank
+        return None
+    scoped = plants or materials or identifiers or unknown_plants or start is not None
+    if not (scoped or group_by or count or OVERALL.search(text)):
+        return None
+    return {
+        'metrics': metrics,
+        'plants': plants or None,
+        'materials': materials or None,
+        'unknown': unknown,
+        'unknown_plants': unknown_plants,
+        'start': start,
+        'end': end,
+        'exact_date': exact,
+        'group_by': group_by,
+        'order': order,
+        'limit': limit,
+        'count': count,
+    }
+
+
+def _last_present(counts):
+    """Index of the last row with data in each column of a (dates, labels) count matrix; -1 when none."""
+    present = counts > 0
+    last = len(present) - 1 - np.argmax(present[::-1], axis=0)
+    return np.where(present.any(axis=0), last, -1)
+
+
+def _aggregate(cube, group_by):
+    """
+    Returns (labels, snapshot dates, values) with one row per label of
+    `group_by` (or a single row when None). Balance metrics are taken at each
+    row's latest snapshot, flows are summed over the whole range.
+    """
+    dims = cube['dimensions']
+    values, counts, dates = cube['values'], cube['counts'], np.asarray(cube['Date'])
+
+    if group_by == 'Date':
+        present = counts.sum(axis=(1, 2)) > 0
+        return dates[present], dates[present], values.sum(axis=(1, 2))[present]
+
+    if group_by is None:
+        labels = np.array([None])
+        values_dl, counts_dl = values.sum(axis=(1, 2))[:, None], counts.sum(axis=(1, 2))[:, None]
+    else:
+        other = 2 if dims.index(group_by) == 1 else 1
+        labels = np.asarray(cube[group_by])
+        values_dl, counts_dl = values.sum(axis=other), counts.sum(axis=other)
+
+    last = _last_present(counts_dl)
+    keep = last >= 0
+    labels, last = labels[keep], last[keep]
+    balances = values_dl[last, np.flatnonzero(keep)]
+    flows = values_dl[:, keep].sum(axis=0)
+    balance = np.array([METRICS[m]['balance'] for m in cube['measures']])
+    return labels, dates[last], np.where(balance, balances, flows)
+
+
+def _describe_scope(request):
+    scope = []
+    if request['materials']:
+        scope.append(', '.join(request['materials']))
+    if request['plants']:
+        scope.append(('at ' if scope else '') + ', '.join(request['plants']))
+    return ' '.join(scope) or 'All plants and materials'
+
+
+def _count_labels(request, sliced):
+    """
+    Answers "how many materials ...": the labels of the counted dimension
+    with data in the slice or, when the question names a metric, with a
+    positive value of it. Balances are counted at the slice's latest snapshot.
+    """
+    dim = request['count']
+    noun = {'Plant': 'plants', 'Material': 'materials', 'Date': 'snapshots'}[dim]
+    dates = np.asarray(sliced['Date'])[sliced['counts'].sum(axis=(1, 2)) > 0]
+    period = f"from {pd.Timestamp(dates[0]):%Y-%m-%d} to {pd.Timestamp(dates[-1]):%Y-%m-%d}"
+    if not request['metrics']:
+        labels, _, _ = _aggregate(sliced, dim)
+        return f"{_describe_scope(request)}: {len(labels)} {noun} with inventory data {period}."
+
+    metric = request['metrics'][0]
+    spec = METRICS[metric]
+    if spec['balance'] and dim != 'Date':
+        sliced = slice_cube(sliced, start=dates[-1])
+        period = f"at the {pd.Timestamp(dates[-1]):%Y-%m-%d} snapshot"
+    _, _, values = _aggregate(sliced, dim)
+    counted = int((values[:, sliced['measures'].index(metric)] > 0).sum())
+    return f"{_describe_scope(request)}: {counted} {noun} with {spec['label']} {period}."
+
+
+def answer_structured(request, cube):
+    """Answers a parsed request from the cube and returns the text of the answer."""
+    if request['unknown'] and not request['materials']:
+        return f"No inventory data found for {', '.join(request['unknown'])}."
+    if request['unknown_plants'] and not request['plants']:
+        # Answering for every plant instead would look like an answer about the one asked for
+        return (f"No inventory data found for plant {', '.join(request['unknown_plants'])}. "
+                f"Known plants: {', '.join(cube['Plant'])}.")
+
+    start, end = request['start'], request['end']
+    if request['exact_date']:
+        # A single day asks for the snapshot in effect on that day
+        start = None
+    sliced = slice_cube(cube, start, end, request['plants'], request['materials'])
+    if cube_is_empty(sliced):
+        return f"No inventory data found for {_describe_scope(request)} in the requested period."
+    if request['exact_date']:
+        present = np.flatnonzero(sliced['counts'].sum(axis=(1, 2)) > 0)
+        sliced = slice_cube(sliced, start=sliced['Date'][present[-1]])
+    if request['count']:
+        return _count_labels(request, sliced)
+
+    labels, snapshots, values = _aggregate(sliced, request['group_by'])
+    ranked = request['order'] is not None or request['group_by'] == 'Material'
+    if ranked:
+        # Materials are always listed largest first; other groupings only when asked to rank
+        ranking = values[:, sliced['measures'].index(request['metrics'][0])]
+        if request['order'] != 'lowest':
+            ranking = -ranking
+        order = np.argsort(ranking, kind='stable')[:request['limit'] or TOP_N]
+        labels, snapshots, values = labels[order], snapshots[order], values[order]
+
+    lines = []
+    for label, snapshot, row in zip(labels, snapshots, values):
+        parts = []
+        for metric in request['metrics']:
+            spec = METRICS[metric]
+            value = spec['format'].format(row[sliced['measures'].index(metric)])
+            parts.append(f"{spec['label']} {value}")
+        if request['group_by'] == 'Date':
+            lines.append(f"{pd.Timestamp(label):%Y-%m-%d}: {', '.join(parts)}")
+        else:
+            lines.append(f"{label or _describe_scope(request)}: {', '.join(parts)} (snapshot {pd.Timestamp(snapshot):%Y-%m-%d})")
+
+    dates = np.asarray(sliced['Date'])[sliced['counts'].sum(axis=(1, 2)) > 0]
+    period = f"{pd.Timestamp(dates[0]):%Y-%m-%d} to {pd.Timestamp(dates[-1]):%Y-%m-%d}"
+    note = ''
+    if any(not METRICS[m]['balance'] for m in request['metrics']) and request['group_by'] != 'Date' and len(dates) > 1:
+        note = f" Loss value is summed over snapshots from {period}."
+    if request['unknown']:
+        note += f" No inventory data found for {', '.join(request['unknown'])}."
+    if request['unknown_plants']:
+        note += f" No inventory data found for plant {', '.join(request['unknown_plants'])}."
+
+    if len(lines) == 1 and request['group_by'] is None:
+        return lines[0] + '.' + note
+    if request['order'] and request['limit'] == 1:
+        metric = request['metrics'][0]
+        value = METRICS[metric]['format'].format(values[0, sliced['measures'].index(metric)])
+        if request['group_by'] == 'Date':
+            return f"{pd.Timestamp(labels[0]):%Y-%m-%d} has the {request['order']} {METRICS[metric]['label']}, {value}." + note
+        return (f"{labels[0]} has the {request['order']} {METRICS[metric]['label']}, {value} "
+                f"(snapshot {pd.Timestamp(snapshots[0]):%Y-%m-%d}).{note}")
+    title = f"{_describe_scope(request)} by {request['group_by'].lower()}"
+    if request['order']:
+        title += f", {request['order']} {METRICS[request['metrics'][0]]['label']} first"
+    return f"{title}:\n" + '\n'.join(f"- {line}" for line in lines) + ('\n' + note.strip() if note else '')
+
+
+def run_query(query, cube):
+    """Answers a lookup or aggregate question from the cube, or returns None if it needs the LLM."""
+    request = parse_query(query, cube)
+    if request is None:
+        return None
+    return answer_structured(request, cube)
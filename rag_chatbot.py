@@ -1,58 +1,212 @@
 import pandas as pd
 import google.generativeai as genai
+import abc
+import collections
+import functools
 import os
+import re
+import time
+from rag_index import data_version, load_index, retrieve
+from query_engine import cube_for, run_query
 
+GEMINI_MODEL = "models/gemini-2.5-flash"
 
-def get_ai_response(query: str, df: pd.DataFrame) -> str:
+
+class LLMClient(abc.ABC):
     """
-    Generates an AI response to a query based on the provided DataFrame.
+    What the chatbot needs from a language model: a full answer for a
+    prompt, or the answer as a stream of text chunks. Subclasses must
+    implement generate; stream defaults to one chunk. `name` is part of the
+    response cache key, so clients never see each other's answers.
+    """
+    name = 'llm'
+
+    @abc.abstractmethod
+    def generate(self, prompt):
+        """The full answer to `prompt` as one string."""
+
+    def stream(self, prompt):
+        yield self.generate(prompt)
+
+
+class GeminiClient(LLMClient):
+    """Long-lived Gemini client: configured once and reused for every question."""
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            yield chunk.text
+
+
+class FakeLLM(LLMClient):
+    """
+    Offline stand-in for Gemini. It answers with the prompt size, so latency
+    and token payload can be benchmarked, and the chatbot exercised in tests,
+    without an API key or network. `calls` counts the prompts it received.
     """
-    # Configure the generative AI model
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        return f"[fake answer] prompt of {len(prompt):,} characters (~{len(prompt) // 4:,} tokens)"
+
+    def stream(self, prompt):
+        for word in self.generate(prompt).split(' '):
+            yield word + ' '
+
+
+@functools.lru_cache(maxsize=1)
+def _gemini_client(api_key):
+    return GeminiClient(api_key)
+
+
+def default_client():
+    """The process-wide Gemini client, or None when GOOGLE_API_KEY is not set."""
     # Ensure you have your Google API key set as an environment variable
     # For example: os.environ["GOOGLE_API_KEY"] = "YOUR_API_KEY"
-    try:
-        genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    except KeyError:
-        return "Google API Key not found. Please set the GOOGLE_API_KEY environment variable."
-
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-
-    # Reduce DataFrame size for the LLM
-    # 1. Select relevant columns
-    relevant_cols = [
-        "Date",
-        "Plant",
-        "Material",
-        "Unrestricted_Stock",
-        "Stock_Sell_Value",
-        "Loss_Value",
-    ]
-    df_reduced = df[relevant_cols].copy()
-
-    # 2. Sort by Date and take a limited number of rows (e.g., last 200 entries)
-    df_reduced["Date"] = pd.to_datetime(df_reduced["Date"])
-    df_reduced = df_reduced.sort_values(by="Date", ascending=False).head(5000)
-
-    # Convert reduced DataFrame to a string format for the LLM
-    inventory_data_str = df_reduced.to_markdown(index=False)
-
-    # Construct the prompt for the LLM
-    prompt = f"""
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    return _gemini_client(api_key) if api_key else None
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of LLM answers that also expires entries after `ttl`
+    seconds. Keys are (client name, normalized question, data version), so an
+    answer is reused only for the same question against unchanged data.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def key(client, query, version):
+        normalized = re.sub(r'\s+', ' ', query.lower()).strip().rstrip('?.! ')
+        return client.name, normalized, version
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, answer = entry
+        if self.clock() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def put(self, key, answer):
+        self._entries[key] = (self.clock(), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+def build_prompt(query: str, df: pd.DataFrame) -> str:
+    """
+    Builds a compact prompt from the inventory summaries most relevant to
+    the query, instead of pasting raw rows.
+    """
+    index = load_index(df)
+    context = "\n".join(f"- {chunk}" for chunk in retrieve(index, query))
+
+    return f"""
     You are an AI assistant specialized in inventory management.
-    You will be provided with inventory data in a table format and a user's question.
+    You will be provided with summaries of inventory data and a user's question.
     Your task is to answer the user's question based *only* on the provided inventory data.
     If the answer cannot be found in the provided data, please state that you cannot find the information.
 
     Inventory Data:
-    {inventory_data_str}
+    {context}
 
     User Question: {query}
 
     AI Response:
     """
 
+
+def _stream_answer(result, chunks, cache, key, start):
+    """Yields the model's chunks, then records the full answer in `result` and the cache."""
+    parts = []
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
     except Exception as e:
-        return f"An error occurred while generating the AI response: {e}"
+        error = f"An error occurred while generating the AI response: {e}"
+        parts = [error]
+        yield error
+    else:
+        cache.put(key, ''.join(parts))
+    result['answer'] = ''.join(parts)
+    result['elapsed_ms'] = (time.perf_counter() - start) * 1e3
+
+
+def answer_question(query: str, df: pd.DataFrame, cube=None, llm=None, stream=False, cache=RESPONSE_CACHE) -> dict:
+    """
+    Answers lookup and aggregate questions (stock, value or loss by material,
+    plant or date range) directly from the rollup cube, and sends everything
+    else to the LLM, reusing a cached answer for a repeated question against
+    unchanged data. Returns a dict with the answer, the path that served it
+    ('structured', 'cache' or 'llm') and the elapsed time in milliseconds.
+
+    With stream=True an uncached LLM answer is returned as result['stream'],
+    a generator of text chunks; 'answer' and 'elapsed_ms' are filled in once
+    it is exhausted.
+    """
+    start = time.perf_counter()
+    result = {'answer': None, 'stream': None, 'path': 'structured'}
+
+    result['answer'] = run_query(query, cube if cube is not None else cube_for(df))
+    if result['answer'] is None:
+        llm = llm or default_client()
+        if llm is None:
+            result['answer'] = "Google API Key not found. Please set the GOOGLE_API_KEY environment variable."
+            result['path'] = 'llm'
+            result['elapsed_ms'] = (time.perf_counter() - start) * 1e3
+            return result
+
+        key = cache.key(llm, query, data_version(df))
+        result['answer'] = cache.get(key)
+        result['path'] = 'cache'
+        if result['answer'] is None:
+            result['path'] = 'llm'
+            # Construct the prompt for the LLM from the retrieved summaries
+            prompt = build_prompt(query, df)
+            if stream:
+                result['stream'] = _stream_answer(result, llm.stream(prompt), cache, key, start)
+                return result
+            try:
+                result['answer'] = llm.generate(prompt)
+                cache.put(key, result['answer'])
+            except Exception as e:
+                result['answer'] = f"An error occurred while generating the AI response: {e}"
+
+    result['elapsed_ms'] = (time.perf_counter() - start) * 1e3
+    return result
+
+
+def get_ai_response(query: str, df: pd.DataFrame, llm=None) -> str:
+    """
+    Generates an AI response to a query based on the provided DataFrame.
+    Pass `llm` (e.g. FakeLLM()) to use a model other than Gemini.
+    """
+    return answer_question(query, df, llm=llm)['answer']
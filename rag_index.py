@@ -0,0 +1,302 @@
+
+import pandas as pd
+import numpy as np
+import functools
+import hashlib
+import json
+import os
+import re
+from inventory_advisor import latest_balances
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - numpy brute force is used instead
+    faiss = None
+
+INDEX_DIR = '.rag_index'
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+HASH_DIMENSIONS = 4096
+
+# Bumped whenever build_chunks' output changes, so indexes saved before are rebuilt
+CHUNK_FORMAT = 2
+
+# How many chunks of each kind a query retrieves
+CHUNK_QUOTAS = {'material': 5, 'plant': 1, 'snapshot': 2}
+
+RELEVANT_COLS = ["Date", "Plant", "Material", "Unrestricted_Stock", "Stock_Sell_Value", "Loss_Value"]
+
+# Indexes already loaded in this process, keyed by data version
+_loaded_indexes = {}
+
+
+def data_version(df):
+    """Content hash of the columns the chatbot can see; changes whenever the data does."""
+    hashed = pd.util.hash_pandas_object(df[RELEVANT_COLS], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
+
+
+def build_chunks(df):
+    """
+    Summarizes the inventory into short text chunks: one per plant x material,
+    one per plant and one per snapshot date. Each chunk is a few lines, so a
+    handful of them cover a question that used to need thousands of raw rows.
+    Returns (kind, plant, material, text) tuples, with None for the plant or
+    material a chunk is not about.
+    """
+    df = df[RELEVANT_COLS]
+    chunks = []
+
+    keys = ['Plant', 'Material']
+    stats = df.groupby(keys, observed=True).agg(
+        first_date=('Date', 'min'),
+        last_date=('Date', 'max'),
+        snapshots=('Date', 'nunique'),
+        avg_stock=('Unrestricted_Stock', 'mean'),
+        max_stock=('Unrestricted_Stock', 'max'),
+        total_loss=('Loss_Value', 'sum'),
+    )
+    latest = latest_balances(df, ['Unrestricted_Stock', 'Stock_Sell_Value', 'Loss_Value'], 'Date', 'Plant', 'Material')
+    stats = stats.join(latest)
+    for (plant, material), row in stats.iterrows():
+        chunks.append(('material', plant, material,
+            f"Plant {plant}, material {material}: latest snapshot {row.Date:%Y-%m-%d} has "
+            f"unrestricted stock {row.Unrestricted_Stock:,.0f}, stock sell value {row.Stock_Sell_Value:,.2f} "
+            f"and loss value {row.Loss_Value:,.2f}. Across {row.snapshots} snapshots from "
+            f"{row.first_date:%Y-%m-%d} to {row.last_date:%Y-%m-%d}: average stock {row.avg_stock:,.0f}, "
+            f"maximum stock {row.max_stock:,.0f}, cumulative loss value {row.total_loss:,.2f}."
+        ))
+
+    last_date = df['Date'].max()
+    for plant, plant_df in df.groupby('Plant', observed=True):
+        current = plant_df[plant_df['Date'] == plant_df['Date'].max()]
+        top = current.groupby('Material', observed=True)['Unrestricted_Stock'].sum().nlargest(5)
+        top_losses = plant_df.groupby('Material', observed=True)['Loss_Value'].sum().nlargest(5)
+        chunks.append(('plant', plant, None,
+            f"Overview and details for plant {plant} as of {plant_df['Date'].max():%Y-%m-%d}: "
+            f"{current['Material'].nunique()} materials, plant total unrestricted stock {current['Unrestricted_Stock'].sum():,.0f}, stock sell value "
+            f"{current['Stock_Sell_Value'].sum():,.2f}, loss value {current['Loss_Value'].sum():,.2f}. "
+            f"Top materials by stock: {', '.join(f'{m} ({v:,.0f})' for m, v in top.items())}. "
+            f"Materials with the highest loss value: {', '.join(f'{m} ({v:,.2f})' for m, v in top_losses.items())}."
+        ))
+
+    for date, date_df in df.groupby('Date'):
+        by_plant = date_df.groupby('Plant', observed=True)['Unrestricted_Stock'].sum()
+        chunks.append(('snapshot', None, None,
+            f"Totals for snapshot date {date:%Y-%m-%d}{' (latest)' if date == last_date else ''} across all "
+            f"plants: total unrestricted stock {date_df['Unrestricted_Stock'].sum():,.0f}, stock sell value "
+            f"{date_df['Stock_Sell_Value'].sum():,.2f}, loss value {date_df['Loss_Value'].sum():,.2f}. "
+            f"Stock by plant: {', '.join(f'{p} {v:,.0f}' for p, v in by_plant.items())}."
+        ))
+    return chunks
+
+
+def _tokens(text):
+    # Keep identifiers like MAT-0001 whole, and also index their parts.
+    # Figures say nothing about what a chunk is about and would dominate the
+    # vectors, so tokens without a letter are dropped; dates are kept whole.
+    tokens = re.findall(r'[a-z0-9]+(?:-[a-z0-9]+)*', text.lower())
+    words = [token for token in tokens if re.search(r'[a-z]', token)]
+    dates = [token for token in tokens if re.fullmatch(r'\d{4}-\d{2}(?:-\d{2})?', token)]
+    return words + dates + [part for token in words if '-' in token for part in token.split('-')]
+
+
+def named_plants(text, plants):
+    """The plants a question names, by full name or by the first part of it ("china" for CHINA-WAREHOUSE)."""
+    text = text.lower()
+    return [p for p in plants if p.lower() in text or re.search(rf"\b{re.escape(p.split('-')[0].lower())}\b", text)]
+
+
+def named_materials(text, materials):
+    """The materials a question names by identifier, like MAT-0001."""
+    identifiers = {token.upper() for token in re.findall(r"\b[a-z]+-\d+\b", text.lower())}
+    return [m for m in materials if m.upper() in identifiers]
+
+
+def hash_counts(texts, dimensions=HASH_DIMENSIONS):
+    """Bag-of-words counts with tokens hashed into a fixed number of buckets."""
+    counts = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for token in _tokens(text):
+            counts[i, int(hashlib.md5(token.encode()).hexdigest(), 16) % dimensions] += 1.0
+    return counts
+
+
+def hash_idf(chunk_counts):
+    """Smoothed inverse document frequency per hash bucket, learned from the chunks."""
+    document_frequency = (chunk_counts > 0).sum(axis=0)
+    return (np.log((1 + len(chunk_counts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+
+def hash_embed(texts, idf):
+    """
+    Dependency-free embedding: hashed TF-IDF over words and dates with
+    sublinear term frequency, L2-normalized. Good at exact identifiers like
+    MAT-0001, weak at paraphrases; retrieve filters on plant and material
+    names first, so it only has to rank the rest.
+    """
+    vectors = np.log1p(hash_counts(texts, len(idf))) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+@functools.lru_cache(maxsize=1)
+def _sentence_embedder():
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception:
+        return None
+
+
+def embed(texts, index):
+    if index['embedder'] == 'hash':
+        return hash_embed(texts, index['idf'])
+    model = _sentence_embedder()
+    if model is None:
+        raise RuntimeError(f"The index was built with {EMBEDDING_MODEL}, which cannot be loaded here; "
+                           "rebuild it with embedder='hash'.")
+    return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def _make_search_indexes(vectors, kinds):
+    """One flat inner-product index per chunk kind: (chunk ids, faiss index or None)."""
+    vectors = np.ascontiguousarray(vectors)
+    kinds = np.asarray(kinds)
+    search_indexes = {}
+    for kind in np.unique(kinds):
+        ids = np.flatnonzero(kinds == kind)
+        search_index = None
+        if faiss is not None:
+            search_index = faiss.IndexFlatIP(vectors.shape[1])
+            search_index.add(vectors[ids])
+        search_indexes[str(kind)] = (ids, search_index)
+    return search_indexes
+
+
+def build_index(df, index_dir=INDEX_DIR, embedder=None, persist=True):
+    """
+    Builds the chunk index for `df` and, with `persist`, saves it under
+    index_dir/<version>. Uses sentence-transformers when the model can be
+    loaded, feature hashing otherwise.
+    """
+    version = data_version(df)
+    if embedder is None:
+        embedder = 'sentence-transformers' if _sentence_embedder() is not None else 'hash'
+
+    kinds, plants, materials, chunks = map(list, zip(*build_chunks(df)))
+    index = {'version': version, 'embedder': embedder, 'kinds': kinds, 'plants': plants, 'materials': materials,
+             'chunks': chunks}
+    index['idf'] = hash_idf(hash_counts(chunks)) if embedder == 'hash' else None
+    index['vectors'] = embed(chunks, index)
+    index['search_indexes'] = _make_search_indexes(index['vectors'], kinds)
+
+    if not persist:
+        return index
+    path = os.path.join(index_dir, version)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, 'vectors.npy'), index['vectors'])
+    if index['idf'] is not None:
+        np.save(os.path.join(path, 'idf.npy'), index['idf'])
+    with open(os.path.join(path, 'chunks.json'), 'w') as f:
+        json.dump({'version': version, 'format': CHUNK_FORMAT, 'embedder': embedder, 'kinds': kinds,
+                   'plants': plants, 'materials': materials, 'chunks': chunks}, f)
+    return index
+
+
+def load_index(df, index_dir=INDEX_DIR):
+    """
+    Returns the index for the current data version: from memory if this
+    process already has it, from disk if it was built before, else built now.
+    An index saved with sentence-transformers where the model cannot be
+    loaded is rebuilt in memory with feature hashing; the saved one is kept
+    for environments that have the model. An index saved with an older
+    CHUNK_FORMAT is rebuilt and saved again.
+    """
+    version = data_version(df)
+    if version in _loaded_indexes:
+        return _loaded_indexes[version]
+
+    path = os.path.join(index_dir, version)
+    stored = None
+    unavailable = False
+    if os.path.exists(os.path.join(path, 'chunks.json')):
+        with open(os.path.join(path, 'chunks.json'), 'r') as f:
+            stored = json.load(f)
+        if stored.get('format') != CHUNK_FORMAT:
+            stored = None
+        elif stored['embedder'] != 'hash' and _sentence_embedder() is None:
+            print(f"Index {version} was built with {stored['embedder']}, which cannot be loaded; "
+                  "using a feature-hashing index instead.")
+            stored, unavailable = None, True
+
+    if stored is not None:
+        vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        idf_path = os.path.join(path, 'idf.npy')
+        index = {'version': version, 'embedder': stored['embedder'],
+                 'kinds': stored['kinds'], 'plants': stored['plants'], 'materials': stored['materials'],
+                 'chunks': stored['chunks'],
+                 'idf': np.load(idf_path) if os.path.exists(idf_path) else None,
+                 'vectors': vectors, 'search_indexes': _make_search_indexes(vectors, stored['kinds'])}
+    elif unavailable:
+        index = build_index(df, index_dir, embedder='hash', persist=False)
+    else:
+        index = build_index(df, index_dir)
+
+    _loaded_indexes[version] = index
+    return index
+
+
+def _candidates(index, query):
+    """
+    Chunk ids each kind may return: the chunks about the plants and
+    materials the query names. Kinds the names do not narrow are left out.
+    """
+    plants = named_plants(query, sorted({p for p in index['plants'] if p is not None}))
+    materials = named_materials(query, sorted({m for m in index['materials'] if m is not None}))
+    if not plants and not materials:
+        return {}
+    chunk_plants = np.array(index['plants'], dtype=object)
+    chunk_materials = np.array(index['materials'], dtype=object)
+    at_plants = np.isin(chunk_plants, plants) if plants else np.ones(len(chunk_plants), dtype=bool)
+    of_materials = np.isin(chunk_materials, materials) if materials else np.ones(len(chunk_plants), dtype=bool)
+    keep = at_plants & of_materials
+    # A material the named plant does not hold is still shown where it is held
+    if materials and not keep.any():
+        keep = of_materials
+
+    candidates = {}
+    for kind, (ids, _) in index['search_indexes'].items():
+        # Plant chunks are about no material, so only a plant narrows them
+        if kind == 'plant' and plants:
+            candidates[kind] = ids[np.isin(chunk_plants[ids], plants)]
+        elif kind == 'material':
+            candidates[kind] = ids[keep[ids]]
+    return candidates
+
+
+def retrieve(index, query, quotas=CHUNK_QUOTAS):
+    """
+    Returns the chunks most similar to the query, best first within each
+    kind, taking up to quotas[kind] chunks of each kind so plant and
+    snapshot totals are not crowded out by the many material chunks. When
+    the query names plants or materials, only chunks about them are ranked.
+    """
+    query_vector = embed([query], index)
+    candidates = _candidates(index, query)
+    results = []
+    for kind, quota in quotas.items():
+        if kind not in index['search_indexes']:
+            continue
+        ids, search_index = index['search_indexes'][kind]
+        if kind in candidates:
+            ids, search_index = candidates[kind], None
+        k = min(quota, len(ids))
+        if search_index is not None:
+            _, hits = search_index.search(query_vector, k)
+            hits = hits[0][hits[0] >= 0]
+        else:
+            scores = np.asarray(index['vectors'])[ids] @ query_vector[0]
+            hits = np.argsort(-scores, kind='stable')[:k]
+        results.extend(index['chunks'][i] for i in ids[hits])
+    return results
@@ -0,0 +1,92 @@
+
+import pandas as pd
+import numpy as np
+
+CUBE_MEASURES = ['Unrestricted_Stock', 'Stock_Sell_Value', 'Loss_Value']
+CUBE_DIMENSIONS = ['Date', 'Plant', 'Material']
+
+
+def build_cube(df, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES):
+    """
+    Rolls a cleaned summary frame up into a dense Date x Plant x Material
+    cube in one groupby pass. Returns a dict with the sorted labels of each
+    dimension, `values` of shape (dates, plants, materials, measures) holding
+    the sums (NaNs count as 0, like DataFrame.sum) and `counts` holding the
+    number of source rows per cell, so empty cells can be told apart.
+    """
+    grouped = df.groupby(dimensions, observed=True)
+    sums = grouped[measures].sum()
+    sizes = grouped.size()
+
+    labels = [pd.Index(np.sort(df[dim].dropna().unique()), name=dim) for dim in dimensions]
+    codes = tuple(labels[i].get_indexer(sums.index.get_level_values(i)) for i in range(len(dimensions)))
+
+    shape = tuple(len(index) for index in labels)
+    values = np.zeros(shape + (len(measures),))
+    values[codes] = sums.to_numpy(dtype=float)
+    counts = np.zeros(shape, dtype=np.int64)
+    counts[codes] = sizes.to_numpy()
+
+    cube = {'measures': list(measures), 'values': values, 'counts': counts}
+    cube.update(zip(dimensions, labels))
+    cube['dimensions'] = list(dimensions)
+    return cube
+
+
+def slice_cube(cube, start=None, end=None, plants=None, materials=None):
+    """
+    Restricts a cube to a date range and optional plant / material lists.
+    Slicing only touches the small label arrays and a view-sized copy of the
+    cube, never the row-level data.
+    """
+    date_dim, plant_dim, material_dim = cube['dimensions']
+    dates = cube[date_dim]
+
+    date_mask = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        date_mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        date_mask &= dates <= pd.Timestamp(end)
+    plant_mask = np.ones(len(cube[plant_dim]), dtype=bool) if plants is None else cube[plant_dim].isin(plants)
+    material_mask = np.ones(len(cube[material_dim]), dtype=bool) if materials is None else cube[material_dim].isin(materials)
+
+    index = np.ix_(date_mask, plant_mask, material_mask)
+    sliced = dict(cube)
+    sliced['values'] = cube['values'][index]
+    sliced['counts'] = cube['counts'][index]
+    sliced[date_dim] = dates[date_mask]
+    sliced[plant_dim] = cube[plant_dim][plant_mask]
+    sliced[material_dim] = cube[material_dim][material_mask]
+    return sliced
+
+
+def cube_is_empty(cube):
+    return not cube['counts'].any()
+
+
+def cube_totals(cube):
+    """Sums every measure over the whole cube."""
+    return dict(zip(cube['measures'], cube['values'].sum(axis=(0, 1, 2))))
+
+
+def cube_by(cube, dimension):
+    """
+    Sums every measure along one dimension and returns a frame with that
+    dimension as a column, keeping only labels that have source rows, the
+    same rows `df.groupby(dimension)[measures].sum().reset_index()` returns.
+    """
+    axis = cube['dimensions'].index(dimension)
+    other_axes = tuple(i for i in range(3) if i != axis)
+    present = cube['counts'].sum(axis=other_axes) > 0
+
+    result = pd.DataFrame(cube['values'].sum(axis=other_axes)[present], columns=cube['measures'])
+    result.insert(0, dimension, np.asarray(cube[dimension])[present])
+    return result
+
+
+def cube_labels(cube, dimension):
+    """Labels along one dimension that have source rows in the cube."""
+    axis = cube['dimensions'].index(dimension)
+    other_axes = tuple(i for i in range(3) if i != axis)
+    present = cube['counts'].sum(axis=other_axes) > 0
+    return cube[dimension][present].tolist()
@@ -0,0 +1,192 @@
+
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import time
+from data_store import load_table
+
+OUTPUT_FILE = 'inventory_shelf_life.csv'
+
+KEYS = ['PLANT_NAME', 'MATERIAL_NAME']
+BATCH_KEYS = KEYS + ['BATCH_NUMBER']
+
+# fifo: each batch's age comes from the inbound receipts it was matched to;
+# reference: days from the snapshot to a fixed report date, which is how the
+# shipped inventory summary was produced (every row there is aged to 2025-07-03)
+AGING_MODES = ['fifo', 'reference']
+REFERENCE_DATE = '2025-07-03'
+
+DAYS_PER_MONTH = 30
+KG_PER_MT = 1e3
+# Spreadsheet day numbers, as in BALANCE_AS_OF_DAY
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+SUMMARY_COLUMNS = ['BALANCE_AS_OF_DATE', 'BALANCE_AS_OF_DAY', 'PLANT_NAME', 'MATERIAL_NAME', 'UNRESRICTED_STOCK',
+                   'STOCK_SELL_VALUE', 'SHELF_LIFE_IN_MONTH', 'SHELF_LIFE_IN_DAYS', 'AGING_DAYS', 'IS_OVER_SHELFLIFE',
+                   'DAYS_TO_EXPIRE', 'LOSS_VALUE_PERCENT', 'LOSS_VALUE(OCCUR)', 'LOSS_VALUE', 'PREVENTABLE']
+# Batch-level aging state carried between runs for incremental recomputation
+AGING_COLUMNS = ['RECEIPT_DATE', 'FIRST_SEEN_DATE', 'AGE_CENSORED']
+BASE_COLUMNS = ['BALANCE_AS_OF_DATE'] + BATCH_KEYS + ['UNRESRICTED_STOCK', 'STOCK_SELL_VALUE']
+
+
+def _plain_keys(df, columns):
+    # Merges and sorted joins need the same key dtype on both sides
+    df = df.copy()
+    for col in columns:
+        df[col] = df[col].astype(str)
+    return df
+
+
+def first_seen_dates(inventory, previous=None):
+    """First snapshot each plant x material x batch appears in, including snapshots already processed."""
+    seen = inventory.groupby(BATCH_KEYS, observed=True)['BALANCE_AS_OF_DATE'].min()
+    if previous is not None and not previous.empty:
+        earlier = previous.groupby(BATCH_KEYS, observed=True)['FIRST_SEEN_DATE'].min()
+        seen = pd.concat([seen, earlier]).groupby(level=BATCH_KEYS).min()
+    return inventory.merge(seen.rename('FIRST_SEEN_DATE').reset_index(), on=BATCH_KEYS, how='left')['FIRST_SEEN_DATE']
+
+
+def fifo_receipt_dates(batches, inbound):
+    """
+    Estimates when every batch in `batches` (snapshot rows with STOCK_MT and
+    FIRST_SEEN_DATE) was received, assuming stock leaves first-in first-out so
+    what is on hand is the most recent inbound. Within a snapshot, batches are
+    stacked newest first (latest FIRST_SEEN_DATE first) and each batch's
+    depth in that stack is matched against the plant x material's cumulative
+    inbound with two sorted merges: one finds the inbound total received by
+    the snapshot, the other the receipt whose quantity window holds the
+    batch. Returns (receipt dates, censored), aligned with `batches`; a batch
+    deeper than the inbound history is censored and dated FIRST_SEEN_DATE.
+    """
+    inbound = inbound.sort_values('INBOUND_DATE', kind='stable')
+    inbound['K_AFTER'] = inbound.groupby(KEYS, observed=True)['NET_QUANTITY_MT'].cumsum()
+    inbound['K_BEFORE'] = inbound['K_AFTER'] - inbound['NET_QUANTITY_MT']
+
+    rows = batches[['BALANCE_AS_OF_DATE'] + BATCH_KEYS + ['STOCK_MT', 'FIRST_SEEN_DATE']].copy()
+    rows['ROW'] = np.arange(len(rows))
+    rows = rows.sort_values(['BALANCE_AS_OF_DATE', 'FIRST_SEEN_DATE', 'BATCH_NUMBER'], ascending=[True, False, False])
+    rows['DEPTH'] = rows.groupby(['BALANCE_AS_OF_DATE'] + KEYS, observed=True)['STOCK_MT'].cumsum()
+
+    rows = pd.merge_asof(rows, inbound[KEYS + ['INBOUND_DATE', 'K_AFTER']], left_on='BALANCE_AS_OF_DATE',
+                         right_on='INBOUND_DATE', by=KEYS).drop(columns='INBOUND_DATE')
+    rows['TARGET'] = rows['K_AFTER'].fillna(0.0) - rows['DEPTH']
+
+    rows = pd.merge_asof(rows.sort_values('TARGET'), inbound[KEYS + ['K_BEFORE', 'INBOUND_DATE']].sort_values('K_BEFORE'),
+                         left_on='TARGET', right_on='K_BEFORE', by=KEYS, direction='backward')
+    rows = rows.sort_values('ROW')
+
+    censored = rows['INBOUND_DATE'].isna().to_numpy()
+    # A batch was on hand by the first snapshot it appears in
+    receipt = rows['INBOUND_DATE'].where(~censored, rows['FIRST_SEEN_DATE'])
+    receipt = np.minimum(receipt.to_numpy(), rows['FIRST_SEEN_DATE'].to_numpy())
+    return pd.Series(receipt, index=batches.index), pd.Series(censored, index=batches.index)
+
+
+def derive_columns(df, master, aging='fifo', reference_date=REFERENCE_DATE):
+    """
+    Adds the inventory summary's shelf-life and loss columns to batch rows
+    that carry RECEIPT_DATE. Loss is the downgrade share of the sell value:
+    it counts as occurred once a batch is past its shelf life and as
+    preventable before that.
+    """
+    df = df.merge(master[['MATERIAL_NAME', 'SHELF_LIFE_IN_MONTH', 'DOWNGRADE_VALUE_LOST_PERCENT']],
+                  on='MATERIAL_NAME', how='left')
+    if aging == 'fifo':
+        aging_days = (df['BALANCE_AS_OF_DATE'] - df['RECEIPT_DATE']).dt.days
+    elif aging == 'reference':
+        aging_days = (pd.Timestamp(reference_date) - df['BALANCE_AS_OF_DATE']).dt.days
+    else:
+        raise ValueError(f"Unknown aging mode '{aging}', expected one of {AGING_MODES}")
+
+    df['BALANCE_AS_OF_DAY'] = (df['BALANCE_AS_OF_DATE'] - EXCEL_EPOCH).dt.days
+    df['SHELF_LIFE_IN_DAYS'] = df['SHELF_LIFE_IN_MONTH'] * DAYS_PER_MONTH
+    df['AGING_DAYS'] = aging_days.astype(float)
+    df['DAYS_TO_EXPIRE'] = df['SHELF_LIFE_IN_DAYS'] - df['AGING_DAYS']
+    over = (df['DAYS_TO_EXPIRE'] < 0).to_numpy()
+    df['IS_OVER_SHELFLIFE'] = np.where(over, 'YES', 'NO')
+    df['LOSS_VALUE_PERCENT'] = df.pop('DOWNGRADE_VALUE_LOST_PERCENT')
+    # In float: sell value x percent overflows the tables' int32 columns
+    df['LOSS_VALUE'] = df['STOCK_SELL_VALUE'].astype(float) * df['LOSS_VALUE_PERCENT'] / 100
+    df['LOSS_VALUE(OCCUR)'] = df['LOSS_VALUE'].where(over)
+    df['PREVENTABLE'] = df['LOSS_VALUE'].where(~over)
+    return df[SUMMARY_COLUMNS[:4] + ['BATCH_NUMBER'] + SUMMARY_COLUMNS[4:] + AGING_COLUMNS]
+
+
+def compute_shelf_life(inventory, inbound, master, previous=None, aging='fifo', reference_date=REFERENCE_DATE):
+    """
+    Batch-level shelf-life and loss table for every Inventory.csv row. With
+    `previous` (an earlier result), snapshots it already covers keep their
+    receipt dates and only newly appended snapshots go through FIFO matching;
+    the cheap derived columns are recomputed for every row so master data
+    changes still apply. Returns (table, number of snapshots matched).
+    """
+    inventory = _plain_keys(inventory, BATCH_KEYS)
+    inbound = _plain_keys(inbound, KEYS)
+    master = _plain_keys(master, ['MATERIAL_NAME'])
+
+    done = pd.DataFrame(columns=BASE_COLUMNS + AGING_COLUMNS)
+    if previous is not None:
+        previous = _plain_keys(previous, BATCH_KEYS)
+        dates = set(inventory['BALANCE_AS_OF_DATE'])
+        done = previous[previous['BALANCE_AS_OF_DATE'].isin(dates)][BASE_COLUMNS + AGING_COLUMNS]
+        inventory = inventory[~inventory['BALANCE_AS_OF_DATE'].isin(set(done['BALANCE_AS_OF_DATE']))]
+
+    new = inventory[BASE_COLUMNS].reset_index(drop=True)
+    new['FIRST_SEEN_DATE'] = first_seen_dates(new, done)
+    new['STOCK_MT'] = new['UNRESRICTED_STOCK'].fillna(0) / KG_PER_MT
+    new['RECEIPT_DATE'], new['AGE_CENSORED'] = fifo_receipt_dates(new, inbound)
+    new = new.drop(columns='STOCK_MT')
+
+    table = pd.concat([done, new], ignore_index=True) if len(done) else new
+    table['AGE_CENSORED'] = table['AGE_CENSORED'].astype(bool)
+    table = derive_columns(table, master, aging, reference_date)
+    table = table.sort_values(['BALANCE_AS_OF_DATE'] + BATCH_KEYS, ignore_index=True)
+    return table, new['BALANCE_AS_OF_DATE'].nunique()
+
+
+def load_previous(path):
+    """An earlier compute_shelf_life result written by main(), or None."""
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, dtype={'BATCH_NUMBER': str},
+                       parse_dates=['BALANCE_AS_OF_DATE', 'RECEIPT_DATE', 'FIRST_SEEN_DATE'])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Derive batch-level aging, shelf-life and loss columns from Inventory.csv.')
+    parser.add_argument('--inventory', default='Inventory.csv')
+    parser.add_argument('--inbound', default='Inbound.csv',
+                        help='Inbound receipts used for FIFO aging (uncleaned, so no receipt is lost).')
+    parser.add_argument('--master', default='MaterialMaster.csv')
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--aging', choices=AGING_MODES, default='fifo')
+    parser.add_argument('--reference-date', default=REFERENCE_DATE, help='Report date for --aging reference.')
+    parser.add_argument('--full', action='store_true',
+                        help=f"Recompute every snapshot instead of only those missing from '{OUTPUT_FILE}'.")
+    parser.add_argument('--summary', default=None,
+                        help='Also write the result in the inventory summary layout (no batch columns) to this path.')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    previous = None if args.full else load_previous(args.output)
+    table, matched = compute_shelf_life(load_table('inventory', args.inventory), load_table('inbound_raw', args.inbound),
+                                        load_table('material_master', args.master), previous, args.aging,
+                                        args.reference_date)
+    elapsed = time.perf_counter() - start
+    snapshots = table['BALANCE_AS_OF_DATE'].nunique()
+    print(f"Aged {len(table)} batch rows in {elapsed:.2f} s: matched {matched} snapshot(s), "
+          f"reused {snapshots - matched} from the previous run.")
+    print(f"{table['AGE_CENSORED'].mean():.1%} of rows predate the inbound history (age is a lower bound); "
+          f"{(table['IS_OVER_SHELFLIFE'] == 'YES').mean():.1%} are over shelf life.")
+
+    table.to_csv(args.output, index=False)
+    print(f"Shelf-life table saved to '{args.output}'.")
+    if args.summary:
+        table[SUMMARY_COLUMNS].to_csv(args.summary, index=False)
+        print(f"Inventory summary saved to '{args.summary}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+
+import pandas as pd
+import numpy as np
+
+# Shared by the plant-level forecast (hierarchical_forecast) and the stock
+# projection (inventory_projection): the capacity plan and the projection engine
+
+CAPACITY_FILE = 'Forecast.csv'
+KEYS = ['PLANT_NAME', 'MATERIAL_NAME']
+
+# The planning sheet names warehouses by country and months in Thai
+PLAN_PLANTS = {'SINGAPORE': 'SINGAPORE-WAREHOUSE', 'CHINA': 'CHINA-WAREHOUSE'}
+THAI_MONTHS = {'ม.ค.': 1, 'ก.พ.': 2, 'มี.ค.': 3, 'เม.ย.': 4, 'พ.ค.': 5, 'มิ.ย.': 6,
+               'ก.ค.': 7, 'ส.ค.': 8, 'ก.ย.': 9, 'ต.ค.': 10, 'พ.ย.': 11, 'ธ.ค.': 12}
+
+KG_PER_MT = 1e3
+MT_PER_KT = 1e3
+
+# Shortfalls below this are forecast noise rather than a stockout
+STOCKOUT_TOLERANCE_MT = 0.01
+
+
+def load_capacity_plan(path=CAPACITY_FILE):
+    """
+    Parses the planning sheet into one row per plant and month with
+    CAPACITY_KT, PLAN_OUTBOUND_KT and PLAN_INVENTORY_KT.
+    """
+    raw = pd.read_csv(path, header=None, dtype=str)
+    rows = []
+    plant = months = capacity = None
+    plan = {}
+
+    def flush():
+        if plant is not None and months is not None:
+            for i, month in enumerate(months):
+                rows.append({'PLANT_NAME': plant, 'MONTH': month, 'CAPACITY_KT': capacity[i],
+                             'PLAN_OUTBOUND_KT': plan.get('outbound', [np.nan] * len(months))[i],
+                             'PLAN_INVENTORY_KT': plan.get('inventory', [np.nan] * len(months))[i]})
+
+    for _, line in raw.iterrows():
+        label = str(line[0]).strip()
+        values = line[2:].tolist()
+        if label == 'Warehouse':
+            flush()
+            plant, months, capacity, plan = PLAN_PLANTS.get(line[1].strip(), line[1].strip()), None, None, {}
+        elif label.startswith('Total Cap'):
+            capacity = pd.to_numeric(pd.Series(values), errors='coerce').tolist()
+        elif label == 'Product':
+            months = []
+            for value in values:
+                name, year = str(value).rsplit('-', 1)
+                months.append(pd.Timestamp(year=2000 + int(year), month=THAI_MONTHS[name.strip()], day=1))
+        elif 'Predicted Outbound' in str(line[1]):
+            plan['outbound'] = pd.to_numeric(pd.Series(values), errors='coerce').tolist()
+        elif 'Predicted Inventory' in str(line[1]):
+            plan['inventory'] = pd.to_numeric(pd.Series(values), errors='coerce').tolist()
+    flush()
+    return pd.DataFrame(rows)
+
+
+def opening_balances(inventory):
+    """Unrestricted stock (MT) per plant x material at the latest Inventory.csv snapshot, and its date."""
+    latest = inventory['BALANCE_AS_OF_DATE'].max()
+    snapshot = inventory[inventory['BALANCE_AS_OF_DATE'] == latest]
+    stock = snapshot.groupby(KEYS, observed=True)['UNRESRICTED_STOCK'].sum() / KG_PER_MT
+    return stock, latest
+
+
+def project(opening, inbound, outbound):
+    """
+    Rolls (SKUs,) opening stock forward with (SKUs x months) inbound and
+    outbound quantities, all SKUs at once. Stock never goes below 0: demand
+    that cannot be met is lost. With C the cumulative opening + inbound -
+    outbound, the clipped stock is C minus the running minimum of C below 0,
+    so no per-month loop is needed. Returns (stock, unclipped C).
+    """
+    cumulative = opening[:, None] + np.cumsum(inbound - outbound, axis=1)
+    shortfall = np.minimum(np.minimum.accumulate(cumulative, axis=1), 0.0)
+    return cumulative - shortfall, cumulative
+
+
+def stockout_index(cumulative, tolerance=STOCKOUT_TOLERANCE_MT):
+    """Index of the first month each SKU's cumulative position drops below 0, -1 if it never does."""
+    short = cumulative < -tolerance
+    return np.where(short.any(axis=1), short.argmax(axis=1), -1)
+
+
+def days_of_cover(opening, cumulative, days_in_month):
+    """
+    Days until each SKU's projected stock runs out, interpolating within the
+    stockout month; inf when stock lasts the whole horizon.
+    """
+    first = stockout_index(cumulative)
+    rows = np.arange(len(opening))
+    stocked = first >= 0
+    month = np.where(stocked, first, 0)
+
+    before = np.concatenate([opening[:, None], cumulative[:, :-1]], axis=1)[rows, month]
+    drawdown = before - cumulative[rows, month]
+    fraction = np.divide(before, drawdown, out=np.zeros_like(before), where=drawdown > 0)
+    elapsed = np.concatenate([[0], np.cumsum(days_in_month)])[month]
+    return np.where(stocked, elapsed + np.clip(fraction, 0, 1) * days_in_month[month], np.inf)
+
+
+def plant_matrix(plants):
+    """(plants x SKUs) 0/1 matrix summing SKU rows into their plant, and the plant names."""
+    names = list(dict.fromkeys(plants))
+    return (np.asarray(plants)[None, :] == np.array(names)[:, None]).astype(float), names
+
+
+def capacity_by_month(plan, plants, months):
+    """(plants x months) capacity in MT, carrying each plant's last planned capacity forward."""
+    capacity = plan[['PLANT_NAME', 'MONTH', 'CAPACITY_KT']].dropna().sort_values('MONTH')
+    grid = pd.DataFrame({'PLANT_NAME': np.repeat(plants, len(months)), 'MONTH': np.tile(months, len(plants))})
+    grid = pd.merge_asof(grid.sort_values('MONTH'), capacity, on='MONTH', by='PLANT_NAME')
+    table = grid.pivot(index='PLANT_NAME', columns='MONTH', values='CAPACITY_KT').reindex(index=plants, columns=months)
+    return table.to_numpy(dtype=float) * MT_PER_KT
+
+
+def run_projection(opening, inbound, outbound, plan, inbound_scale=1.0, outbound_scale=1.0):
+    """
+    Projects every plant x material forward and summarizes it. `opening` is a
+    (plant, material) Series in MT and `inbound` / `outbound` are
+    (plant, material) x month frames of forecast MT; the scales apply what-if
+    multipliers. Negative forecasts count as no movement. Returns
+    (sku_df, plant_df): per SKU the opening stock, average monthly demand,
+    days of cover, stockout month, closing stock and share of its plant's
+    capacity; per plant and month the projected stock, capacity,
+    utilization and the outbound that could not be served.
+    """
+    index = opening.index.union(inbound.index).union(outbound.index)
+    months = inbound.columns.union(outbound.columns)
+    flows_in = np.clip(inbound.reindex(index=index, columns=months).fillna(0.0).to_numpy(), 0, None) * inbound_scale
+    flows_out = np.clip(outbound.reindex(index=index, columns=months).fillna(0.0).to_numpy(), 0, None) * outbound_scale
+    stock0 = opening.reindex(index).fillna(0.0).to_numpy(dtype=float)
+
+    stock, cumulative = project(stock0, flows_in, flows_out)
+    first = stockout_index(cumulative)
+    # Demand lost each month is the drop in the running shortfall
+    unmet = -np.diff(np.minimum(np.minimum.accumulate(cumulative, axis=1), 0.0), axis=1, prepend=0.0)
+    days_in_month = months.days_in_month.to_numpy()
+
+    plants = index.get_level_values('PLANT_NAME')
+    to_plant, plant_names = plant_matrix(plants)
+    plant_stock = to_plant @ stock
+    capacity = capacity_by_month(plan, plant_names, months)
+    sku_capacity = capacity[pd.Index(plant_names).get_indexer(plants)]
+
+    sku_df = pd.DataFrame({
+        'OPENING_STOCK_MT': stock0,
+        'AVG_MONTHLY_OUTBOUND_MT': flows_out.mean(axis=1),
+        'DAYS_OF_COVER': days_of_cover(stock0, cumulative, days_in_month),
+        'STOCKOUT_MONTH': pd.Series(months[np.maximum(first, 0)]).where(first >= 0).to_numpy(),
+        'CLOSING_STOCK_MT': stock[:, -1],
+        'PEAK_CAPACITY_SHARE': (stock / sku_capacity).max(axis=1),
+    }, index=index).reset_index()
+
+    plant_df = pd.DataFrame({
+        'PLANT_NAME': np.repeat(plant_names, len(months)),
+        'MONTH': np.tile(months, len(plant_names)),
+        'PROJECTED_STOCK_KT': plant_stock.ravel() / MT_PER_KT,
+        'CAPACITY_KT': capacity.ravel() / MT_PER_KT,
+        'UTILIZATION': (plant_stock / capacity).ravel(),
+        'UNMET_OUTBOUND_KT': (to_plant @ unmet).ravel() / MT_PER_KT,
+        'SKUS_SHORT': (to_plant @ (unmet > STOCKOUT_TOLERANCE_MT)).ravel().astype(int),
+    })
+    plant_df['OVER_CAPACITY'] = plant_df['PROJECTED_STOCK_KT'] > plant_df['CAPACITY_KT']
+    return sku_df, plant_df
@@ -2,17 +2,19 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from data_store import load_table
 
 # Set page config
 st.set_page_config(layout="wide")
 
-# Load data
-@st.cache_data
+# Load data once per process. cache_resource hands every rerun the same
+# frames instead of a pickled copy, so nothing below may modify them.
+@st.cache_resource
 def load_data():
-    inbound = pd.read_csv('Inbound_cleaned.csv')
-    outbound = pd.read_csv('Outbound_cleaned.csv')
-    inventory = pd.read_csv('Inventory.csv')
-    material_master = pd.read_csv('MaterialMaster.csv')
+    inbound = load_table('inbound')
+    outbound = load_table('outbound')
+    inventory = load_table('inventory')
+    material_master = load_table('material_master')
     return inbound, outbound, inventory, material_master
 
 inbound, outbound, inventory, material_master = load_data()
@@ -36,16 +38,13 @@ if page == "Inventory Overview":
 
     # Inventory Distribution
     st.subheader("Inventory Distribution by Material")
-    inventory_dist = inventory.groupby('MATERIAL_NAME')['UNRESRICTED_STOCK'].sum().reset_index()
-    inventory_dist = inventory_dist.merge(material_master[['MATERIAL_NAME', 'POLYMER_TYPE']], on='MATERIAL_NAME')
+    inventory_dist = inventory.groupby('MATERIAL_NAME', observed=True)['UNRESRICTED_STOCK'].sum().reset_index()
     fig_dist = px.bar(inventory_dist, x='MATERIAL_NAME', y='UNRESRICTED_STOCK', title="Inventory Quantity by Material")
     st.plotly_chart(fig_dist, use_container_width=True)
 
     # Inventory Value Analysis
     st.subheader("Inventory Value Analysis")
-    inventory_value = inventory.copy()
-    inventory_value['Value'] = inventory_value['STOCK_SELL_VALUE']
-    inventory_value = inventory_value.merge(material_master[['MATERIAL_NAME', 'POLYMER_TYPE']], on='MATERIAL_NAME')
+    inventory_value = inventory.groupby('MATERIAL_NAME', observed=True)['STOCK_SELL_VALUE'].sum().reset_index(name='Value')
     fig_value = px.pie(inventory_value, values='Value', names='MATERIAL_NAME', title="Inventory Value by Material")
     st.plotly_chart(fig_value, use_container_width=True)
 
@@ -55,8 +54,6 @@ elif page == "Inbound vs. Outbound":
 
     # Trend Analysis
     st.subheader("Inbound and Outbound Quantities Over Time")
-    inbound['INBOUND_DATE'] = pd.to_datetime(inbound['INBOUND_DATE'])
-    outbound['OUTBOUND_DATE'] = pd.to_datetime(outbound['OUTBOUND_DATE'])
     inbound_ts = inbound.groupby('INBOUND_DATE')['NET_QUANTITY_MT'].sum().reset_index().rename(columns={'NET_QUANTITY_MT':'Inbound Quantity'})
     outbound_ts = outbound.groupby('OUTBOUND_DATE')['NET_QUANTITY_MT'].sum().reset_index().rename(columns={'NET_QUANTITY_MT':'Outbound Quantity'})
     ts_data = pd.merge(inbound_ts, outbound_ts, left_on='INBOUND_DATE', right_on='OUTBOUND_DATE', how='outer').fillna(0)
@@ -67,10 +64,9 @@ elif page == "Inbound vs. Outbound":
 
     # Material-Level Flow
     st.subheader("Inbound vs. Outbound by Material")
-    inbound_agg = inbound.groupby('MATERIAL_NAME')['NET_QUANTITY_MT'].sum().reset_index().rename(columns={'NET_QUANTITY_MT':'Inbound'})
-    outbound_agg = outbound.groupby('MATERIAL_NAME')['NET_QUANTITY_MT'].sum().reset_index().rename(columns={'NET_QUANTITY_MT':'Outbound'})
+    inbound_agg = inbound.groupby('MATERIAL_NAME', observed=True)['NET_QUANTITY_MT'].sum().reset_index().rename(columns={'NET_QUANTITY_MT':'Inbound'})
+    outbound_agg = outbound.groupby('MATERIAL_NAME', observed=True)['NET_QUANTITY_MT'].sum().reset_index().rename(columns={'NET_QUANTITY_MT':'Outbound'})
     flow_agg = pd.merge(inbound_agg, outbound_agg, on='MATERIAL_NAME', how='outer').fillna(0)
-    flow_agg = flow_agg.merge(material_master[['MATERIAL_NAME', 'POLYMER_TYPE']], on='MATERIAL_NAME')
     flow_agg = flow_agg.melt(id_vars=['MATERIAL_NAME'], value_vars=['Inbound', 'Outbound'], var_name='Flow', value_name='NET_QUANTITY_MT')
     fig_agg = px.bar(flow_agg, x='MATERIAL_NAME', y='NET_QUANTITY_MT', color='Flow', barmode='group', title="Inbound vs. Outbound Quantity by Material")
     st.plotly_chart(fig_agg, use_container_width=True)
@@ -0,0 +1,46 @@
+
+import pandas as pd
+from clean_data import DATASETS, outlier_fences, filter_outliers, streaming_fences, chunk_fences
+
+
+def _constant_heavy_frame():
+    # Group A: mostly one load size, so Q1 == Q3, plus a few genuine other loads.
+    # Group B: a spread-out group that gives the global fences their width.
+    a = [24.75] * 30 + [16.5, 19.03, 5.5]
+    b = [float(v) for v in range(1, 81)] + [400.0]
+    return pd.DataFrame({
+        'DATE': pd.Timestamp('2024-01-01'),
+        'PLANT_NAME': ['P1'] * (len(a) + len(b)),
+        'MATERIAL_NAME': ['A'] * len(a) + ['B'] * len(b),
+        'NET_QUANTITY_MT': a + b,
+    })
+
+
+def _spec(tmp_path=None):
+    spec = dict(DATASETS['outbound'], dtypes={'DATE': 'str', 'PLANT_NAME': 'str', 'MATERIAL_NAME': 'str',
+                                              'NET_QUANTITY_MT': 'float64'},
+                date_col='DATE', date_format='%Y-%m-%d')
+    if tmp_path is not None:
+        spec['input'] = str(tmp_path / 'input.csv')
+    return spec
+
+
+def test_zero_iqr_group_uses_global_fences():
+    df = _constant_heavy_frame()
+    kept = filter_outliers(df, _spec(), outlier_fences(df, _spec()))
+
+    # Every load of the constant-heavy group survives; the spread group still loses its outlier
+    assert (kept['MATERIAL_NAME'] == 'A').sum() == (df['MATERIAL_NAME'] == 'A').sum()
+    assert 400.0 not in kept['NET_QUANTITY_MT'].tolist()
+
+
+def test_streaming_fences_match(tmp_path):
+    df = _constant_heavy_frame()
+    spec = _spec(tmp_path)
+    df.assign(DATE='2024-01-01').to_csv(spec['input'], index=False)
+    expected = filter_outliers(df, spec, outlier_fences(df, spec))
+
+    for exact in (True, False):
+        fences, groups = streaming_fences(spec, chunksize=10, exact=exact)
+        kept = filter_outliers(df, spec, chunk_fences(df, spec, fences, groups))
+        assert kept.index.tolist() == expected.index.tolist()
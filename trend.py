@@ -0,0 +1,80 @@
+
+import numpy as np
+import pandas as pd
+
+TREND_METHODS = ['ols', 'theil-sen']
+
+
+def _window(values, horizon):
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    if horizon is not None:
+        if horizon < 2:
+            raise ValueError(f"A trend needs a horizon of at least 2 steps, got {horizon}")
+        values = values[:, :horizon]
+    return values, np.arange(values.shape[1], dtype=float)
+
+
+def ols_trend(values, horizon=None):
+    """
+    Least-squares slope and intercept of every row of a (series x steps)
+    matrix against x = 0, 1, ..., using the first `horizon` steps (all by
+    default). Closed form, so all rows are fitted in a couple of array ops.
+    """
+    values, x = _window(values, horizon)
+    x_centered = x - x.mean()
+    slopes = (values - values.mean(axis=1, keepdims=True)) @ x_centered / (x_centered @ x_centered)
+    intercepts = values.mean(axis=1) - slopes * x.mean()
+    return slopes, intercepts
+
+
+def theil_sen_trend(values, horizon=None):
+    """
+    Theil-Sen slope (median of the slopes between every pair of steps) and
+    intercept (median of y - slope * x) for every row, over the first
+    `horizon` steps. Robust to a few outlying steps; rows are handled together.
+    """
+    values, x = _window(values, horizon)
+    i, j = np.triu_indices(len(x), k=1)
+    slopes = np.median((values[:, j] - values[:, i]) / (x[j] - x[i]), axis=1)
+    intercepts = np.median(values - slopes[:, None] * x, axis=1)
+    return slopes, intercepts
+
+
+def trend(values, method='ols', horizon=None):
+    """
+    Slopes of every row of a (series x steps) matrix, and their trend lines
+    evaluated over all steps. method is one of TREND_METHODS; a horizon below
+    2 steps raises ValueError.
+    """
+    if method == 'ols':
+        slopes, intercepts = ols_trend(values, horizon)
+    elif method == 'theil-sen':
+        slopes, intercepts = theil_sen_trend(values, horizon)
+    else:
+        raise ValueError(f"Unknown trend method '{method}', expected one of {TREND_METHODS}")
+    steps = np.atleast_2d(values).shape[1]
+    return slopes, intercepts[:, None] + slopes[:, None] * np.arange(steps)
+
+
+def add_trend_slopes(forecast_df, method='ols', horizon=None, key='MATERIAL_NAME', value='FORECASTED_QUANTITY_MT'):
+    """
+    Sets TREND_SLOPE on a long forecast frame whose rows are in month order
+    within each key, with one trend call per distinct forecast length rather
+    than per key. TREND_METHOD and TREND_HORIZON record how each slope was
+    fitted, so plots can draw the same line. Keys with a single row get NaN.
+    """
+    codes, _ = pd.factorize(forecast_df[key])
+    order = np.argsort(codes, kind='stable')
+    values = forecast_df[value].to_numpy(dtype=float)[order]
+    sizes = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    slopes = np.full(len(sizes), np.nan)
+    for steps in np.unique(sizes[sizes >= 2]):
+        keys = np.flatnonzero(sizes == steps)
+        slopes[keys], _ = trend(values[starts[keys, None] + np.arange(steps)], method, horizon)
+
+    forecast_df['TREND_SLOPE'] = slopes[codes]
+    forecast_df['TREND_METHOD'] = method
+    forecast_df['TREND_HORIZON'] = np.minimum(sizes, horizon or sizes.max())[codes]
+    return forecast_df